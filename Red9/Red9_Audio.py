@@ -628,7 +628,7 @@ class AudioNode(object):
         Note in batch mode we calculate via the Wav duration
         NOT the Maya audioNode length as it's invalid under batch mode!
         '''
-        if not cmds.about(batch=True) and self.isLoaded:
+        if not r9Setup.mayaIsBatch() and self.isLoaded:
             return cmds.getAttr('%s.endFrame' % self.audioNode)  # why the hell does this always come back 1 frame over??
         else:
             return self.getLengthFromWav() + self.startFrame
@@ -17,6 +17,7 @@ import maya.cmds as cmds
 import maya.OpenMaya as OpenMaya
 
 from functools import partial
+from collections import deque, OrderedDict
 import re
 import random
 import math
@@ -41,6 +42,45 @@ LANGUAGE_MAP = r9Setup.LANGUAGE_MAP
 
 # Generic Functions --------------------------------------------------------------
 
+class PatternCache(object):
+    '''
+    The REGEX_CACHE object, an LRU cache of the compiled regexes used by the name
+    filters so repeat searches from the UI's don't rebuild and recompile them.
+    Keyed by the pattern tuple and flags, each entry is the patterns compiled into
+    a single alternation, optionally with a named group per pattern, p0, p1.. so the
+    branch that matched can be read back from the match.
+    '''
+    def __init__(self, maxSize=256):
+        self.maxSize=maxSize
+        self.patterns=OrderedDict()
+        
+    def compile(self, patterns, flags=0, named=False):
+        '''
+        :param patterns: list of regex strings
+        :param flags: re flags
+        :param named: wrap each pattern in a named group p<index>
+        :return: compiled regex of the patterns as one alternation
+        '''
+        key=(tuple(patterns), flags, named)
+        try:
+            regex=self.patterns.pop(key)
+        except KeyError:
+            if named:
+                regex=re.compile('|'.join('(?P<p%i>%s)' % (i, p) for i, p in enumerate(patterns)), flags)
+            else:
+                regex=re.compile('(' + '|'.join(patterns) + ')', flags)
+            if len(self.patterns)>=self.maxSize:
+                self.patterns.popitem(last=False)
+        self.patterns[key]=regex
+        return regex
+    
+    def clear(self):
+        self.patterns.clear()
+
+global REGEX_CACHE
+REGEX_CACHE = PatternCache()
+
+
 def nodeNameStrip(node):
     '''
     Simple method to strip any |Path and :Namespaces: from
@@ -70,26 +110,51 @@ def prioritizeNodeList(inputlist, priorityList, regex=True, prioritysOnly=False)
     
     really in regex you'd need to be more specific:  priorityList=['^upperLip','l_upperLip']
     '''
-    #stripped = [nodeNameStrip(node) for node in inputlist]  # stripped back to nodeName
+    stripped = [nodeNameStrip(node) for node in inputlist]  # stripped back to nodeName
     nList=list(inputlist)  # take a copy so we don't mutate the input list
     reordered = []
     
-    if regex:
-        # this will match all partial matches within the inputList
-        #print 'pList : ',priorityList
-        for pNode in priorityList:
-            for node in inputlist:
-                if re.search(pNode, nodeNameStrip(node)):
-                    #print 'matched : ', nodeNameStrip(node), pNode, node
-                    reordered.append(node)
-                    try:
-                        nList.remove(node)
-                    except:
-                        log.debug('node not in list or already removed: %s>> priority str : %s' % (nodeNameStrip(node), node))
-
-    else:
+    if regex and priorityList:
+        # this will match all partial matches within the inputList. The priorities are run
+        # as one alternation so most nodes are rejected in a single search. Patterns with
+        # inline flags or groups, '(?', or backreferences change what they match when joined
+        # so they're searched on their own. A node matching several priorities is listed
+        # under each of them, so once a priority matches the alternation is re-run without
+        # it, until nothing else matches. Stripped names repeat across namespaces so the
+        # matches are worked out once per name
+        priorityList=list(priorityList)
+        joined=[]
+        separate=[]
+        for index, pattern in enumerate(priorityList):
+            if re.search(r'\(\?|\\[0-9]', pattern):
+                separate.append((index, re.compile(pattern)))
+            else:
+                joined.append(index)
+        buckets=[[] for _ in priorityList]
+        unmatched=[]
+        nameMatches={}
+        for node, name in zip(inputlist, stripped):
+            if not name in nameMatches:
+                matched=[index for index, pattern in separate if pattern.search(name)]
+                remaining=joined
+                while remaining:
+                    match=REGEX_CACHE.compile([priorityList[index] for index in remaining], named=True).search(name)
+                    if not match:
+                        break
+                    index=remaining[int(match.lastgroup[1:])]
+                    matched.append(index)
+                    remaining=[i for i in remaining if not i==index]
+                nameMatches[name]=matched
+            if not nameMatches[name]:
+                unmatched.append(node)
+            for index in nameMatches[name]:
+                buckets[index].append(node)
+        for bucket in buckets:
+            reordered.extend(bucket)
+        nList=unmatched
+
+    elif not regex:
         # this is setup to match exact only
-        stripped = [nodeNameStrip(node) for node in inputlist]  # stripped back to nodeName
         for pNode in priorityList:
             if pNode in stripped:
                 index = stripped.index(pNode)
@@ -139,10 +204,188 @@ def stringReplace(text, replace_dict):
     return rc.sub(translate, text)
 
 
+# Literal Decoding ---
+# Red9 stores attr values and settings as their repr() strings, these used to
+# be passed straight back through eval which will happily run any code that
+# ends up in a shared pose file. decodeLiteral only understands the shapes we
+# write: numbers, bools, None, quoted strings and lists, tuples and dicts of them.
+
+LITERAL_TOKENS = re.compile(r'''\s*(?:
+    (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?[lL]?)
+    |(?P<string>[uU]?[rR]?(?:'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"))
+    |(?P<name>(?:True|False|None)(?![\w.]))
+    |(?P<punct>[][(){},:])
+    )''', re.VERBOSE)
+LITERAL_NUMBER_PATTERN = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?[lL]?'
+LITERAL_NUMBER = re.compile(LITERAL_NUMBER_PATTERN + '$')
+LITERAL_NUMBER_SEQUENCE = re.compile(r'''(?:
+    \[\s*(?P<list>%(number)s(?:\s*,\s*%(number)s)*)\s*,?\s*\]
+    |\(\s*(?P<tuple>%(number)s(?:\s*,\s*%(number)s)*)\s*(?P<comma>,?)\s*\)
+    )$''' % {'number': LITERAL_NUMBER_PATTERN}, re.VERBOSE)
+LITERAL_NON_ASCII = re.compile(u'([^\x00-\x7f]+)')
+LITERAL_NAMES = {'True': True, 'False': False, 'None': None}
+LITERAL_MEMO = {}
+LITERAL_MEMO_SIZE = 100000
+
+
+def _decodeNumber(token):
+    # base 0 so that a leading zero is octal, as eval reads it
+    if token[-1] in 'lL':
+        return long(token[:-1], 0)
+    if '.' in token or 'e' in token or 'E' in token:
+        return float(token)
+    return int(token, 0)
+
+
+def _decodeEscapes(body, codec):
+    '''
+    decode the escapes in a unicode literal body with the given codec. The codecs
+    only take ascii so the non-ascii runs, which can't be part of an escape, are
+    kept as they are and only the ascii runs between them are decoded
+    '''
+    parts=LITERAL_NON_ASCII.split(body)
+    for i in range(0, len(parts), 2):
+        part=parts[i]
+        if codec=='unicode_escape' and i + 1<len(parts) and (len(part) - len(part.rstrip('\\'))) % 2:
+            # a backslash before a non-ascii char isn't an escape, eval keeps it
+            part+='\\'
+        parts[i]=part.encode('ascii').decode(codec)
+    return u''.join(parts)
+
+
+def _decodeQuoted(token):
+    quote=len(token) - len(token.lstrip('uUrR'))
+    prefix=token[:quote].lower()
+    body=token[quote + 1:-1]
+    if isinstance(body, unicode):
+        # eval of a unicode string gives the utf-8 bytes for a plain str literal
+        if 'u' in prefix:
+            return _decodeEscapes(body, 'raw_unicode_escape' if 'r' in prefix else 'unicode_escape')
+        body=body.encode('utf-8')
+    if 'r' in prefix:
+        return body.decode('raw_unicode_escape') if 'u' in prefix else body
+    if 'u' in prefix:
+        return body.decode('unicode_escape')
+    return body.decode('string_escape')
+
+
+def _parseLiteral(text, pos):
+    '''
+    recursive parse of the value starting at pos
+    
+    :return: (value, pos) with pos being the index after the value
+    '''
+    match=LITERAL_TOKENS.match(text, pos)
+    if not match:
+        raise ValueError('malformed literal at char %i : %s' % (pos, text))
+    pos=match.end()
+    kind=match.lastgroup
+    token=match.group(kind)
+    if kind=='number':
+        return _decodeNumber(token), pos
+    if kind=='string':
+        return _decodeQuoted(token), pos
+    if kind=='name':
+        return LITERAL_NAMES[token], pos
+    if token=='[':
+        items, pos, _ = _parseSequence(text, pos, ']')
+        return items, pos
+    if token=='(':
+        items, pos, trailing = _parseSequence(text, pos, ')')
+        #(1.0) is just a bracketed value, (1.0,) is a tuple
+        if len(items)==1 and not trailing:
+            return items[0], pos
+        return tuple(items), pos
+    if token=='{':
+        data={}
+        while True:
+            match=LITERAL_TOKENS.match(text, pos)
+            if match and match.group('punct')=='}':
+                return data, match.end()
+            key, pos = _parseLiteral(text, pos)
+            match=LITERAL_TOKENS.match(text, pos)
+            if not match or not match.group('punct')==':':
+                raise ValueError('malformed dict literal at char %i : %s' % (pos, text))
+            data[key], pos = _parseLiteral(text, match.end())
+            match=LITERAL_TOKENS.match(text, pos)
+            if not match or not match.group('punct') in [',', '}']:
+                raise ValueError('malformed dict literal at char %i : %s' % (pos, text))
+            if match.group('punct')=='}':
+                return data, match.end()
+            pos=match.end()
+    raise ValueError('malformed literal at char %i : %s' % (pos, text))
+
+
+def _parseSequence(text, pos, closer):
+    '''
+    parse comma separated values up to the closing bracket
+    
+    :return: (items, pos, trailing) where trailing is True if the last item had a comma
+    '''
+    items=[]
+    trailing=False
+    while True:
+        match=LITERAL_TOKENS.match(text, pos)
+        if match and match.group('punct')==closer:
+            return items, match.end(), trailing
+        value, pos = _parseLiteral(text, pos)
+        items.append(value)
+        match=LITERAL_TOKENS.match(text, pos)
+        if not match or not match.group('punct') in [',', closer]:
+            raise ValueError('malformed sequence literal at char %i : %s' % (pos, text))
+        if match.group('punct')==closer:
+            return items, match.end(), False
+        pos=match.end()
+        trailing=True
+
+
+def decodeLiteral(val):
+    '''
+    Safe replacement for eval() on the strings Red9 writes out for attr values
+    and settings. Only numbers, bools, None, quoted strings and lists, tuples and
+    dicts of those are decoded, anything else, ie executable code, raises a ValueError.
+    
+    Plain numbers are the bulk of any pose file so they're memoised and skip the parser,
+    as do flat lists and tuples of numbers, ie the [x, y, z] values.
+    
+    >>> decodeLiteral('[1.0, -2.5, (3, 4)]')
+    >>> [1.0, -2.5, (3, 4)]
+    '''
+    try:
+        return LITERAL_MEMO[val]
+    except KeyError:
+        pass
+    except TypeError:
+        pass
+    if not isinstance(val, basestring):
+        raise ValueError('decodeLiteral expects a string : %s' % type(val))
+    if LITERAL_NUMBER.match(val):
+        if len(LITERAL_MEMO)>=LITERAL_MEMO_SIZE:
+            LITERAL_MEMO.clear()
+        LITERAL_MEMO[val]=_decodeNumber(val)
+        return LITERAL_MEMO[val]
+    match=LITERAL_NUMBER_SEQUENCE.match(val)
+    if match:
+        if match.group('list') is not None:
+            return [_decodeNumber(item.strip()) for item in match.group('list').split(',')]
+        items=[_decodeNumber(item.strip()) for item in match.group('tuple').split(',')]
+        #(1.0) is just a bracketed value, (1.0,) is a tuple
+        if len(items)==1 and not match.group('comma'):
+            return items[0]
+        return tuple(items)
+    value, pos = _parseLiteral(val, 0)
+    if val[pos:].strip():
+        raise ValueError('malformed literal at char %i : %s' % (pos, val))
+    return value
+
+
 def decodeString(val):
     '''
     From configObj the return is a string, we want to encode
     it back to it's original state so we pass it through this
+    
+    .. note::
+        containers and bools are decoded via decodeLiteral, NOT eval
     '''
     try:
         if not issubclass(type(val), str) and not type(val)==unicode:
@@ -151,25 +394,25 @@ def decodeString(val):
             return val
         if val=='False' or val=='True' or val=='None':
             #log.debug('Decoded as type(bool)')
-            return eval(val)
+            return decodeLiteral(val)
         elif val=='[]':
             #log.debug('Decoded as type(empty list)')
-            return eval(val)
+            return decodeLiteral(val)
         elif val=='()':
             #log.debug('Decoded as type(empty tuple)')
-            return eval(val)
+            return decodeLiteral(val)
         elif val=='{}':
             #log.debug('Decoded as type(empty dict)')
-            return eval(val)
+            return decodeLiteral(val)
         elif (val[0]=='[' and val[-1] ==']'):
             #log.debug('Decoded as type(list)')
-            return eval(val)
+            return decodeLiteral(val)
         elif (val[0] =='(' and val[-1]==')'):
             #log.debug('Decoded as type(tuple)')
-            return eval(val)
+            return decodeLiteral(val)
         elif (val[0] =='{' and val[-1]=='}'):
             #log.debug('Decoded as type(dict)')
-            return eval(val)
+            return decodeLiteral(val)
         try:
             encoded=int(val)
             #log.debug('Decoded as type(int)')
@@ -203,6 +446,21 @@ def validateString(strText):
         return strText
 
 
+def intersectNodeLists(current, nodes):
+    '''
+    intersect a list of nodes with the current results, keeping the order (and any
+    duplicates) of the given nodes. The current results are tested as a set so this
+    is O(n+m) rather than a list scan per node. If there are no current results yet
+    the nodes are returned as they are.
+    
+    :param current: the current results
+    :param nodes: nodes to intersect with the current results
+    '''
+    if not current:
+        return nodes
+    current=set(current)
+    return [node for node in nodes if node in current]
+
 def filterListByString(input_list, filter_string, matchcase=False):
     '''
     Generic way to filter a list by a given string input. This is so that all
@@ -227,20 +485,18 @@ def filterListByString(input_list, filter_string, matchcase=False):
             pattern.append('(%s)' % n.replace(' ',')+.*('))
         else:
             pattern.append(n)
-    filterPattern='|'.join(n for n in pattern)
-    log.info('new : %s' % filterPattern)
+    log.info('new : %s' % '|'.join(pattern))
     
-    regexFilter=re.compile('('+filterPattern+')')  # convert into a regularExpression
+    regexFilter=REGEX_CACHE.compile(pattern)  # convert into a regularExpression
     
+    found=set()
     for item in input_list:
         data=item
-        #filterPattern='|'.join(n for n in filterBy)
-        #regexFilter=re.compile('('+filterPattern+')')  # convert into a regularExpression
         if not matchcase:
             data=item.upper()
         if regexFilter.search(data):
-            #print data,item,filterPattern
-            if not item in filteredList:
+            if not item in found:
+                found.add(item)
                 filteredList.append(item)
     return filteredList
     
@@ -543,6 +799,500 @@ class FilterNode_UI(object):
             
         
         
+class MayaHierarchyBackend(object):
+    '''
+    Scene backend for HierarchySnapshot, the listRelatives call per root
+    plus ONE ls(showType) call for the types of every node found
+    '''
+    def query(self, roots):
+        '''
+        :param roots: root nodes to snapshot
+        :return: (longRoots, descendants, types) where descendants is the listRelatives(ad=True)
+            long names for each root and types maps each long name to it's nodeType
+        '''
+        longRoots=[(cmds.ls(root, l=True) or [root])[0] for root in roots]
+        descendants=[cmds.listRelatives(root, ad=True, f=True) or [] for root in longRoots]
+        nodes=longRoots + [node for nodes in descendants for node in nodes]
+        typed=cmds.ls(nodes, showType=True, l=True) or []
+        return longRoots, descendants, dict(zip(typed[::2], typed[1::2]))
+    
+    def inheritedTypes(self, nodeType):
+        return cmds.nodeType(nodeType, inherited=True, isTypeName=True) or [nodeType]
+
+
+class FakeHierarchyBackend(object):
+    '''
+    In memory backend for HierarchySnapshot so the filter logic can be tested
+    without Maya.
+    
+    :param nodes: list of (longName, nodeType) tuples, descendants are returned
+        in this order so give them in the order listRelatives would
+    :param inheritance: optional {nodeType : inherited types}, by default transforms
+        and joints inherit 'transform' and the FilterNode.knownShapes inherit 'shape'
+    '''
+    def __init__(self, nodes, inheritance=None):
+        self.nodes=list(nodes)
+        self.inheritance=inheritance or {}
+        
+    def query(self, roots):
+        types=dict(self.nodes)
+        longRoots=[]
+        for root in roots:
+            matched=[node for node, _ in self.nodes if node==root or node.endswith('|%s' % root)]
+            longRoots.append(matched[0] if matched else root)
+        descendants=[[node for node, _ in self.nodes if node.startswith('%s|' % root)] for root in longRoots]
+        return longRoots, descendants, types
+    
+    def inheritedTypes(self, nodeType):
+        if nodeType in self.inheritance:
+            return self.inheritance[nodeType]
+        if nodeType in ['transform', 'joint']:
+            return ['dagNode', 'transform', nodeType]
+        if nodeType in FilterNode.knownShapes():
+            return ['dagNode', 'shape', nodeType]
+        return [nodeType]
+        
+
+class HierarchySnapshot(object):
+    '''
+    Flat snapshot of the hierarchies under the given roots taken in one pass
+    from a backend. The long names, nodeTypes and parent indexes are held as
+    parallel lists so the type, shape to transform and clamp logic that
+    FilterNode used to run as per node cmds calls is just list and dict lookups.
+    
+    >>> snap=HierarchySnapshot(['|rig'])
+    >>> snap.descendants(['nurbsCurve'])
+    >>> snap.parent(snap.descendants(['nurbsCurve'])[0])
+    
+    Data layout:
+        nodes : long names, the roots first then each roots descendants in listRelatives order
+        types : nodeType of each node
+        parents : index of each nodes parent in the snapshot, -1 for the roots
+    '''
+    def __init__(self, roots, backend=None):
+        '''
+        :param roots: root nodes to snapshot
+        :param backend: object with the query and inheritedTypes calls, default MayaHierarchyBackend
+        '''
+        self.backend=backend or MayaHierarchyBackend()
+        if not isinstance(roots, list):
+            roots=[roots]
+        self.nodes=[]
+        self.types=[]
+        self.parents=[]
+        self.index={}
+        self.rootDescendants={}   # root index : [descendant indexes]
+        self.__inherited={}
+        self.__children=None
+        longRoots, descendants, types = self.backend.query(roots)
+        for root, longRoot, nodes in zip(roots, longRoots, descendants):
+            rootIndex=self.__add(longRoot, types)
+            self.index[root]=rootIndex
+            self.rootDescendants[rootIndex]=[self.__add(node, types) for node in nodes]
+        for node in self.nodes:
+            self.parents.append(self.index.get(node.rsplit('|', 1)[0], -1))
+        
+    def __add(self, node, types):
+        if not node in self.index:
+            self.index[node]=len(self.nodes)
+            self.nodes.append(node)
+            self.types.append(types.get(node))
+        return self.index[node]
+    
+    def __contains__(self, node):
+        return node in self.index
+    
+    def __len__(self):
+        return len(self.nodes)
+    
+    def inheritedTypes(self, nodeType):
+        if not nodeType in self.__inherited:
+            self.__inherited[nodeType]=set(self.backend.inheritedTypes(nodeType))
+        return self.__inherited[nodeType]
+    
+    def nodeType(self, node):
+        return self.types[self.index[node]]
+    
+    def isType(self, node, nodeTypes):
+        '''
+        :return: True if the node is or inherits from any of the nodeTypes,
+            the same test listRelatives(type=nodeTypes) makes
+        '''
+        nodeType=self.types[self.index[node]]
+        return nodeType in nodeTypes or bool(self.inheritedTypes(nodeType).intersection(nodeTypes))
+    
+    def parent(self, node):
+        parent=self.parents[self.index[node]]
+        if parent>-1:
+            return self.nodes[parent]
+    
+    def children(self, node, nodeTypes=None):
+        '''
+        :return: direct children of the node, optionally filtered by nodeTypes
+        '''
+        if self.__children is None:
+            self.__children={}
+            for i, parent in enumerate(self.parents):
+                if parent>-1:
+                    self.__children.setdefault(parent, []).append(i)
+        children=[self.nodes[i] for i in self.__children.get(self.index[node], [])]
+        if nodeTypes:
+            return [child for child in children if self.isType(child, nodeTypes)]
+        return children
+    
+    def descendants(self, nodeTypes=None, roots=None):
+        '''
+        :param nodeTypes: optional filter, nodes that are or inherit from these types
+        :param roots: optional roots to return for, default is all the snapshot roots
+        :return: long names of the descendants in listRelatives order
+        '''
+        if roots is None:
+            indexes=sorted(self.rootDescendants.keys())
+        else:
+            indexes=[self.index[root] for root in roots]
+        nodes=[self.nodes[i] for root in indexes for i in self.rootDescendants[root]]
+        if nodeTypes:
+            return [node for node in nodes if self.isType(node, nodeTypes)]
+        return nodes
+            
+
+class AttrSearchPlan(object):
+    '''
+    The parsed searchAttrs of FilterNode.lsSearchAttributes, split into the include
+    and 'NOT:' exclude dicts of attr : [valueTest, value]. The operators are then run
+    in Python over existence and value lookups the caller batches up front. Plans are
+    cached by the searchAttrs so repeat searches skip the parsing.
+    '''
+    plans={}
+    maxPlans=256
+    
+    def __init__(self, searchAttrs):
+        self.includeAttrs={}
+        self.excludeAttrs={}
+        for pattern in searchAttrs:
+            val = [None, None]  # why?? so that a value of False or 0 is still a value and not ignored!
+            pattern = pattern.replace(" ", "")  # strip whiteSpaces
+            attr = pattern
+            if '=' in pattern:
+                val = [True, decodeString(pattern.split('=')[-1])]
+                attr = pattern.split('=')[0]
+            if 'NOT:' in pattern:
+                self.excludeAttrs[(attr.split('NOT:')[-1])] = val
+            else:
+                self.includeAttrs[attr] = val
+    
+    @classmethod
+    def get(cls, searchAttrs):
+        key=tuple(searchAttrs)
+        if not key in cls.plans:
+            if len(cls.plans)>=cls.maxPlans:
+                cls.plans.clear()
+            cls.plans[key]=cls(searchAttrs)
+        return cls.plans[key]
+    
+    def valueAttrs(self):
+        '''
+        attrs that have an '=' value test, these are the values to batch read
+        '''
+        return [attr for attrs in (self.includeAttrs, self.excludeAttrs)
+                for attr, val in attrs.items() if val[0]]
+    
+    def isEqual(self, value, testValue):
+        if not type(testValue) == float:
+            return value == testValue
+        try:
+            return floatIsEqual(value, testValue)
+        except TypeError:
+            return False
+    
+    def test(self, node, exists, getValue):
+        '''
+        run the operators for a node, exactly as the per node loops did
+        
+        :param exists: func(node, attr) returning True if the node has the attr
+        :param getValue: func(node, attr) returning the attrs value
+        :return: (add, attr) where attr is the last attr tested, used for returnValues
+        '''
+        #only excluders so by default all nodes are added unless excluded
+        add = not self.includeAttrs
+        attr = None
+        for attr, val in self.includeAttrs.items():  # INCLUDE TESTS
+            if exists(node, attr):
+                if val[0]:  # value test
+                    add = self.isEqual(getValue(node, attr), val[1])
+                else:
+                    add = True
+                if not add:
+                    break
+        for attr, val in self.excludeAttrs.items():  # EXCLUDE TESTS ('NOT:' operator)
+            if exists(node, attr):
+                if not val[0] or self.isEqual(getValue(node, attr), val[1]):
+                    add = False
+                break
+        return add, attr
+
+
+class SceneAttrReader(object):
+    '''
+    The ATTR_SEARCH_READER object, batched attr reads for lsSearchAttributes. Nodes are
+    resolved to MObjects once per search and the attr existence is answered by
+    MFnDependencyNode.hasAttribute, long or short names, rather than an attributeQuery
+    call per node per attr. Existence isn't cached, hasAttribute is a lookup on the node
+    so there's nothing to keep in sync with attrs being added, deleted or renamed.
+    
+    Values are NOT cached between searches as they change with time and edits, but
+    within a search they're read once in a single pass. Simple numeric, enum and string
+    attrs are read straight from the MPlug, anything else, ie unit or compound attrs,
+    via cmds.getAttr so the values always match a getAttr call.
+    '''
+    def resolve(self, nodes):
+        '''
+        :return: dict of node : MObject for all the nodes that exist
+        '''
+        mobjs={}
+        for node in nodes:
+            if node in mobjs:
+                continue
+            try:
+                mobjs[node]=r9Meta.getMObject(node)
+            except RuntimeError:
+                log.debug('unable to resolve node : %s' % node)
+        return mobjs
+    
+    def exists(self, mobj, attr):
+        if mobj is None:
+            return False
+        return OpenMaya.MFnDependencyNode(mobj).hasAttribute(attr)
+    
+    def readValues(self, plugs, mobjs):
+        '''
+        :param plugs: list of (node, attr) to read
+        :param mobjs: the dict from resolve()
+        :return: dict of (node, attr) : value, None if the attr has no value, ie message attrs
+        '''
+        values={}
+        for node, attr in plugs:
+            if (node, attr) in values:
+                continue
+            try:
+                values[(node, attr)]=self.readValue(node, attr, mobjs.get(node))
+            except StandardError:
+                values[(node, attr)]=None
+                log.debug('Some Attribute Types such as Message attrs have no value')
+        return values
+    
+    def readValue(self, node, attr, mobj=None):
+        if mobj is not None:
+            plug=OpenMaya.MFnDependencyNode(mobj).findPlug(attr, False)
+            attrObj=plug.attribute()
+            if not plug.isArray() and not plug.isCompound():
+                if attrObj.hasFn(OpenMaya.MFn.kNumericAttribute):
+                    unitType=OpenMaya.MFnNumericAttribute(attrObj).unitType()
+                    if unitType==OpenMaya.MFnNumericData.kBoolean:
+                        return plug.asBool()
+                    if unitType in (OpenMaya.MFnNumericData.kFloat, OpenMaya.MFnNumericData.kDouble):
+                        return plug.asDouble()
+                    if unitType in (OpenMaya.MFnNumericData.kByte, OpenMaya.MFnNumericData.kChar,
+                                    OpenMaya.MFnNumericData.kShort, OpenMaya.MFnNumericData.kInt):
+                        return plug.asInt()
+                elif attrObj.hasFn(OpenMaya.MFn.kEnumAttribute):
+                    return plug.asInt()
+                elif attrObj.hasFn(OpenMaya.MFn.kTypedAttribute) and \
+                        OpenMaya.MFnTypedAttribute(attrObj).attrType()==OpenMaya.MFnData.kString:
+                    #getAttr returns unicode, the api a utf-8 encoded str
+                    value=plug.asString()
+                    if isinstance(value, str):
+                        value=value.decode('utf-8')
+                    return value
+        return cmds.getAttr('%s.%s' % (node, attr))
+
+global ATTR_SEARCH_READER
+ATTR_SEARCH_READER = SceneAttrReader()
+
+
+class AnimCurveIndex(object):
+    '''
+    The ANIMCURVE_INDEX object behind FilterNode.lsAnimCurves. All the animCurves in the
+    scene are found with one ls call and each curve is classified by the api the first
+    time it's asked for, rather than the referenceQuery, listConnections and getAttr
+    calls per curve, as:
+    
+        * *referenced* : the curve is from a referenced file
+        * *driven* : the curve has input connections, ie setDrivens
+        * *clip* : the curve is connected to a clipLibrary, Trax clip data
+        * *layerLocked* : the keyTimeValue is locked, ie the curves animLayer is locked
+    
+    The index, classifications and every query's result are cached against a scene
+    generation, bumped by animCurves or animLayers being added, an animLayer attr change,
+    and from the RED9_META_EVENTBUS by connection changes, animCurves or animLayers being
+    removed, any node being renamed, and new scenes / reference loads. The rename and
+    connection events are required from the bus only while the index is bound. A bump just drops
+    the classifications and queries, the curves are classified again as they're asked
+    for. A repeat query in the same generation is a dict lookup. If the callbacks can't
+    be bound nothing is cached and the index is rebuilt each call.
+    
+    .. note::
+        locking the keyTimeValue of a curve by hand, rather than via it's animLayer,
+        doesn't bump the generation
+    '''
+    def __init__(self):
+        self.generation=0
+        self.built=None       # generation the index was built in
+        self.curves=[]
+        self.classified={}    # curve : reason it's not safe, None if it is
+        self.queries={}       # (nodes, safe) : curves
+        self.callbacks=[]
+        self.layerCallbacks=[]
+        self.bound=False
+        
+    def bump(self, *args):
+        self.generation+=1
+        self.classified.clear()
+        self.queries.clear()
+        
+    def bind(self):
+        '''
+        bind the api callbacks that bump the generation
+        '''
+        if self.bound:
+            return True
+        try:
+            self.callbacks.append(OpenMaya.MDGMessage.addNodeAddedCallback(self.bump, 'animCurve'))
+            self.callbacks.append(OpenMaya.MDGMessage.addNodeAddedCallback(self.bump, 'animLayer'))
+            for event in ['nodeRenamed', 'connectionChanged']:
+                r9Meta.RED9_META_EVENTBUS.require(event, 'animCurveIndex')
+            self.bound=True
+        except StandardError, error:
+            log.debug('ANIMCURVE_INDEX : unable to bind the callbacks, caching disabled : %s' % error)
+            self.unbind()
+        return self.bound
+    
+    def unbind(self):
+        for callbackID in self.callbacks + self.layerCallbacks:
+            try:
+                OpenMaya.MMessage.removeCallback(callbackID)
+            except:
+                log.debug('ANIMCURVE_INDEX : failed to remove callback')
+        for event in ['nodeRenamed', 'connectionChanged']:
+            r9Meta.RED9_META_EVENTBUS.release(event, 'animCurveIndex')
+        self.callbacks=[]
+        self.layerCallbacks=[]
+        self.bound=False
+        self.built=None
+        self.queries.clear()
+        
+    def __bindLayers(self):
+        for callbackID in self.layerCallbacks:
+            try:
+                OpenMaya.MMessage.removeCallback(callbackID)
+            except:
+                pass
+        self.layerCallbacks=[]
+        for layer in cmds.ls(type='animLayer') or []:
+            try:
+                self.layerCallbacks.append(OpenMaya.MNodeMessage.addAttributeChangedCallback(r9Meta.getMObject(layer), self.bump))
+            except StandardError:
+                log.debug('ANIMCURVE_INDEX : unable to bind the animLayer callback : %s' % layer)
+    
+    def classify(self, curve, mobj=None):
+        '''
+        :return: the reason the curve isn't safe to modify, or None if it's safe
+        '''
+        if mobj is None:
+            mobj=r9Meta.getMObject(curve)
+        fn=OpenMaya.MFnDependencyNode(mobj)
+        if fn.isFromReferencedFile():
+            return 'referenced'
+        plugs=OpenMaya.MPlugArray()
+        fn.getConnections(plugs)
+        clip=False
+        for i in range(plugs.length()):
+            connected=OpenMaya.MPlugArray()
+            if plugs[i].connectedTo(connected, True, False) and connected.length():
+                return 'driven'
+            plugs[i].connectedTo(connected, False, True)
+            for c in range(connected.length()):
+                if connected[c].node().hasFn(OpenMaya.MFn.kClipLibrary):
+                    clip=True
+        if clip:
+            return 'clip'
+        if fn.findPlug('ktv', False).isLocked():
+            return 'layerLocked'
+    
+    def refresh(self):
+        '''
+        re-read the curve list if the scene generation has moved on since it was built,
+        the curves are classified as they're asked for by isSafe
+        '''
+        cached=self.bind()
+        if cached and self.built==self.generation:
+            return
+        self.curves=cmds.ls(type='animCurve', r=True) or []
+        self.classified={}
+        if not cached:
+            return
+        self.__bindLayers()
+        self.built=self.generation
+    
+    def isSafe(self, curve):
+        if not curve in self.classified:
+            try:
+                self.classified[curve]=self.classify(curve)
+            except RuntimeError:
+                return False
+        return not self.classified[curve]
+    
+    def lsAnimCurves(self, nodes=None, safe=False):
+        '''
+        the animCurves in the scene or in the history of the given nodes, see FilterNode.lsAnimCurves
+        '''
+        self.refresh()
+        key=(tuple(nodes) if isinstance(nodes, (list, tuple)) else nodes, safe)
+        if self.bound and key in self.queries:
+            return list(self.queries[key])
+        animCurves=[]
+        if not nodes:
+            animCurves=self.curves
+        else:
+            try:
+                treeDepth=2
+                #fucking AnimLayers!! if present then we up the depth of the history search
+                #in-order to walk over the animBlendNodes to the actual animCurves.
+                if r9Anim.getAnimLayersFromGivenNodes(nodes):
+                    treeDepth=3
+                    log.debug('AnimLayers found, increasing search depth')
+                #Deal with curves linked to character sets or animation layer
+                history=cmds.listHistory(nodes, pdo=True, lf=False, lv=treeDepth) or []
+                curves=set(cmds.ls(history, type='animCurve') or [])
+                animCurves=[node for node in history if node in curves]
+            except:
+                pass
+        if not safe:
+            animCurves=list(set(animCurves))
+        else:
+            animCurves=[curve for curve in animCurves if self.isSafe(curve)]
+        if self.bound:
+            self.queries[key]=list(animCurves)
+        return animCurves
+    
+    def stats(self):
+        '''
+        return the number of curves indexed per unsafe reason
+        '''
+        stats={'curves':len(self.curves), 'generation':self.generation, 'queries':len(self.queries)}
+        for reason in self.classified.values():
+            if reason:
+                stats[reason]=stats.get(reason, 0) + 1
+        return stats
+
+global ANIMCURVE_INDEX
+ANIMCURVE_INDEX = AnimCurveIndex()
+for event in ['nodeRemoved', 'nodeRenamed', 'connectionChanged', 'referenceLoaded', 'referenceUnloaded', 'sceneNew']:
+    r9Meta.RED9_META_EVENTBUS.subscribe(event, ANIMCURVE_INDEX.bump)
+#nodeRemoved is filtered by nodeType, the index only needs to hear about it's own nodes going
+r9Meta.RED9_META_EVENTBUS.watchNodeRemoved(['animCurve', 'animLayer'])
+
+
 class FilterNode(object):
     '''
     FilterNode is a class for managing, searching and filtering nodes with the scene.
@@ -564,7 +1314,12 @@ class FilterNode(object):
     The above makes a filterNode class, we pass in our hierarchies rootNode (string), 
     then set the internal settings to filter the hierarchy for all child nurbsCurves 
     who's name includes 'Ctrl'. Finally the ProcessFilter runs the main call.
+    
+    The hierarchy and nodeType filters run over a HierarchySnapshot of the roots,
+    set snapshotBackend to a FakeHierarchyBackend to test them without a scene.
     '''
+    snapshotBackend=None   # backend for the HierarchySnapshot, None is the Maya scene
+    
     def __init__(self, roots=None, filterSettings=None):
         '''
         :param roots: Given root nodes in the Maya scene to search from.
@@ -592,6 +1347,7 @@ class FilterNode(object):
         self.foundPattern=[]     # Matched NodeName pattern list from lsSearchNamePattern
         self.intersectionData=[]
         self.characterSetMembers=[]  # Character Set member list from lsCharacterMembers
+        self._snapshot=None          # HierarchySnapshot shared by the filters during processFilter
         
         #root objects to filter NOTE: This also switches Processing Mode to suit
         if roots:
@@ -677,11 +1433,12 @@ class FilterNode(object):
 
         self.hierarchy=[]
         if self.processMode=='Selected':
+            snapshot=self.hierarchySnapshot()
             #check if we're dealing with a characterSet, if so return all its members
             for node in self.rootNodes:
-                if cmds.nodeType(node)=='character':
+                if snapshot.nodeType(node)=='character':
                     self.hierarchy.extend(self.lsCharacterMembers())
-                elif cmds.nodeType(node)=='objectSet':
+                elif snapshot.nodeType(node)=='objectSet':
                     #print 'objectSets - here'
                     self.hierarchy.extend(self.getObjectSetMembers(node))
                     childSets=cmds.listConnections(node, type='objectSet', s=True, d=False)  # need a walk here??
@@ -693,15 +1450,33 @@ class FilterNode(object):
                     if incRoots:
                         self.hierarchy.append(node)
                     if not transformClamp:
-                        self.hierarchy.extend(cmds.listRelatives(node, ad=True, f=True))
+                        self.hierarchy.extend(snapshot.descendants(roots=[node]))
                     else:
                         #Still not sure this is the right place for the transform clamp
-                        self.hierarchy.extend(cmds.listRelatives(node, ad=True, f=True,
-                                                                 type='transform'))
+                        self.hierarchy.extend(snapshot.descendants(['transform'], roots=[node]))
             return self.hierarchy
         else:
             raise StandardError('rootNodes not given to class - processing at SceneLevel Only - lsHierarchy is therefore invalid')
     
+    def hierarchySnapshot(self):
+        '''
+        the HierarchySnapshot of the rootNodes. During processFilter the one snapshot
+        is shared by all the filters, otherwise a fresh one is taken for each call
+        '''
+        if self._snapshot is not None:
+            return self._snapshot
+        return HierarchySnapshot(self.rootNodes, self.snapshotBackend)
+    
+    def __nodeType(self, node, snapshot=None, inherited=False):
+        '''
+        nodeType from the snapshot if the node is in it, else from the scene
+        '''
+        if snapshot and node in snapshot:
+            if inherited:
+                return snapshot.inheritedTypes(snapshot.nodeType(node))
+            return snapshot.nodeType(node)
+        return cmds.nodeType(node, i=inherited)
+    
     
 
     # Node Management Block
@@ -739,13 +1514,17 @@ class FilterNode(object):
         if not isinstance(nodeTypes, list):
             nodeTypes = [nodeTypes]
         
+        snapshot=None
+        if self.processMode=='Selected':
+            snapshot=self.hierarchySnapshot()
+        
         if self.processMode=='Selected' and len(self.rootNodes)==1:
             #PreProcess set selections and add all members to the test
             #TO DO: have this process multiple selected Sets
-            if cmds.nodeType(self.rootNodes[0])=='character':
+            if snapshot.nodeType(self.rootNodes[0])=='character':
                 nodes = self.lsCharacterMembers()
                 log.debug('adding CharacterSetMembers to nodes for processing : %s', nodes)
-            elif cmds.nodeType(self.rootNodes[0])=='objectSet':
+            elif snapshot.nodeType(self.rootNodes[0])=='objectSet':
                 nodes=self.lsHierarchy(self.rootNodes[0])
                 #nodes=cmds.sets(self.rootNodes[0],q=True,nodesOnly=True)
                 log.debug('adding SelectionSetMember to nodes for processing : %s', nodes)
@@ -756,14 +1535,17 @@ class FilterNode(object):
             #question any transforms for child nodes of the correct shapeType
             shapeTypes=list(set(nodeTypes).intersection(set(self.knownShapes())))
             if not shapeTypes:
-                typeMatched = [node for node in nodes if cmds.nodeType(node) in nodeTypes]
+                typeMatched = [node for node in nodes if self.__nodeType(node, snapshot) in nodeTypes]
             else:
                 for node in nodes:
-                    if cmds.nodeType(node) in nodeTypes:
+                    if self.__nodeType(node, snapshot) in nodeTypes:
                         typeMatched.append(node)
                     else:
-                        if 'transform' in cmds.nodeType(node, i=True):
-                            shapeMatched=cmds.listRelatives(node, type=shapeTypes, f=True)
+                        if 'transform' in self.__nodeType(node, snapshot, inherited=True):
+                            if snapshot and node in snapshot:
+                                shapeMatched=snapshot.children(node, shapeTypes)
+                            else:
+                                shapeMatched=cmds.listRelatives(node, type=shapeTypes, f=True)
                             if shapeMatched:
                                 typeMatched.extend(shapeMatched)
         else:
@@ -774,14 +1556,14 @@ class FilterNode(object):
                     if nodes:
                         typeMatched=nodes  # ensures we're always dealing with a list and not a null object
                 elif self.processMode=='Selected':
-                    nodes = cmds.listRelatives(self.rootNodes, type=nodeTypes, ad=True, f=True)
+                    nodes = snapshot.descendants(nodeTypes)
                     if nodes:
                         typeMatched=nodes  # ensures we're always dealing with a list and not a null object
                         
                     #Specific handler for blendShapes as these really need to be dealt with, and passed
                     #in the animation functions but don't show under a standard hierarchy search
                     if 'blendShape' in nodeTypes:
-                        meshes=cmds.listRelatives(self.rootNodes, type='mesh', ad=True, f=True)
+                        meshes=snapshot.descendants(['mesh'])
                         if meshes:
                             log.info('processing meshes for blendShapes')
                             for mesh in meshes:
@@ -796,22 +1578,28 @@ class FilterNode(object):
             if not transformClamp:
                 self.foundNodeTypes=typeMatched
             else:
+                clamped=set()
                 for node in typeMatched:
                     #Check if the nodeType is inherited/subclass of 'shape', if so, return
                     #it's parent transform node. Note: if it is a shape node then we INSERT
                     #it at the front of the list, rather than appending to the end.
                     #This is due to the way Maya returns data from the listRelatives cmd
-                    if 'shape' in cmds.nodeType(node, i=True):
-                        parentTransform = cmds.listRelatives(node, f=True, p=True)[0]
-                        if parentTransform not in self.foundNodeTypes:
+                    if 'shape' in self.__nodeType(node, snapshot, inherited=True):
+                        if snapshot and node in snapshot:
+                            parentTransform = snapshot.parent(node)
+                        else:
+                            parentTransform = cmds.listRelatives(node, f=True, p=True)[0]
+                        if parentTransform not in clamped:
+                            clamped.add(parentTransform)
                             self.foundNodeTypes.insert(0, parentTransform)
-                    else:
+                    elif node not in clamped:
+                        clamped.add(node)
                         self.foundNodeTypes.append(node)
             
             #test if the roots match the searchTypes if so add them to the end
             if self.processMode=='Selected':
                 if incRoots:
-                    [self.foundNodeTypes.append(node) for node in self.rootNodes if cmds.nodeType(node) in nodeTypes]
+                    [self.foundNodeTypes.append(node) for node in self.rootNodes if snapshot.nodeType(node) in nodeTypes]
                     log.debug('RootNode Matched by incRoots : %s', self.foundNodeTypes)
                 else:
                     try:
@@ -895,56 +1683,13 @@ class FilterNode(object):
         :param nodes: optional given node list, return animData in the nodes history
         :param safe: optional 'bool', only return animCurves which are safe to modify, this
                      will strip out SetDrivens, Clips curves etc..
+        
+        .. note::
+            the curves and their safe classification come from the ANIMCURVE_INDEX so repeat
+            calls in the same scene state don't touch the scene at all
         '''
-        animCurves=[]
-        treeDepth=2
-        if not nodes:
-            animCurves=cmds.ls(type='animCurve', r=True)
-        else:
-            try:
-                #fucking AnimLayers!! if present then we up the depth of the history search
-                #in-order to walk over the animBlendNodes to the actual animCurves.
-                if r9Anim.getAnimLayersFromGivenNodes(nodes):
-                    treeDepth=3
-                    log.debug('AnimLayers found, increasing search depth')
+        return ANIMCURVE_INDEX.lsAnimCurves(nodes, safe)
                 
-                    #Deal with curves linked to character sets or animation layer
-                    animCurves = [curve for curve in cmds.listHistory(nodes, pdo=True, lf=False, lv=treeDepth) \
-                                               if cmds.nodeType(curve, i=True)[0] == 'animCurve']
-                else:
-                    # animCurves=cmds.listConnections(nodes,s=True,d=False,type='animCurve')
-                    animCurves = [curve for curve in cmds.listHistory(nodes, pdo=True, lf=False, lv=treeDepth) \
-                                               if cmds.nodeType(curve, i=True)[0] == 'animCurve']
-            except:
-                pass
-        if not animCurves:
-            return []
-        if not safe:
-            return list(set(animCurves))
-        else:
-            safeCurves=list(animCurves)
-            for animCurve in animCurves:
-                #ignore referenced animCurves
-                if cmds.referenceQuery(animCurve, inr=True):
-                    safeCurves.remove(animCurve)
-                    continue
-                #ignore setDrivens : animCurve have input connections
-                if cmds.listConnections(animCurve, s=True, d=False):
-                    safeCurves.remove(animCurve)
-                    continue
-                #ignore animClip curve data : animCurve is part of a TraxClip
-                if cmds.nodeType(cmds.listConnections(animCurve))=='clipLibrary':
-                    safeCurves.remove(animCurve)
-                    continue
-                #ignore curve if FUCKING animlayer it's a member of is locked!
-                if cmds.getAttr("%s.ktv" % animCurve, l=True):
-                    safeCurves.remove(animCurve)
-                    continue
-                
-                #if curve.keyTimeValue.isLocked(): return False
-            return safeCurves
-                
-            
             
     # Attribute Management Block
     #---------------------------------------------------------------------------------
@@ -986,24 +1731,10 @@ class FilterNode(object):
         if not isinstance(searchAttrs, list):
             searchAttrs=[searchAttrs]
         
-        #Process and split the input list into 2 dicts
-        includeAttrs={}
-        excludeAttrs={}
-        for pattern in searchAttrs:
-            val = [None, None]  # why?? so that a value of False or 0 is still a value and not ignored!
-            pattern = pattern.replace(" ", "")  # strip whiteSpaces
-            attr = pattern
-            if '=' in pattern:
-                # print 'pattern has ='
-                val = [True, decodeString(pattern.split('=')[-1])]
-                attr = pattern.split('=')[0]
-            if 'NOT:' in pattern:
-                # print 'pattern NOT ='
-                excludeAttrs[(attr.split('NOT:')[-1])] = val
-            else:
-                includeAttrs[attr] = val
-        log.debug('includes : %s' % includeAttrs.items())
-        log.debug('excludes : %s' % excludeAttrs.items())
+        #Process and split the input list into the include and exclude dicts
+        plan=AttrSearchPlan.get(searchAttrs)
+        log.debug('includes : %s' % plan.includeAttrs.items())
+        log.debug('excludes : %s' % plan.excludeAttrs.items())
                  
         #Node block
         if not nodes:
@@ -1013,77 +1744,34 @@ class FilterNode(object):
                 nodes = self.lsHierarchy(incRoots=incRoots)
             if not nodes:
                 raise StandardError('No nodes found to process')
-               
+        
+        #Batch block, resolve the nodes once and read all the values the tests need in one pass
+        reader=ATTR_SEARCH_READER
+        mobjs=reader.resolve(nodes)
+        exists=lambda node, attr: reader.exists(mobjs.get(node), attr)
+        values=reader.readValues([(node, attr) for node in mobjs for attr in plan.valueAttrs()
+                                  if exists(node, attr)], mobjs)
+        getValue=lambda node, attr: values.get((node, attr))
+        
         #Search block
+        found=set()
+        returnPlugs=[]
         for node in nodes:
-            if includeAttrs:
-                #we have attrs that we have to validate against so add=False is default
-                add=False
-            else:
-                #we only have excluders so by default all nodes are added unless excluded
-                add=True
-                
-            #Main test block, does the node get through the filter?
-            for attr, val in includeAttrs.items():  # INCLUDE TESTS
-                if cmds.attributeQuery(attr, exists=True, node=node):
-                    if val[0]:  # value test
-                        if not type(val[1]) == float:
-                            if cmds.getAttr('%s.%s' % (node, attr)) == val[1]:
-                                add = True
-                                log.debug('attr %s : value %s == %s : node %s > ADD = True' % \
-                                    (attr, val[1], cmds.getAttr('%s.%s' % (node, attr)), node))
-                            else:
-                                add = False
-                                log.debug('attr %s : value %s != %s : node %s > ADD = False' % \
-                                    (attr, val[1], cmds.getAttr('%s.%s' % (node, attr)), node))
-                        else:
-                            if floatIsEqual(cmds.getAttr('%s.%s' % (node, attr)), val[1]):
-                                add = True
-                                log.debug('attr %s : Float value %f == %f : node %s > ADD = True' % \
-                                    (attr, val[1], cmds.getAttr('%s.%s' % (node, attr)), node))
-                            else:
-                                add = False
-                                log.debug('attr %s : Float value %f != %f : node %s > ADD = False' % \
-                                    (attr, val[1], cmds.getAttr('%s.%s' % (node, attr)), node))
-                    else:
-                        add=True
-                        log.debug('attr %s : node %s > ADD = True' % (attr, node))
-                    if not add:
-                        log.debug('attr Include : Value Mismatch found : <BREAKOUT>')
-                        break
-                    
-            for attr, val in excludeAttrs.items():  # EXCLUDE TESTS ('NOT:' operator)
-                if cmds.attributeQuery(attr, exists=True, node=node):
-                    if val[0]:  # value Test
-                        if not type(val[1]) == float:
-                            if cmds.getAttr('%s.%s' % (node, attr)) == val[1]:
-                                add = False
-                                log.debug('NOT: attr %s : Float value %s == %s : node %s > ADD = False' % \
-                                    (attr, val[1], cmds.getAttr('%s.%s' % (node, attr)), node))
-                        else:
-                            if floatIsEqual(cmds.getAttr('%s.%s' % (node, attr)), val[1]):
-                                add = False
-                                log.debug('NOT: attr %s : Float value %f == %f : node %s > ADD = False' % \
-                                    (attr, val[1], cmds.getAttr('%s.%s' % (node, attr)), node))
-                    else:
-                        add = False
-                        log.debug('NOT: attr %s : node %s > ADD = False' % (attr, node))
-                    log.debug('NOT: attr Exclude : found : <BREAKOUT>')
-                    break
-              
+            add, attr = plan.test(node, exists, getValue)
             #Test Complete, ADD the node to the return list
             if add:
                 if not returnValues:
-                    if node not in self.foundAttributes:
+                    if node not in found:
+                        found.add(node)
                         self.foundAttributes.append(node)
                 else:
-                    try:
-                        #WILL FAIL ON MESSAGE LINKS AS THEY HAVE NO VALUE
-                        attrDict[node] = cmds.getAttr('%s.%s' % (node, attr))
-                    except:
-                        attrDict[node] = None
-                        log.debug('Some Attribute Types such as Message attrs have no value')
-                        
+                    returnPlugs.append((node, attr))
+        
+        if returnValues:
+            values.update(reader.readValues([plug for plug in returnPlugs if not plug in values], mobjs))
+            for node, attr in returnPlugs:
+                attrDict[node] = values[(node, attr)]
+            
         if returnValues:
             return attrDict
         else:
@@ -1122,11 +1810,9 @@ class FilterNode(object):
             else:
                 include.append(pattern)
         
-        includePattern='|'.join(n for n in include)
-        incRegex=re.compile('('+includePattern+')')  # convert into a regularExpression
+        incRegex=REGEX_CACHE.compile(include)  # convert into a regularExpression
         if exclude:
-            excludePattern='|'.join(n for n in exclude)
-            excRegex=re.compile('('+excludePattern+')')  # convert into a regularExpression
+            excRegex=REGEX_CACHE.compile(exclude)
 
         #Node block
         log.debug('lsSearchNamePattern : params : searchPattern=%s, nodes=%s, incRoots=%i'\
@@ -1139,14 +1825,14 @@ class FilterNode(object):
             if not nodes:
                 raise StandardError('No nodes found to process')
             
-        #Actual Search calls
+        #Actual Search calls, names are stripped once for the list
+        stripped=[nodeNameStrip(node) for node in nodes]
         if exclude:
             log.debug('Exclude SearchPattern found : %s' % exclude)
-            for node in nodes:
-                if incRegex.search(nodeNameStrip(node)) and not excRegex.search(nodeNameStrip(node)):
-                    self.foundPattern.append(node)
+            self.foundPattern=[node for node, name in zip(nodes, stripped)
+                               if incRegex.search(name) and not excRegex.search(name)]
         else:
-            self.foundPattern=[node for node in nodes if incRegex.search(nodeNameStrip(node))]
+            self.foundPattern=[node for node, name in zip(nodes, stripped) if incRegex.search(name)]
                    
         return self.foundPattern
     
@@ -1258,6 +1944,38 @@ class FilterNode(object):
         as too much code both internally and externally relies on this method
         '''
         return self.processFilter()
+    
+    def __filterChain(self):
+        '''
+        the active filters for processFilter in the order they're run, each
+        takes the current intersection data and returns it's matched nodes
+        '''
+        settings=self.settings
+        chain=[]
+        # Straight Hierarchy Filter ----------------------
+        if settings.hierarchy:
+            chain.append(lambda nodes: self.lsHierarchy(incRoots=settings.incRoots,
+                                                        transformClamp=settings.transformClamp))
+        # MetaClass Filter ------------------------------
+        if settings.metaRig:
+            chain.append(lambda nodes: self.lsMetaRigControllers(incMain=settings.incRoots))
+        # NodeTypes Filter -------------------------------
+        if settings.nodeTypes:
+            chain.append(lambda nodes: self.lsSearchNodeTypes(settings.nodeTypes,
+                                                              nodes=nodes,
+                                                              incRoots=settings.incRoots,
+                                                              transformClamp=settings.transformClamp))
+        # NodeName Filter --------------------------------
+        if settings.searchPattern:
+            chain.append(lambda nodes: self.lsSearchNamePattern(settings.searchPattern,
+                                                                nodes=nodes,
+                                                                incRoots=settings.incRoots))
+        # Attribute Filter -------------------------------
+        if settings.searchAttrs:
+            chain.append(lambda nodes: self.lsSearchAttributes(settings.searchAttrs,
+                                                               nodes=nodes,
+                                                               incRoots=settings.incRoots))
+        return chain
         
     #@r9General.Timer
     def processFilter(self):
@@ -1273,69 +1991,35 @@ class FilterNode(object):
             :param settings.incRoots: Include the given root nodes in the search.
             
             :return: all nodes which match ALL the given keyword filter searches
+            
+            .. note::
+                The filters are run cheapest first and each one only searches the nodes that
+                got through the filters before it, bailing as soon as one matches nothing.
+                The name pattern is run before the attribute search as it makes no scene calls.
+                Each result is intersected in the order of the latest filter, as a set
+                membership test, so the results are the same as the old list based intersection.
+                The filters share one HierarchySnapshot of the rootNodes for the run.
             '''
             log.debug(self.settings.__dict__)
             self.intersectionData=[]
             
-            #wrap the intersector call
-            def addToIntersection(nodes):
-                if nodes:
-                    if self.intersectionData:
-                        # NOTE : Whilst set.intersection may be a faster and better solution
-                        # it doesn't retain the lists order, for some Hierarchy functions this
-                        # is crucial so switching this over to looping through in order
-                        self.intersectionData = [node for node in nodes if node in self.intersectionData]
-                    else:
-                        self.intersectionData = nodes
-                else:
-                    self.intersectionData = []
-            
             #If FilterSettings have no effect then just return the rootNodes
             if not self.settings.filterIsActive:
                 return self.rootNodes
             
-            # Straight Hierarchy Filter ----------------------
-            if self.settings.hierarchy:
-                nodes = self.lsHierarchy(incRoots=self.settings.incRoots,
-                                         transformClamp=self.settings.transformClamp)
-                addToIntersection(nodes)
-                if not nodes:
-                    return []
-            
-            # MetaClass Filter ------------------------------
-            if self.settings.metaRig:
-                nodes = self.lsMetaRigControllers(incMain=self.settings.incRoots)
-                addToIntersection(nodes)
-                if not nodes:
-                    return []
-                
-            # NodeTypes Filter -------------------------------
-            if self.settings.nodeTypes:
-                nodes = self.lsSearchNodeTypes(self.settings.nodeTypes,
-                                               nodes=self.intersectionData,
-                                               incRoots=self.settings.incRoots,
-                                               transformClamp=self.settings.transformClamp)
-                addToIntersection(nodes)
-                if not nodes:
-                    return []
-               
-            # Attribute Filter -------------------------------
-            if self.settings.searchAttrs:
-                nodes = self.lsSearchAttributes(self.settings.searchAttrs,
-                                                nodes=self.intersectionData,
-                                                incRoots=self.settings.incRoots)
-                addToIntersection(nodes)
-                if not nodes:
-                    return []
-                  
-            # NodeName Filter --------------------------------
-            if self.settings.searchPattern:
-                nodes = self.lsSearchNamePattern(self.settings.searchPattern,
-                                                 nodes=self.intersectionData,
-                                                 incRoots=self.settings.incRoots)
-                addToIntersection(nodes)
-                if not nodes:
-                    return []
+            if self.processMode=='Selected':
+                self._snapshot=HierarchySnapshot(self.rootNodes, self.snapshotBackend)
+            try:
+                for nodeFilter in self.__filterChain():
+                    nodes = nodeFilter(self.intersectionData)
+                    if not nodes:
+                        self.intersectionData = []
+                        return []
+                    self.intersectionData = intersectNodeLists(self.intersectionData, nodes)
+                    if not self.intersectionData:
+                        return []
+            finally:
+                self._snapshot=None
                 
             # use the prioritizeNodeList call to order the list based on a given set of priority's
             if self.settings.filterPriority:
@@ -1403,6 +2087,122 @@ def getBlendTargetIndex(blendNode, targetName):
 
 # Node Matching ----------------------------------------------------------------------
             
+class NodeListMatcher(object):
+    '''
+    Pairs up 2 node lists for matchNodeLists. Rather than testing every node in A against
+    every node in B, each list is normalised once into a hash index for the matchMethod so
+    pairing is O(N+M), name length aside:
+    
+        * *base* : index B by the upper case shortName
+        * *mirrorIndex* : index B by the mirror ID, only read once per node
+        * *stripPrefix* : exact names are found in the base index, the prefix rule, that
+          either name ends with the other, is answered by also indexing every suffix of B
+    
+    Each A node is paired with the first remaining B node in list order that matches, so the
+    pairs are exactly those the old nested loop gave. Whilst matching, the nodes left unmatched
+    and any A nodes that had more than one B candidate are recorded for diagnostics().
+    '''
+    def __init__(self, nodeListA, nodeListB, matchMethod='stripPrefix'):
+        self.nodeListA=list(nodeListA)
+        self.nodeListB=list(nodeListB)
+        self.matchMethod=matchMethod
+        self.matchedData=[]
+        self.ambiguous={}    # nodeA : [matched nodeB, other candidate nodeB]
+        self.unmatchedA=[]
+        self.unmatchedB=[]
+        
+    def __keyFunc(self):
+        if self.matchMethod=='mirrorIndex':
+            return r9Anim.MirrorHierarchy().getMirrorCompiledID
+        return lambda node: nodeNameStrip(node).upper()
+        
+    def __buildIndex(self, keys, suffixes=False):
+        '''
+        index of key : deque of B indexes in list order. With suffixes every suffix of
+        each key is indexed, including the empty suffix, as all keys end with ''
+        '''
+        index={}
+        for i, key in enumerate(keys):
+            if suffixes:
+                for c in range(len(key) + 1):
+                    index.setdefault(key[c:], deque()).append(i)
+            elif key or not self.matchMethod=='mirrorIndex':
+                index.setdefault(key, deque()).append(i)
+        return index
+    
+    def __first(self, bucket, taken):
+        # drop the B nodes already paired from the front of the bucket
+        while bucket and taken[bucket[0]]:
+            bucket.popleft()
+        if bucket:
+            return bucket[0]
+    
+    def __nextCandidate(self, buckets, taken, matched):
+        '''
+        any other remaining B node in the buckets, for the ambiguity diagnostics
+        '''
+        for bucket in buckets:
+            for i in bucket:
+                if not taken[i] and not i==matched:
+                    return i
+        
+    def match(self):
+        '''
+        :return: matched pairs of tuples for processing [(a1,b1),(a2,b2)]
+        '''
+        self.matchedData=[]
+        self.ambiguous={}
+        if self.matchMethod=='index':
+            self.matchedData=zip(self.nodeListA, self.nodeListB)
+        elif self.matchMethod=='indexReversed':
+            self.matchedData=zip(self.nodeListA[::-1], self.nodeListB[::-1])
+        else:
+            keyFunc=self.__keyFunc()
+            keysB=[keyFunc(node) for node in self.nodeListB]
+            exact=self.__buildIndex(keysB)
+            if self.matchMethod=='stripPrefix':
+                endsWith=self.__buildIndex(keysB, suffixes=True)
+            taken=[False] * len(self.nodeListB)
+            for nodeA in self.nodeListA:
+                keyA=keyFunc(nodeA)
+                if self.matchMethod=='stripPrefix':
+                    #B ends with A, or A ends with B ie B is one of A's suffixes
+                    buckets=[endsWith.get(keyA)] + [exact.get(keyA[c:]) for c in range(len(keyA) + 1)]
+                elif self.matchMethod=='base' or (self.matchMethod=='mirrorIndex' and keyA):
+                    buckets=[exact.get(keyA)]
+                else:
+                    buckets=[]
+                buckets=[bucket for bucket in buckets if bucket]
+                firsts=[i for i in (self.__first(bucket, taken) for bucket in buckets) if i is not None]
+                if not firsts:
+                    continue
+                matched=min(firsts)
+                other=self.__nextCandidate(buckets, taken, matched)
+                if other is not None:
+                    self.ambiguous[nodeA]=[self.nodeListB[matched], self.nodeListB[other]]
+                taken[matched]=True
+                self.matchedData.append((nodeA, self.nodeListB[matched]))
+        matchedA=set(a for a, _ in self.matchedData)
+        matchedB=set(b for _, b in self.matchedData)
+        self.unmatchedA=[node for node in self.nodeListA if not node in matchedA]
+        self.unmatchedB=[node for node in self.nodeListB if not node in matchedB]
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('\nMatched Log : \n%s' % '\n'.join('Match Method : %s : %s == %s' %
+                        (self.matchMethod, a.split('|')[-1], b.split('|')[-1]) for a, b in self.matchedData))
+        return self.matchedData
+    
+    def diagnostics(self):
+        '''
+        :return: dict of the matched pairs, the unmatched nodes in A and B and the
+            ambiguous A nodes that had more than one B candidate when they were paired
+        '''
+        return {'matchMethod':self.matchMethod,
+                'matched':list(self.matchedData),
+                'unmatchedA':list(self.unmatchedA),
+                'unmatchedB':list(self.unmatchedB),
+                'ambiguous':dict(self.ambiguous)}
+
+
 def matchNodeLists(nodeListA, nodeListB, matchMethod='stripPrefix'):
     '''
     Matches 2 given NODE LISTS by node name via various methods.
@@ -1412,7 +2212,7 @@ def matchNodeLists(nodeListA, nodeListB, matchMethod='stripPrefix'):
         lists together in the order they were given
         
         *indexReversed*: No intelligent matching, just purely zip the 
-        lists together in the order they were given
+        lists together in reverse order
         
         *base*:  Match each element by exact name (shortName) 
         such that Spine==Spine or REF1:Spine==REF2:Spine
@@ -1424,62 +2224,11 @@ def matchNodeLists(nodeListA, nodeListB, matchMethod='stripPrefix'):
         
     :return: matched pairs of tuples for processing [(a1,b2),[(a2,b2)]
     
+    .. note::
+        the matching is done by a NodeListMatcher, use that directly if you
+        need the diagnostics for the unmatched and ambiguous nodes
     '''
-
-    infoPrint = ""
-    matchedData = []
-    
-    #take a copy of B as we modify the data here
-    hierarchyB=list(nodeListB)
-    if matchMethod == 'mirrorIndex':
-        getMirrorID=r9Anim.MirrorHierarchy().getMirrorCompiledID
-    if matchMethod == 'index':
-        matchedData = zip(nodeListA,nodeListB)
-    elif matchMethod == 'indexReversed':
-        nodeListA.inverse()
-        nodeListB.inverse()
-        matchedData = zip(nodeListA,nodeListB)
-    else:
-        for nodeA in nodeListA:
-            strippedA = nodeNameStrip(nodeA)
-            if matchMethod == 'mirrorIndex':
-                indexA=getMirrorID(nodeA)
-            for nodeB in hierarchyB:
-                #strip the path off for the compare
-                #strippedA = nodeNameStrip(nodeA)
-                strippedB = nodeNameStrip(nodeB)
-                
-                #BaseMatch is a direct compare ONLY
-                if matchMethod == 'base':
-                    if strippedA.upper() == strippedB.upper():
-                        infoPrint += '\nMatch Method : %s : %s == %s' % \
-                                (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
-                        matchedData.append((nodeA, nodeB))
-                        hierarchyB.remove(nodeB)
-                        break
-                    
-                #Compare allowing for prefixing which is stripped off
-                elif matchMethod == 'stripPrefix':
-                    if strippedA.upper().endswith(strippedB.upper()) \
-                        or strippedB.upper().endswith(strippedA.upper()):
-                        infoPrint += '\nMatch Method : %s : %s == %s' % \
-                                (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
-                        matchedData.append((nodeA, nodeB))
-                        hierarchyB.remove(nodeB)
-                        break
-                    
-                #Compare using the nodes internal mirrorIndex if found
-                elif matchMethod == 'mirrorIndex':
-                    if indexA and indexA==getMirrorID(nodeB):
-                        infoPrint += '\nMatch Method : %s : %s == %s' % \
-                                (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
-                        matchedData.append((nodeA, nodeB))
-                        hierarchyB.remove(nodeB)
-                        break
-                    
-    log.debug('\nMatched Log : \n%s' % infoPrint)
-    infoPrint = None
-    return matchedData
+    return NodeListMatcher(nodeListA, nodeListB, matchMethod).match()
 
 
 def processMatchedNodes(nodes=None, filterSettings=None, toMany=False, matchMethod='stripPrefix'):
@@ -1605,6 +2354,126 @@ class MatchedNodeInputs(object):
         return self.MatchedPairs
 
 
+class ChannelState(object):
+    '''
+    Bulk channel state engine used by LockChannels. The keyable, channelBox and lock
+    flags of every plug are read once via the api into a table, the calls then only
+    record the state they want, and apply() diffs the 2 and sets just the flags that
+    actually change, one setAttr per plug carrying all it's changed flags, inside one
+    undo chunk.
+    
+    >>> state=ChannelState()
+    >>> for attr in state.read(node, ['translate', 'v']):
+    >>>     state.setDesired(node, attr, lock=True, keyable=False)
+    >>> state.apply(dryRun=True)  # just return the diff
+    '''
+    flags=['keyable', 'channelBox', 'lock']  # order the flags are set in if a plug's combined setAttr fails
+    
+    def __init__(self):
+        self.plugs=[]     # plug names in the order they were first read
+        self.current={}   # plug : {flag : bool}
+        self.desired={}   # plug : {flag : bool}
+        
+    def getPlug(self, fn, node, attr):
+        '''
+        plugs are found from the node's MFnDependencyNode, element and child plug
+        paths, ie 'weight[0]', aren't attr names so they go via an MSelectionList
+        '''
+        if not '[' in attr and not '.' in attr:
+            return fn.findPlug(attr, False)
+        selList=OpenMaya.MSelectionList()
+        selList.add('%s.%s' % (node, attr))
+        plug=OpenMaya.MPlug()
+        selList.getPlug(0, plug)
+        return plug
+    
+    def read(self, node, attrs, expand=True):
+        '''
+        read the channel state of the given attrs on a node
+        
+        :param expand: expand compound double3/float3 attrs to their children as Maya
+            fails to set the keyable flag on the compound itself
+        :return: the attrs found on the node
+        '''
+        found=[]
+        try:
+            fn=OpenMaya.MFnDependencyNode(r9Meta.getMObject(node))
+        except RuntimeError:
+            return found
+        for attr in attrs:
+            try:
+                plug=self.getPlug(fn, node, attr)
+            except RuntimeError:
+                continue
+            plugs=[(attr, plug)]
+            if expand and plug.isCompound() and cmds.getAttr('%s.%s' % (node, attr), type=True) in ['double3', 'float3']:
+                log.debug('compoundAttr handler for node: %s.%s' % (node, attr))
+                plugs=[(OpenMaya.MFnAttribute(plug.child(i).attribute()).name(), plug.child(i))
+                       for i in range(plug.numChildren())]
+            for childAttr, childPlug in plugs:
+                name='%s.%s' % (node, childAttr)
+                if not name in self.current:
+                    self.plugs.append(name)
+                    self.current[name]={'keyable':childPlug.isKeyable(),
+                                        'channelBox':childPlug.isChannelBoxFlagSet(),
+                                        'lock':childPlug.isLocked()}
+                found.append(childAttr)
+        return found
+    
+    def setDesired(self, node, attr, **flags):
+        '''
+        record the wanted state of a plug read by read(), later calls override
+        the earlier flags. cb is accepted as the short form of channelBox
+        '''
+        if 'cb' in flags:
+            flags['channelBox']=flags.pop('cb')
+        self.desired.setdefault('%s.%s' % (node, attr), {}).update(flags)
+    
+    def diff(self):
+        '''
+        :return: list of (plug, {flag : (current, desired)}) for the plugs with flags to change
+        '''
+        changes=[]
+        for plug in self.plugs:
+            if not plug in self.desired:
+                continue
+            changed=dict((flag, (self.current[plug][flag], value))
+                         for flag, value in self.desired[plug].items()
+                         if not self.current[plug][flag]==value)
+            if changed:
+                changes.append((plug, changed))
+        return changes
+    
+    def apply(self, dryRun=False):
+        '''
+        set the changed flags, one setAttr per plug with all it's flags. If that fails
+        the flags are set one at a time so the rest still go through
+        
+        :param dryRun: don't set anything, just return the diff
+        :return: the diff
+        '''
+        changes=self.diff()
+        if dryRun:
+            for plug, changed in changes:
+                log.info('%s : %s' % (plug, changed))
+            return changes
+        with r9General.undoContext():
+            for plug, changed in changes:
+                try:
+                    cmds.setAttr(plug, **dict((flag, values[1]) for flag, values in changed.items()))
+                except StandardError:
+                    for flag in self.flags:
+                        if flag in changed:
+                            try:
+                                cmds.setAttr(plug, **{flag:changed[flag][1]})
+                            except StandardError, error:
+                                log.info(error)
+        for plug, changed in changes:
+            for flag, values in changed.items():
+                self.current[plug][flag]=values[1]
+        return changes
+
+
 class LockChannels(object):
     '''
     Simple UI to manage the lock and key status of nodes
@@ -1840,11 +2709,16 @@ class LockChannels(object):
         build the internal dict thats stored and used by the save/load calls
         '''
         self.statusDict={}
+        state=ChannelState()
         for node in nodes:
             key=nodeNameStrip(node)
+            keyable=cmds.listAttr(node, k=True) or []
+            state.read(node, keyable, expand=False)
+            locked=[attr for attr in keyable if state.current.get('%s.%s' % (node, attr), {}).get('lock')]
+            unlocked=[attr for attr in keyable if not attr in locked]
             self.statusDict[key]={}
-            self.statusDict[key]['keyable']=cmds.listAttr(node, k=True, u=True)
-            self.statusDict[key]['locked'] =cmds.listAttr(node, k=True, l=True)
+            self.statusDict[key]['keyable']=unlocked or None
+            self.statusDict[key]['locked'] =locked or None
             self.statusDict[key]['nonKeyable'] =cmds.listAttr(node, cb=True)
     
     def saveChannelMap(self, filepath=None, nodes=None, hierarchy=True, serializeNode=None):
@@ -1880,11 +2754,13 @@ class LockChannels(object):
                 raise StandardError(error)
         log.info('<< AttrMap Processed >>')
         
-    def loadChannelMap(self, filepath=None, nodes=None, hierarchy=True, serializeNode=None):
+    def loadChannelMap(self, filepath=None, nodes=None, hierarchy=True, serializeNode=None, dryRun=False):
         '''
         From a given chnMap file restore the channelBox status for all attributes
         found that are in the map file. ie, keyable, hidden, locked
         
+        :param dryRun: don't change anything, return the ChannelState diff of what would change
+        
         .. note:: 
             Here we're dealing with 2 possible sets of data, either decoded by the
             ConfigObj decoder or a JSON deserializer and there's subtle differences in the dict
@@ -1906,46 +2782,30 @@ class LockChannels(object):
             else:
                 raise StandardError('attrMap not found on given node')
             
+        state=ChannelState()
         for node in nodes:
             key=nodeNameStrip(node)
             if key in self.statusDict:
                 
                 #managed node so first hide and lock all current CBattrs
                 currentAttrs=r9Anim.getChannelBoxAttrs(node, asDict=False)
-                for attr in currentAttrs:
-                    try:
-                        cmds.setAttr('%s.%s' %(node, attr), keyable=False, lock=True, channelBox=False)
-                    except:
-                        log.info('%s : failed to set initial state' % attr)
+                for attr in state.read(node, currentAttrs, expand=False):
+                    state.setDesired(node, attr, keyable=False, lock=True, channelBox=False)
                         
-                #NOTE: this looks a slow way of processing but an Attr will
-                #only ever appear in one of these lists so not really an overhead
-                if not decodeString(self.statusDict[key]['keyable'])==None:
-                    for attr in self.statusDict[key]['keyable']:
-                        try:
-                            #print 'keyable',attr
-                            cmds.setAttr('%s.%s' %(node, attr), k=True, l=False)
-                        except:
-                            log.debug('%s : failed to set keyable attr status' % attr)
-                if not decodeString(self.statusDict[key]['locked'])==None:
-                    for attr in self.statusDict[key]['locked']:
-                        try:
-                            #print 'locked',attr
-                            cmds.setAttr('%s.%s' %(node, attr), k=True, l=True)
-                        except:
-                            log.debug('%s : failed to set locked attr status' % attr)
-                if not decodeString(self.statusDict[key]['nonKeyable'])==None:
-                    for attr in self.statusDict[key]['nonKeyable']:
-                        try:
-                            #print 'nonKeyable',attr
-                            cmds.setAttr('%s.%s' %(node, attr), cb=True)
-                            cmds.setAttr('%s.%s' %(node, attr), l=False, k=False)
-                        except:
-                            log.debug('%s : failed to set nonKeyable attr status' % attr)
+                #then the mapped states on top, an Attr will only ever appear in one of these lists
+                for mapKey, flags in [('keyable', {'keyable':True, 'lock':False}),
+                                      ('locked', {'keyable':True, 'lock':True}),
+                                      ('nonKeyable', {'channelBox':True, 'lock':False, 'keyable':False})]:
+                    if not decodeString(self.statusDict[key][mapKey])==None:
+                        for attr in state.read(node, self.statusDict[key][mapKey], expand=False):
+                            state.setDesired(node, attr, **flags)
+        changes=state.apply(dryRun=dryRun)
+        if dryRun:
+            return changes
         log.info('<< AttrMap Processed >>')
         
     @staticmethod
-    def processState(nodes, attrs, mode, hierarchy=False, userDefined=False):
+    def processState(nodes, attrs, mode, hierarchy=False, userDefined=False, dryRun=False):
         '''
         Easy wrapper to manage channels that are keyable / locked
         in the channelBox.
@@ -1955,10 +2815,11 @@ class LockChannels(object):
         :param mode: 'lock', 'unlock', 'hide', 'unhide', 'fullkey', 'lockall'
         :param hierarchy: process all child nodes, default is now False
         :param usedDefined: process all UserDefined attributes on all nodes
+        :param dryRun: don't change anything, just return the diff
+        :return: the ChannelState diff, list of (plug, {flag : (current, desired)})
         
         >>> r9Core.LockChannels.processState(nodes, attrs=["sx", "sy", "sz", "v"], mode='lockall')
         '''
-        userDefAttrs=set()
         if not nodes:
             nodes = cmds.ls(sl=True, l=True)
         else:
@@ -1985,9 +2846,9 @@ class LockChannels(object):
         elif mode=='unhide':
             attrKws['keyable']=True
         elif mode=='nonkeyable':
-            attrKws['cb']=True
+            attrKws['channelBox']=True
         elif mode=='keyable':
-            attrKws['cb']=False
+            attrKws['channelBox']=False
         elif mode=='fullkey':
             attrKws['keyable']=True
             attrKws['lock']=False
@@ -1995,27 +2856,16 @@ class LockChannels(object):
             attrKws['keyable']=False
             attrKws['lock']=True
             
+        state=ChannelState()
         for node in nodes:
+            userDefAttrs=set()
             if userDefined:
                 userDef=cmds.listAttr(node, ud=True, se=True)
                 if userDef:
                     userDefAttrs=set(userDef)
-            for attr in (attrs | userDefAttrs):
-                try:
-                    #log.debug('node: %s.%s' % (node,attr))
-                    if cmds.attributeQuery(attr, node=node, exists=True):
-                        attrString='%s.%s' % (node, attr)
-                        if cmds.getAttr(attrString, type=True) in ['double3','float3']:
-                            #why?? Maya fails to set the 'keyable' flag status for compound attrs!
-                            childAttrs=cmds.listAttr(attrString, multi=True)
-                            childAttrs.remove(attr)
-                            log.debug('compoundAttr handler for node: %s.%s' % (node,attr))
-                            for childattr in childAttrs:
-                                cmds.setAttr('%s.%s' % (node, childattr), **attrKws)
-                        else:
-                            cmds.setAttr(attrString, **attrKws)
-                except StandardError, error:
-                    log.info(error)
+            for attr in state.read(node, attrs | userDefAttrs):
+                state.setDesired(node, attr, **attrKws)
+        return state.apply(dryRun=dryRun)
                 
 
 def timeOffset_addPadding(pad=None, padfrom=None, scene=False):
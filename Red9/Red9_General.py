@@ -26,6 +26,9 @@ import tempfile
 import subprocess
 import json
 import itertools
+import threading
+import thread
+import timeit
 
 #Only valid Red9 import
 import Red9.startup.setup as r9Setup
@@ -45,8 +48,7 @@ def getCurrentFPS():
     '''
     returns the current frames per second as a number, rather than a useless string
     '''
-    fpsDict = {"game":15.0, "film":24.0, "pal":25.0, "ntsc":30.0, "show":48.0, "palf":50.0, "ntscf":60.0}
-    return fpsDict[cmds.currentUnit(q=True, fullName=True, time=True)]
+    return r9Setup.getCurrentFPS()
 
 
 def forceToString(text):
@@ -216,7 +218,7 @@ def runProfile(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
         currentTime = strftime("%d-%m-%H.%M.%S", gmtime())
-        dumpFileName = 'c:/%s(%s).profile' % (func.__name__, currentTime)
+        dumpFileName = os.path.join(tempfile.gettempdir(), '%s(%s).profile' % (func.__name__, currentTime))
         def command():
             func(*args, **kwargs)
         profile = cProfile.runctx("command()", globals(), locals(), dumpFileName)
@@ -224,6 +226,213 @@ def runProfile(func):
     return wrapper
 
 
+class ProfiledCmds(object):
+    '''
+    Stands in for maya.cmds inside a module for the SceneTrafficProfiler. Every call
+    made through it is timed and handed to the profiler, then passed on to the real cmds
+    '''
+    def __init__(self, cmds, profiler):
+        self.cmds = cmds
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        command = getattr(self.cmds, name)
+        if not callable(command):
+            return command
+        profiler = self.profiler
+
+        def profiled(*args, **kws):
+            if not profiler.active:
+                return command(*args, **kws)
+            start = timeit.default_timer()
+            try:
+                return command(*args, **kws)
+            finally:
+                profiler.record(name, timeit.default_timer() - start, sys._getframe(1))
+        return profiled
+
+
+class SceneTrafficProfiler(object):
+    '''
+    CONTEXT MANAGER : CONTEXT MANAGER :
+    ----------------------------------
+    Counting and sampling profiler for the scene traffic a tool makes through the cmds
+    facade of the given modules, ie Red9_Meta. Whilst active each cmds call is counted
+    and timed per command, per MetaClass method and per caller, the caller being the
+    first frame outside the profiled modules, so you can see which tool is hammering
+    the scene. If a sampleInterval is given the main thread's stack is also sampled.
+    
+    Stacks are written out in the folded text format that flamegraph.pl and
+    speedscope read, so a report can be attached straight to a bug.
+    
+    >>> import Red9.Red9_General as r9General
+    >>> import Red9.Red9_Meta as r9Meta
+    >>> with r9General.SceneTrafficProfiler(modules=[r9Meta]) as profile:
+    >>>     r9Meta.getMetaRigs()[0].getChildren()
+    >>> print profile.report()
+    >>> profile.writeFlameGraph()
+    '''
+    def __init__(self, modules=[], sampleInterval=None, stackDepth=40):
+        '''
+        :param modules: modules whose cmds are wrapped whilst the profiler is active
+        :param sampleInterval: seconds between stack samples, None to only count calls
+        :param stackDepth: max number of frames recorded per call
+        '''
+        if not type(modules)==list:
+            modules = [modules]
+        self.modules = modules
+        self.sampleInterval = sampleInterval
+        self.stackDepth = stackDepth
+        self.internal = set(os.path.splitext(os.path.normpath(module.__file__))[0] for module in modules)
+        self.internal.add(os.path.splitext(os.path.normpath(__file__))[0])
+        self.active = False
+        self.__metaTypes = {}
+        self.__sampler = None
+        self.reset()
+
+    def reset(self):
+        self.commands = {}  # command : [count, seconds]
+        self.methods = {}   # MetaClass.method : [count, seconds]
+        self.callers = {}   # module:function:line : [count, seconds]
+        self.stacks = {}    # folded stack : [count, seconds]
+        self.samples = {}   # folded stack : count
+        self.elapsed = 0.0
+        self._started = None
+
+    def start(self):
+        if self.active:
+            return
+        for module in self.modules:
+            if not isinstance(module.cmds, ProfiledCmds):
+                module.cmds = ProfiledCmds(module.cmds, self)
+        self.active = True
+        self._started = timeit.default_timer()
+        if self.sampleInterval:
+            self.__sampler = threading.Thread(target=self.__sample, args=(thread.get_ident(),))
+            self.__sampler.daemon = True
+            self.__sampler.start()
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        self.elapsed += timeit.default_timer() - self._started
+        for module in self.modules:
+            if isinstance(module.cmds, ProfiledCmds) and module.cmds.profiler is self:
+                module.cmds = module.cmds.cmds
+        if self.__sampler:
+            self.__sampler.join()
+            self.__sampler = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        # never swallow the exception, the report is still there to inspect
+        return False
+
+    def __isMetaClass(self, obj):
+        cls = type(obj)
+        if not cls in self.__metaTypes:
+            self.__metaTypes[cls] = any(base.__name__ == 'MetaClass' for base in getattr(cls, '__mro__', []))
+        return self.__metaTypes[cls]
+
+    def __frameLabel(self, code, obj=None):
+        if obj is not None:
+            return '%s.%s' % (type(obj).__name__, code.co_name)
+        return '%s.%s' % (os.path.splitext(os.path.basename(code.co_filename))[0], code.co_name)
+
+    def record(self, command, elapsed, frame):
+        '''
+        record a cmds call, frame being the frame that made the call
+        '''
+        frames = []
+        method = None
+        caller = None
+        while frame and len(frames) < self.stackDepth:
+            code = frame.f_code
+            obj = None
+            if code.co_argcount and code.co_varnames[0] == 'self':
+                obj = frame.f_locals.get('self')
+            label = self.__frameLabel(code, obj)
+            if method is None and obj is not None and self.__isMetaClass(obj):
+                method = label
+            if caller is None and not os.path.splitext(os.path.normpath(code.co_filename))[0] in self.internal:
+                caller = '%s:%i' % (label, frame.f_lineno)
+            frames.append(label)
+            frame = frame.f_back
+        frames.reverse()
+        frames.append('cmds.%s' % command)
+        for store, key in ((self.commands, command), (self.methods, method or '<no MetaClass>'),
+                           (self.callers, caller or '<internal>'), (self.stacks, ';'.join(frames))):
+            entry = store.setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def __sample(self, ident):
+        while self.active:
+            frame = sys._current_frames().get(ident)
+            frames = []
+            while frame and len(frames) < self.stackDepth:
+                frames.append(self.__frameLabel(frame.f_code))
+                frame = frame.f_back
+            if frames:
+                stack = ';'.join(reversed(frames))
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+            time.sleep(self.sampleInterval)
+
+    def report(self, limit=15):
+        '''
+        return a text report of the busiest commands, MetaClass methods and callers
+        '''
+        calls = sum(count for count, _ in self.commands.values())
+        seconds = sum(t for _, t in self.commands.values())
+        lines = ['Scene traffic : %i cmds calls taking %0.3f ms over %0.3f ms' % (calls, seconds * 1000.0, self.elapsed * 1000.0)]
+        for title, store in (('Commands', self.commands), ('MetaClass methods', self.methods), ('Callers', self.callers)):
+            lines.append('')
+            lines.append('%s :' % title)
+            for key, (count, t) in sorted(store.items(), key=lambda item: item[1][0], reverse=True)[:limit]:
+                lines.append('    %8i  %10.3f ms  %s' % (count, t * 1000.0, key))
+        if self.samples:
+            lines.append('')
+            lines.append('Stack samples : %i' % sum(self.samples.values()))
+        return '\n'.join(lines)
+
+    def writeReport(self, filepath=None):
+        if not filepath:
+            filepath = os.path.join(tempfile.gettempdir(), 'r9SceneTraffic_%s.txt' % time.strftime('%Y%m%d-%H%M%S'))
+        with open(filepath, 'w') as f:
+            f.write(self.report(limit=None))
+        log.info('Scene traffic report written : %s' % filepath)
+        return filepath
+
+    def writeFlameGraph(self, filepath=None, weight='calls'):
+        '''
+        write the recorded stacks in the folded format, one 'frame;frame;frame weight' per line
+        
+        :param weight: 'calls' for the cmds call counts, 'time' for the cmds time in
+            microseconds or 'samples' for the sampled main thread stacks
+        '''
+        if not weight in ['calls', 'time', 'samples']:
+            raise ValueError('weight must be calls, time or samples : %s' % weight)
+        if not filepath:
+            filepath = os.path.join(tempfile.gettempdir(), 'r9SceneTraffic_%s.folded' % time.strftime('%Y%m%d-%H%M%S'))
+        if weight == 'samples':
+            folded = self.samples.items()
+        elif weight == 'time':
+            folded = [(stack, int(t * 1000000)) for stack, (_, t) in self.stacks.items()]
+        else:
+            folded = [(stack, count) for stack, (count, _) in self.stacks.items()]
+        with open(filepath, 'w') as f:
+            for stack, value in sorted(folded):
+                if value:
+                    f.write('%s %i\n' % (stack, value))
+        log.info('Scene traffic flame graph written : %s' % filepath)
+        return filepath
+
+
 def evalManager_DG(func):
     '''
     DECORATOR : DECORATOR : DECORATOR :
@@ -38,15 +38,22 @@ import maya.mel as mel
 import maya.OpenMaya as OpenMaya
 from functools import partial
 from functools import wraps
+from contextlib import contextmanager
+from collections import OrderedDict
+from collections import deque
 import sys
 import os
 import uuid
+import struct
+import zlib
+import math
+import base64
+import hashlib
+import cPickle
 
 
 import Red9.startup.setup as r9Setup
 import Red9_General as r9General
-import Red9_CoreUtils as r9Core
-import Red9_AnimationUtils as r9Anim
 
 # Language map is used for all UI's as a text mapping for languages
 LANGUAGE_MAP = r9Setup.LANGUAGE_MAP
@@ -55,7 +62,9 @@ LANGUAGE_MAP = r9Setup.LANGUAGE_MAP
 # =============================================
 # NOTE: we can't import anything else here that imports this
 # Module as it screw the Class Registry and we get Cyclic imports
-# hence the r9Anim is LazyLoaded where needed
+# hence r9Core and r9Anim are LazyLoaded where needed, this also
+# keeps the import of Red9_Meta light for batch and farm jobs
+# import Red9_CoreUtils as r9Core
 # import Red9_AnimationUtils as r9Anim
 # =============================================
 
@@ -73,13 +82,14 @@ except:
     #import Red9.packages.simplejson as json
     
     
-global RED9_META_NODECACHE
-RED9_META_NODECACHE = {}
-
 global RED9_META_CALLBACKS
 RED9_META_CALLBACKS = {}
 RED9_META_CALLBACKS['Open'] = []
 RED9_META_CALLBACKS['New'] = []
+RED9_META_CALLBACKS['NodeRemoved'] = []
+RED9_META_CALLBACKS['NodeRenamed'] = []
+RED9_META_CALLBACKS['Connection'] = []
+RED9_META_CALLBACKS['ReferenceLoad'] = []
 #RED9_META_CALLBACKS['DuplicatePre'] = []
 #RED9_META_CALLBACKS['DuplicatePost'] = []
         
@@ -87,6 +97,12 @@ RED9_META_CALLBACKS['New'] = []
 global __RED9_META_NODESTORE__
 __RED9_META_NODESTORE__ = []
 
+# className : module, lets the registry answer for MetaClass's whose module
+# hasn't been imported yet. Extra manifests can be given as json files
+# via the RED9_META_MANIFEST environment variable, os.pathsep separated
+global RED9_META_MANIFEST
+RED9_META_MANIFEST = {}
+
 '''
 CRUCIAL - REGISTER INHERITED CLASSES! ==============================================
 Register available MetaClass's to a global so that other modules could externally 
@@ -101,13 +117,115 @@ global RED9_META_REGISTERY
 # --- FactoryClass registry --- --------------------------
 # ----------------------------------------------------------------------------
 
+class MetaClassRegistry(dict):
+    '''
+    The RED9_META_REGISTERY. As well as the MetaClass's currently imported this
+    also answers for the classes recorded in the RED9_META_MANIFEST, the module
+    that defines them is only imported the first time that class is asked for.
+    This means a batch job can import Red9_Meta alone and still resolve nodes
+    bound to classes in modules that it never imported.
+    '''
+    def __missing__(self, key):
+        if not key in RED9_META_MANIFEST:
+            raise KeyError(key)
+        self.importMClassModule(key)
+        if not dict.__contains__(self, key):
+            raise KeyError(key)
+        return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in RED9_META_MANIFEST
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return dict.keys(self) + [key for key in RED9_META_MANIFEST if not dict.__contains__(self, key)]
+
+    def values(self):
+        self.resolve()
+        return dict.values(self)
+
+    def items(self):
+        self.resolve()
+        return dict.items(self)
+
+    def importMClassModule(self, key):
+        '''
+        import the module that the manifest records for the given class and
+        re-register the inheritance mapping so the new classes are picked up
+        '''
+        module=RED9_META_MANIFEST[key]
+        log.debug('lazy importing : %s for mClass : %s' % (module, key))
+        try:
+            __import__(module)
+        except ImportError, error:
+            log.warning('MetaClass %s : failed to import manifest module %s : %s' % (key, module, error))
+            RED9_META_MANIFEST.pop(key, None)
+            return
+        registerMClassInheritanceMapping()
+        if not dict.__contains__(self, key):
+            # stale manifest entry, don't keep importing for it
+            RED9_META_MANIFEST.pop(key, None)
+
+    def resolve(self):
+        '''
+        import all the outstanding manifest modules, used when we need the actual class objects
+        '''
+        for key in RED9_META_MANIFEST.keys():
+            if key in RED9_META_MANIFEST and not dict.__contains__(self, key):
+                self.importMClassModule(key)
+
+
 def registerMClassInheritanceMapping():
     global RED9_META_REGISTERY
-    RED9_META_REGISTERY={}
-    RED9_META_REGISTERY['MetaClass']=MetaClass
+    # refill the existing registry so that anything holding it stays current
+    registry=globals().get('RED9_META_REGISTERY')
+    if not isinstance(registry, MetaClassRegistry):
+        registry=MetaClassRegistry()
+    registry.clear()
+    registry['MetaClass']=MetaClass
     for mclass in r9General.itersubclasses(MetaClass):
         log.debug('registering : %s' % mclass)
-        RED9_META_REGISTERY[mclass.__name__]=mclass
+        registry[mclass.__name__]=mclass
+    RED9_META_REGISTERY=registry
+
+def registerMClassManifest(manifest):
+    '''
+    record MetaClass's against the module that defines them without importing it.
+    The RED9_META_REGISTERY then imports that module the first time the class is used
+    
+    :param manifest: dict of {className: module}, ie {'MetaRig':'PKD_Tools.Rigging.core'}
+        or the filepath to a json file of the same
+    '''
+    if not isinstance(manifest, dict):
+        with open(manifest, 'r') as f:
+            manifest=json.load(f)
+    for key, module in manifest.items():
+        log.debug('registering manifest : %s >> %s' % (key, module))
+        RED9_META_MANIFEST[str(key)]=str(module)
+
+def getMClassManifest(modules=None):
+    '''
+    build a manifest from the currently imported MetaClass's, this is what you'd
+    dump to json for registerMClassManifest to use in a batch session
+    
+    :param modules: only include classes defined in these modules
+    '''
+    manifest={}
+    for key, mClass in RED9_META_REGISTERY.items():
+        if not modules or mClass.__module__ in modules:
+            manifest[key]=mClass.__module__
+    return manifest
   
 def printSubClassRegistry():
     for m in RED9_META_REGISTERY:
@@ -250,6 +368,8 @@ def registerMClassNodeMapping(nodeTypes=[]):
     except:
         log.warning('registerMClassNodeMapping failure - seems to have issues in Maya2009')
         #raise StandardError('registerMClassNodeMapping failure - seems to have issues in Maya2009')
+    #metaNodes can now be any of these types so the cache needs to hear about their deletion
+    RED9_META_EVENTBUS.watchNodeRemoved(RED9_META_NODETYPE_REGISTERY)
   
 def printMetaTypeRegistry():
     for t in RED9_META_NODETYPE_REGISTERY:
@@ -269,6 +389,189 @@ def resetMClassNodeTypes():
 # --- NodeCache management --- ---------------------------
 # ----------------------------------------------------------------------------
 
+def getMObjectHandleHash(mobj):
+    '''
+    return the hashCode for the given MObject or MObjectHandle, used as the
+    reverse key in the MetaNodeCache. Returns None if the MObjectHandle api
+    doesn't support hashCode (pre 2016)
+    '''
+    try:
+        if not isinstance(mobj, OpenMaya.MObjectHandle):
+            mobj=OpenMaya.MObjectHandle(mobj)
+        return mobj.hashCode()
+    except:
+        return None
+
+class MetaNodeCache(dict):
+    '''
+    The RED9_META_NODECACHE object. This is a dict of UUID (or mNode name for legacy
+    systems) to instantiated MetaClass object, but it also manages a reverse map of
+    MObjectHandle.hashCode() to UUID so that a node can be found in the cache directly
+    from it's MObject without any cmds calls. Cache hits and misses are counted so that
+    the effectiveness of the cache can be profiled.
+    '''
+    def __init__(self):
+        super(MetaNodeCache, self).__init__()
+        self.handles={}
+        self.hits=0
+        self.misses=0
+
+    def __setitem__(self, key, mNode):
+        if key in self:
+            self.__removeHandle(key)
+        dict.__setitem__(self, key, mNode)
+        try:
+            handleHash=getMObjectHandleHash(object.__getattribute__(mNode, '_MObjectHandle'))
+            if handleHash is not None:
+                self.handles[handleHash]=key
+        except:
+            log.debug('CACHE : unable to register the MObjectHandle for : %s' % key)
+
+    def __delitem__(self, key):
+        self.__removeHandle(key)
+        dict.__delitem__(self, key)
+
+    def __removeHandle(self, key):
+        try:
+            handleHash=getMObjectHandleHash(object.__getattribute__(dict.__getitem__(self, key), '_MObjectHandle'))
+        except:
+            handleHash=None
+        if handleHash is not None:
+            if self.handles.get(handleHash)==key:
+                self.handles.pop(handleHash)
+        else:
+            for handleHash in [h for h, k in self.handles.items() if k==key]:
+                self.handles.pop(handleHash)
+
+    def pop(self, key, *args):
+        if key in self:
+            self.__removeHandle(key)
+        return dict.pop(self, key, *args)
+
+    def clear(self):
+        dict.clear(self)
+        self.handles.clear()
+
+    def keyFromMObject(self, mobj):
+        '''
+        return the cache key bound to the given MObject via the reverse handle map
+        '''
+        handleHash=getMObjectHandleHash(mobj)
+        if handleHash is not None:
+            return self.handles.get(handleHash)
+
+    def getFromMObject(self, mobj):
+        '''
+        return the cached mNode bound to the given MObject, validating that the
+        cached instance is still pointing at that MObject
+        '''
+        key=self.keyFromMObject(mobj)
+        if key is not None and key in self:
+            mNode=dict.__getitem__(self, key)
+            try:
+                if mNode.isValidMObject() and object.__getattribute__(mNode, '_MObject')==mobj:
+                    return mNode
+            except:
+                log.debug('CACHE : inspection failure')
+
+    def removeMObject(self, mobj):
+        '''
+        remove the cache entry bound to the given MObject
+        '''
+        key=self.keyFromMObject(mobj)
+        if key is not None and key in self:
+            log.debug('CACHE : %s being Removed from the cache via MObject' % key)
+            self.pop(key)
+            return True
+        return False
+
+    def renameMObject(self, mobj, oldName):
+        '''
+        legacy systems key the cache by the mNode name, so on rename re-key the entry
+        bound to the given MObject. UUID keyed entries are left as they are
+        '''
+        key=self.keyFromMObject(mobj)
+        if key is None or key==oldName or not key in self:
+            return False
+        if not key.split('|')[-1]==oldName:
+            return False
+        mNode=self.pop(key)
+        try:
+            self[mNode.mNode]=mNode
+            log.debug('CACHE : %s re-keyed after rename >> %s' % (key, mNode.mNode))
+        except:
+            log.debug('CACHE : failed to re-key %s after rename' % key)
+        return True
+
+    def removeInvalid(self):
+        '''
+        remove all entries whose MObjectHandle is no longer valid
+        '''
+        for k, v in self.items():
+            try:
+                if not v.isValidMObject():
+                    self.pop(k)
+                    log.debug('CACHE : %s being Removed from the cache due to invalid MObject' % k)
+            except:
+                log.debug('CACHE : clean failure')
+
+    def stats(self):
+        '''
+        return the current hit/miss counters for profiling
+        '''
+        return {'hits':self.hits, 'misses':self.misses, 'size':len(self), 'handles':len(self.handles)}
+
+    def resetStats(self):
+        self.hits=0
+        self.misses=0
+
+global RED9_META_NODECACHE
+RED9_META_NODECACHE = MetaNodeCache()
+
+
+class MetaAttrSchemaCache(dict):
+    '''
+    The RED9_META_ATTRSCHEMA object, used by MetaClass.__getattribute__ so that an attr
+    read doesn't have to run objExists and getAttr(type=True) on every access. This is a
+    dict of mClass to that class's schema, shared by all it's nodes, the schema being
+    attr : [attrType, isJson]. Attrs that aren't on the Maya node but are on the class,
+    ie methods and class attrs, are stored with an attrType of None so that they never
+    hit the scene at all. Attrs found on neither are never cached.
+    
+    isJson is worked out from the first non-empty string read for the attr, None until
+    then, so plain string attrs stop going through the json decoder on every read.
+    
+    There are no per node callbacks, an entry is dropped by MetaClass.addAttr and
+    __delattr__, and by __getattribute__ itself when a read of a cached attr fails, ie
+    it's been deleted from the node outside of Red9.
+    '''
+    def getSchema(self, mClass):
+        '''
+        return the schema dict for the given mClass, created empty on first use
+        '''
+        schema=self.get(mClass)
+        if schema is None:
+            schema=self[mClass]={}
+        return schema
+    
+    def invalidate(self, mClass, attr=None):
+        '''
+        drop the cached attr from the mClass schema, or the whole schema if no attr given
+        '''
+        if attr is None:
+            self.pop(mClass, None)
+        elif mClass in self:
+            self[mClass].pop(attr, None)
+    
+    def stats(self):
+        '''
+        return the number of cached attrs per mClass
+        '''
+        return dict((mClass, {'attrs':len(schema)}) for mClass, schema in self.items())
+
+global RED9_META_ATTRSCHEMA
+RED9_META_ATTRSCHEMA = MetaAttrSchemaCache()
+
 def generateUUID():
     '''
     unique UUID used by the caching system
@@ -294,7 +597,7 @@ def registerMClassNodeCache(mNode):
             if not UUID:
                 log.debug('CACHE : generating fresh UUID')
                 UUID=mNode.setUUID()
-            elif UUID in RED9_META_NODECACHE.keys():
+            elif UUID in RED9_META_NODECACHE:
                 log.debug('CACHE : UUID is already registered in cache')
                 if not mNode == RED9_META_NODECACHE[UUID]:
                     log.debug('CACHE : %s : UUID is registered to a different node : modifying UUID: %s' % (UUID, mNode.mNode))
@@ -303,12 +606,13 @@ def registerMClassNodeCache(mNode):
             log.debug('CACHE : Failed to set UUID for mNode : %s' % mNode.mNode)
     else:
         log.debug('CACHE : UUID attr not bound to this node, must be an older system')
-        if RED9_META_NODECACHE or not mNode.mNode in RED9_META_NODECACHE.keys():
+        if RED9_META_NODECACHE or not mNode.mNode in RED9_META_NODECACHE:
             log.debug('CACHE : Adding to MetaNode Cache : %s' % mNode.mNode)
             RED9_META_NODECACHE[mNode.mNode]=mNode
+            RED9_META_EVENTBUS.require('nodeRenamed', 'nodeCache')
             return
     
-    if RED9_META_NODECACHE or not UUID in RED9_META_NODECACHE.keys():
+    if RED9_META_NODECACHE or not UUID in RED9_META_NODECACHE:
         log.debug('CACHE : Adding to MetaNode UUID Cache : %s > %s' % (mNode.mNode, UUID))
         RED9_META_NODECACHE[UUID]=mNode
         
@@ -345,16 +649,41 @@ def getMetaFromCache(mNode):
     already be instantiated.
     
     :param mNode: str(name) of node from DAG
+    
+    .. note::
+        the MObject of the node is first looked up in the cache's reverse MObjectHandle map,
+        only if that misses do we fall back to the UUID / name based lookups
+    '''
+    if not RED9_META_NODECACHE:
+        RED9_META_NODECACHE.misses+=1
+        return
+    try:
+        mobj=getMObject(mNode)
+    except:
+        RED9_META_NODECACHE.misses+=1
+        return
+    cached=RED9_META_NODECACHE.getFromMObject(mobj)
+    if cached is None:
+        cached=_getMetaFromCacheKeys(mNode, mobj)
+    if cached is None:
+        RED9_META_NODECACHE.misses+=1
+    else:
+        RED9_META_NODECACHE.hits+=1
+    return cached
+
+def _getMetaFromCacheKeys(mNode, mobj):
+    '''
+    UUID / name based lookup into the RED9_META_NODECACHE
     '''
     try:
         if r9Setup.mayaVersion()<2016:
             UUID=cmds.getAttr('%s.UUID' % mNode)  # if this fails we bail to the mNode name block
         else:
             UUID=cmds.ls(mNode, uuid=True)[0]
-        if UUID in RED9_META_NODECACHE.keys():
+        if UUID in RED9_META_NODECACHE:
             try:
                 if RED9_META_NODECACHE[UUID].isValidMObject():
-                    if not RED9_META_NODECACHE[UUID]._MObject == getMObject(mNode):
+                    if not RED9_META_NODECACHE[UUID]._MObject == mobj:
                         log.debug('CACHE : %s : UUID is already registered but to a different node : %s' % (UUID,mNode))
                         return
                     log.debug('CACHE : %s Returning mNode from UUID cache! = %s' % (mNode,UUID))
@@ -365,10 +694,10 @@ def getMetaFromCache(mNode):
             except:
                 log.debug('CACHE : inspection failure')
     except:
-        if mNode in RED9_META_NODECACHE.keys():
+        if mNode in RED9_META_NODECACHE:
             try:
                 if RED9_META_NODECACHE[mNode].isValidMObject():
-                    if not RED9_META_NODECACHE[mNode]._MObject == getMObject(mNode):
+                    if not RED9_META_NODECACHE[mNode]._MObject == mobj:
                         log.debug('CACHE : %s : ID is already registered but MObjects are different, node may have been renamed' % mNode)
                         return
                     #print 'namebased returned from cache ', mNode
@@ -385,6 +714,7 @@ def upgrade_toLatestBindings(*args):
     take a current scene and upgrade all the mNodes to include any new
     binding attrs that the base class may have been upgraded to use.
     '''
+    import Red9_CoreUtils as r9Core  # lazy loaded
     for node in getMetaNodes():
         try:
             # mNodeUUID attrs used for the Cache system
@@ -414,28 +744,59 @@ def printMetaCacheRegistry():
     Note that we call a cleanCache before printing to remove any 
     currently invalid MObjects from the Cache.
     '''
+    import Red9_CoreUtils as r9Core  # lazy loaded
     cleanCache()
     for k,v in RED9_META_NODECACHE.items():
         print '%s : %s : %s' % (k,r9Core.nodeNameStrip(v.mNode),v)
+    print 'CACHE STATS : %s' % getMetaCacheStats()
+
+def profileSceneTraffic(sampleInterval=None, modules=[]):
+    '''
+    return a SceneTrafficProfiler bound to the cmds used by Red9_Meta, use it as a
+    context manager around the tool you want to profile
+    
+    :param sampleInterval: seconds between main thread stack samples, None to only count
+    :param modules: any other modules whose cmds traffic should be recorded
+    
+    >>> with r9Meta.profileSceneTraffic() as profile:
+    >>>     mRig.getChildren()
+    >>> print profile.report()
+    '''
+    return r9General.SceneTrafficProfiler(modules=[sys.modules[__name__]]+list(modules), sampleInterval=sampleInterval)
+
+def getMetaCacheStats():
+    '''
+    return the hit / miss counters of the RED9_META_NODECACHE, used when profiling
+    '''
+    return RED9_META_NODECACHE.stats()
  
 def cleanCache():
     '''
     Run through the current cache of metaNodes and confirm that they're 
     all still valid by testing the MObjectHandles.
     '''
-    for k, v in RED9_META_NODECACHE.items():
-        try:
-            if not v.isValidMObject():
-                RED9_META_NODECACHE.pop(k)
-                log.debug('CACHE : %s being Removed from the cache due to invalid MObject' % k)
-        except:
-            log.debug('CACHE : clean failure')
+    RED9_META_NODECACHE.removeInvalid()
 
 def removeFromCache(mNodes):
+    '''
+    remove the given mNodes from the cache. Nodes are found via the reverse MObjectHandle
+    map, only nodes not found that way fall back to a scan of the cache
+    '''
+    import Red9_CoreUtils as r9Core  # lazy loaded
+    if not hasattr(mNodes, '__iter__'):
+        mNodes=[mNodes]
+    unmatched=[]
+    for mNode in mNodes:
+        try:
+            if RED9_META_NODECACHE.removeMObject(object.__getattribute__(mNode, '_MObject')):
+                continue
+        except:
+            pass
+        unmatched.append(mNode)
+    if not unmatched:
+        return
     for k, v in RED9_META_NODECACHE.items():
-        if not hasattr(mNodes, '__iter__'):
-            mNodes=[mNodes]
-        if v and v in mNodes:
+        if v and v in unmatched:
             try:
                 RED9_META_NODECACHE.pop(k)
                 log.debug('CACHE : %s being Removed from the cache >> %s' % (r9Core.nodeNameStrip(k),r9Core.nodeNameStrip(v.mNode)))
@@ -443,12 +804,298 @@ def removeFromCache(mNodes):
                 log.debug('CACHE : Failed to remove %s from cache')
     
 def resetCache(*args):
-    global RED9_META_NODECACHE
-    RED9_META_NODECACHE={}
+    RED9_META_NODECACHE.clear()
+    RED9_META_EVENTBUS.release('nodeRenamed', 'nodeCache')
+    RED9_META_ATTRSCHEMA.clear()
+    RED9_META_CONNECTIONINDEX.clear()
+
+def metaNodeRemovedCallback(mobj, *args):
+    '''
+    Registered on the Maya nodeRemoved callback so that deleted nodes are evicted
+    from the cache as they're deleted rather than left to go stale
+    '''
+    if RED9_META_NODECACHE:
+        RED9_META_NODECACHE.removeMObject(mobj)
+    if RED9_META_CONNECTIONINDEX.built:
+        RED9_META_CONNECTIONINDEX.removeMObject(mobj)
+
+def metaNodeRenamedCallback(mobj, oldName, *args):
+    '''
+    Subscribed to the nodeRenamed event, re-keys name based cache entries
+    '''
+    if RED9_META_NODECACHE:
+        RED9_META_NODECACHE.renameMObject(mobj, oldName)
+
+def metaReferenceLoadedCallback(*args):
+    '''
+    Subscribed to the referenceLoaded event, the loaded nodes bring new connections
+    so the connection index is dropped and rebuilt on the next query
+    '''
+    RED9_META_CONNECTIONINDEX.clear()
+
+def metaReferenceUnloadedCallback(*args):
+    '''
+    Subscribed to the referenceUnloaded event, evicts the entries for the nodes that
+    went out with the reference without touching anything that's still valid
+    '''
+    RED9_META_NODECACHE.removeInvalid()
+    RED9_META_CONNECTIONINDEX.clear()
 
 def resetCacheOnSceneNew(*args):
     resetCache()
     log.info('"file Open" or "file new" called - Red9 MetaCache being cleared')
+
+
+class MetaCacheEventBus(object):
+    '''
+    The RED9_META_EVENTBUS. Keeps the meta caches coherent with the scene by updating
+    them incrementally as scene events come in, rather than leaving stale entries to
+    be found and cleaned on lookup. Events are pushed onto the bus by an emitter, in a
+    session that's the MayaCacheEmitter which binds the api callbacks, and each cache
+    subscribes the handlers that update it.
+    
+    Swap in a FakeCacheEmitter to drive the events directly when testing coherence.
+    
+    The nodeRenamed and connectionChanged events come from scene wide callbacks that
+    call back into Python on every rename / connection in the scene, so they're only
+    bound while a cache has required them, and are suspended while a file or reference
+    is being loaded as the caches are dropped on those events anyway.
+    '''
+    events=['nodeRemoved', 'nodeRenamed', 'connectionChanged', 'referenceLoaded', 'referenceUnloaded', 'sceneNew']
+    onDemand=['nodeRenamed', 'connectionChanged']
+    
+    def __init__(self):
+        self.subscribers=dict((event, []) for event in self.events)
+        self.emitted=dict((event, 0) for event in self.events)
+        self.emitter=None
+        self.removedNodeTypes=['network']
+        self.demand=dict((event, set()) for event in self.onDemand)  # event : consumers requiring it
+        self.suspended=set()  # reasons the onDemand callbacks are currently unbound
+    
+    def subscribe(self, event, func):
+        if not event in self.subscribers:
+            raise StandardError('%s is not a MetaCacheEventBus event : %s' % (event, self.events))
+        if not func in self.subscribers[event]:
+            self.subscribers[event].append(func)
+    
+    def unsubscribe(self, event, func):
+        if func in self.subscribers.get(event, []):
+            self.subscribers[event].remove(func)
+    
+    def emit(self, event, *args):
+        '''
+        call all the handlers subscribed to the event, a failing handler is logged but
+        never raises as these are run from inside Maya callbacks
+        '''
+        self.emitted[event]+=1
+        for func in list(self.subscribers[event]):
+            try:
+                func(*args)
+            except StandardError, error:
+                log.debug('MetaCacheEventBus : %s handler %s failed : %s' % (event, func, error))
+    
+    def bindEmitter(self, emitter):
+        '''
+        replace the current emitter, unbinding it's callbacks first
+        '''
+        if self.emitter:
+            self.emitter.unbind()
+        self.emitter=emitter
+        emitter.bind(self)
+        return emitter
+    
+    def watchNodeRemoved(self, nodeTypes):
+        '''
+        the nodeRemoved event is only emitted for the nodeTypes being watched, by default
+        that's just 'network'. A cache that holds other nodeTypes adds them here rather
+        than binding it's own global nodeRemoved callback
+        
+        :param nodeTypes: nodeType or list of nodeTypes to emit the nodeRemoved event for
+        '''
+        if not type(nodeTypes)==list:
+            nodeTypes=[nodeTypes]
+        for nodeType in nodeTypes:
+            if not nodeType in self.removedNodeTypes:
+                self.removedNodeTypes.append(nodeType)
+                if self.emitter:
+                    self.emitter.bindNodeRemoved(self, nodeType)
+    
+    def isBound(self, event):
+        '''
+        should the emitter have the callbacks for this onDemand event bound
+        '''
+        return bool(self.demand[event]) and not self.suspended
+    
+    def require(self, event, consumer):
+        '''
+        a cache that relies on an onDemand event requires it before using the data it
+        keeps in sync, the callbacks are bound for the first consumer
+        
+        :param event: 'nodeRenamed' or 'connectionChanged'
+        :param consumer: key for the cache requiring the event
+        '''
+        if not event in self.demand:
+            raise StandardError('%s is not an onDemand MetaCacheEventBus event : %s' % (event, self.onDemand))
+        if consumer in self.demand[event]:
+            return
+        self.demand[event].add(consumer)
+        if self.emitter and self.isBound(event):
+            self.emitter.bindEvent(self, event)
+    
+    def release(self, event, consumer):
+        '''
+        the callbacks are removed again once the last consumer releases the event
+        '''
+        if not consumer in self.demand.get(event, ()):
+            return
+        self.demand[event].discard(consumer)
+        if self.emitter and not self.demand[event]:
+            self.emitter.unbindEvent(event)
+    
+    def suspend(self, reason, *args):
+        '''
+        unbind the onDemand callbacks until resume is called for the same reason, used
+        between kBeforeOpen and kAfterOpen and around reference loads
+        '''
+        self.suspended.add(reason)
+        if self.emitter:
+            for event in self.onDemand:
+                self.emitter.unbindEvent(event)
+    
+    def resume(self, reason, *args):
+        self.suspended.discard(reason)
+        if self.emitter:
+            for event in self.onDemand:
+                if self.isBound(event):
+                    self.emitter.bindEvent(self, event)
+    
+    def beforeOpen(self, *args):
+        self.suspend('open')
+        self.emit('sceneNew')
+    
+    def beforeLoadReference(self, *args):
+        self.suspend('reference')
+    
+    def afterLoadReference(self, *args):
+        self.resume('reference')
+        self.emit('referenceLoaded')
+
+
+class MayaCacheEmitter(object):
+    '''
+    Binds the Maya api callbacks that push scene events onto a MetaCacheEventBus.
+    The callback IDs are stored in RED9_META_CALLBACKS. The nodeRenamed and
+    connectionChanged callbacks are only bound when the bus asks for them.
+    '''
+    callbackKeys={'nodeRenamed':'NodeRenamed', 'connectionChanged':'Connection'}
+    
+    def __init__(self):
+        self.removedNodeTypes=[]
+    
+    def bind(self, bus):
+        if not RED9_META_CALLBACKS['Open']:
+            RED9_META_CALLBACKS['Open'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeOpen, bus.beforeOpen))
+            RED9_META_CALLBACKS['Open'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kAfterOpen, partial(bus.resume, 'open')))
+        if not RED9_META_CALLBACKS['New']:
+            RED9_META_CALLBACKS['New'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeNew, partial(bus.emit, 'sceneNew')))
+        for nodeType in bus.removedNodeTypes:
+            self.bindNodeRemoved(bus, nodeType)
+        if not RED9_META_CALLBACKS['ReferenceLoad']:
+            RED9_META_CALLBACKS['ReferenceLoad'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeLoadReference, bus.beforeLoadReference))
+            RED9_META_CALLBACKS['ReferenceLoad'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kAfterLoadReference, bus.afterLoadReference))
+            RED9_META_CALLBACKS['ReferenceLoad'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kAfterUnloadReference, partial(bus.emit, 'referenceUnloaded')))
+        for event in bus.onDemand:
+            if bus.isBound(event):
+                self.bindEvent(bus, event)
+    
+    def unbind(self):
+        for key in ['Open', 'New', 'NodeRemoved', 'NodeRenamed', 'Connection', 'ReferenceLoad']:
+            self.__removeCallbacks(key)
+        self.removedNodeTypes=[]
+    
+    def __removeCallbacks(self, key):
+        for callbackID in RED9_META_CALLBACKS[key]:
+            try:
+                OpenMaya.MMessage.removeCallback(callbackID)
+            except:
+                log.debug('MayaCacheEmitter : failed to remove callback')
+        RED9_META_CALLBACKS[key]=[]
+    
+    def bindEvent(self, bus, event):
+        '''
+        bind the scene wide callback for an onDemand event
+        '''
+        key=self.callbackKeys[event]
+        if RED9_META_CALLBACKS[key]:
+            return
+        if event=='nodeRenamed':
+            RED9_META_CALLBACKS[key].append(OpenMaya.MNodeMessage.addNameChangedCallback(OpenMaya.MObject(), partial(bus.emit, 'nodeRenamed')))
+        else:
+            RED9_META_CALLBACKS[key].append(OpenMaya.MDGMessage.addConnectionCallback(partial(bus.emit, 'connectionChanged')))
+    
+    def unbindEvent(self, event):
+        self.__removeCallbacks(self.callbackKeys[event])
+    
+    def bindNodeRemoved(self, bus, nodeType):
+        '''
+        the nodeRemoved callbacks are filtered by nodeType so that deleting the rest
+        of the scene doesn't call back into Python for every node
+        '''
+        if not nodeType in self.removedNodeTypes:
+            RED9_META_CALLBACKS['NodeRemoved'].append(OpenMaya.MDGMessage.addNodeRemovedCallback(partial(bus.emit, 'nodeRemoved'), nodeType))
+            self.removedNodeTypes.append(nodeType)
+
+
+class FakeCacheEmitter(object):
+    '''
+    In process emitter for testing, each method pushes the event straight onto the
+    bus with the same args the Maya callbacks would give, no scene change needed
+    '''
+    def __init__(self):
+        self.bus=None
+        self.bound=set()  # onDemand events the MayaCacheEmitter would have bound
+    
+    def bind(self, bus):
+        self.bus=bus
+        self.bound=set(event for event in bus.onDemand if bus.isBound(event))
+    
+    def unbind(self):
+        self.bus=None
+        self.bound=set()
+    
+    def bindNodeRemoved(self, bus, nodeType):
+        pass
+    
+    def bindEvent(self, bus, event):
+        self.bound.add(event)
+    
+    def unbindEvent(self, event):
+        self.bound.discard(event)
+    
+    def nodeRemoved(self, mobj):
+        self.bus.emit('nodeRemoved', mobj)
+    
+    def nodeRenamed(self, mobj, oldName):
+        self.bus.emit('nodeRenamed', mobj, oldName)
+    
+    def connectionChanged(self, srcPlug, destPlug, made):
+        self.bus.emit('connectionChanged', srcPlug, destPlug, made)
+    
+    def referenceLoaded(self):
+        self.bus.emit('referenceLoaded')
+    
+    def referenceUnloaded(self):
+        self.bus.emit('referenceUnloaded')
+    
+    def sceneNew(self):
+        self.bus.emit('sceneNew')
+
+global RED9_META_EVENTBUS
+RED9_META_EVENTBUS = MetaCacheEventBus()
+RED9_META_EVENTBUS.subscribe('nodeRemoved', metaNodeRemovedCallback)
+RED9_META_EVENTBUS.subscribe('nodeRenamed', metaNodeRenamedCallback)
+RED9_META_EVENTBUS.subscribe('referenceLoaded', metaReferenceLoadedCallback)
+RED9_META_EVENTBUS.subscribe('referenceUnloaded', metaReferenceUnloadedCallback)
     
 def getMClassNodeCache():
     '''
@@ -517,7 +1164,8 @@ def nodeLockManager(func):
             locked=False
             mNode=args[0]  # args[0] is self
             #log.debug('nodeLockManager > func : %s : metaNode / self: %s' % (func.__name__,mNode.mNode))
-            if mNode.mNode and mNode._lockState:
+            #inside a batchEdit flush the node lock is managed once by the batch itself
+            if mNode.mNode and mNode._lockState and not mNode._batchEdit:
                 locked=True
                 #log.debug('nodeLockManager > func : %s : node being unlocked' % func.__name__)
                 cmds.lockNode(mNode.mNode,lock=False)
@@ -587,7 +1235,237 @@ def attributeDataType(val):
     if issubclass(type(val),tuple):
         #log.debug('Val : %s : is a tuple')
         return 'complex'
-        
+
+
+def packCompact(data):
+    '''
+    pack json type data to a compact binary string. The format is the msgpack subset
+    needed for json data : nil, bool, int64, float64, str, array and map. As with
+    json, tuples are packed as lists and non string dict keys are converted to strings
+    '''
+    chunks=[]
+    def _pack(value):
+        if value is None:
+            chunks.append('\xc0')
+        elif value is True:
+            chunks.append('\xc3')
+        elif value is False:
+            chunks.append('\xc2')
+        elif isinstance(value, (int, long)):
+            if 0<=value<128:
+                chunks.append(chr(value))
+            elif -32<=value<0:
+                chunks.append(struct.pack('>b', value))
+            elif -2**31<=value<2**31:
+                chunks.append(struct.pack('>Bi', 0xd2, value))
+            elif -2**63<=value<2**63:
+                chunks.append(struct.pack('>Bq', 0xd3, value))
+            else:
+                raise ValueError('packCompact : int out of range : %s' % value)
+        elif isinstance(value, float):
+            chunks.append(struct.pack('>Bd', 0xcb, value))
+        elif isinstance(value, basestring):
+            if isinstance(value, unicode):
+                value=value.encode('utf-8')
+            size=len(value)
+            if size<32:
+                chunks.append(chr(0xa0|size))
+            elif size<2**8:
+                chunks.append(struct.pack('>BB', 0xd9, size))
+            elif size<2**16:
+                chunks.append(struct.pack('>BH', 0xda, size))
+            else:
+                chunks.append(struct.pack('>BI', 0xdb, size))
+            chunks.append(value)
+        elif isinstance(value, (list, tuple)):
+            size=len(value)
+            if size<16:
+                chunks.append(chr(0x90|size))
+            elif size<2**16:
+                chunks.append(struct.pack('>BH', 0xdc, size))
+            else:
+                chunks.append(struct.pack('>BI', 0xdd, size))
+            for item in value:
+                _pack(item)
+        elif isinstance(value, dict):
+            size=len(value)
+            if size<16:
+                chunks.append(chr(0x80|size))
+            elif size<2**16:
+                chunks.append(struct.pack('>BH', 0xde, size))
+            else:
+                chunks.append(struct.pack('>BI', 0xdf, size))
+            for key, item in value.items():
+                if not isinstance(key, basestring):
+                    key=json.dumps(key)
+                _pack(key)
+                _pack(item)
+        else:
+            raise TypeError('packCompact : %s is not json serializable' % repr(value))
+    _pack(data)
+    return ''.join(chunks)
+
+def unpackCompact(data):
+    '''
+    unpack a string made by packCompact, strings are returned as unicode as json does
+    '''
+    fixed={0xd2:('>i',4), 0xd3:('>q',8), 0xcb:('>d',8), 0xd0:('>b',1), 0xd1:('>h',2),
+           0xcc:('>B',1), 0xcd:('>H',2), 0xce:('>I',4), 0xcf:('>Q',8), 0xca:('>f',4)}
+    sized={0xd9:('>B',1), 0xda:('>H',2), 0xdb:('>I',4),
+           0xdc:('>H',2), 0xdd:('>I',4), 0xde:('>H',2), 0xdf:('>I',4)}
+    def _unpack(offset):
+        code=ord(data[offset])
+        offset+=1
+        if code<0x80:
+            return code, offset
+        if code>=0xe0:
+            return code-0x100, offset
+        if code==0xc0:
+            return None, offset
+        if code==0xc2:
+            return False, offset
+        if code==0xc3:
+            return True, offset
+        if code in fixed:
+            fmt, width=fixed[code]
+            return struct.unpack_from(fmt, data, offset)[0], offset+width
+        if 0xa0<=code<0xc0:
+            size=code&0x1f
+            kind='str'
+        elif 0x90<=code<0xa0:
+            size=code&0x0f
+            kind='array'
+        elif 0x80<=code<0x90:
+            size=code&0x0f
+            kind='map'
+        elif code in sized:
+            fmt, width=sized[code]
+            size=struct.unpack_from(fmt, data, offset)[0]
+            offset+=width
+            kind='str' if code<0xdc else 'array' if code<0xde else 'map'
+        else:
+            raise ValueError('unpackCompact : unsupported type byte : %s' % hex(code))
+        if kind=='str':
+            return data[offset:offset+size].decode('utf-8'), offset+size
+        if kind=='array':
+            items=[]
+            for _ in xrange(size):
+                item, offset=_unpack(offset)
+                items.append(item)
+            return items, offset
+        items={}
+        for _ in xrange(size):
+            key, offset=_unpack(offset)
+            items[key], offset=_unpack(offset)
+        return items, offset
+    value, offset=_unpack(0)
+    if not offset==len(data):
+        raise ValueError('unpackCompact : trailing data after offset %i' % offset)
+    return value
+
+
+class MetaAttrCodec(object):
+    '''
+    The RED9_META_ATTRCODEC object. Opt-in encodings for complex (dict / list) attrs,
+    used for big payloads like pose caches and mirror tables where the json string gets
+    to hundreds of KB on a rig. Plain json stays the default and is untouched.
+    
+    codecs:
+        * 'json'   : the standard json string
+        * 'zlib'   : json, zlib compressed then base64 encoded
+        * 'binary' : packCompact, zlib compressed then base64 encoded
+    
+    Encoded values carry a header of 'r9codec|codec|hash|' where the hash is the sha1
+    of the encoded payload. Decoded values are memoised on that hash, so re-reading an
+    unchanged attr skips the getAttr decode entirely. Each read still returns a fresh
+    copy (a cPickle round trip) so the memo can't be modified in place by the caller.
+    '''
+    HEADER='r9codec'
+    codecs=['json', 'zlib', 'binary']
+    #the first character of anything json.loads or the codec header can decode
+    DECODABLE=frozenset('{["-0123456789tfnNIr')
+    
+    def __init__(self, memoSize=64):
+        self.memo=OrderedDict()  # hash : cPickle string of the decoded value
+        self.memoSize=memoSize
+        self.hits=0
+        self.misses=0
+    
+    def isEncoded(self, data):
+        return isinstance(data, basestring) and data.startswith('%s|' % self.HEADER)
+    
+    def isDecodable(self, data):
+        '''
+        cheap first character test for a string decode might accept, plain text such as
+        'L_' is turned away here rather than by a failing json parse
+        '''
+        if not isinstance(data, basestring):
+            return False
+        data=data.lstrip()
+        return bool(data) and data[0] in self.DECODABLE
+    
+    def encode(self, data, codec='json'):
+        '''
+        encode complex data to a string for a Maya string attr
+        
+        :param data: dict or list to encode
+        :param codec: one of MetaAttrCodec.codecs
+        '''
+        if codec=='json':
+            return json.dumps(data)
+        # the memo holds what decode would give back, ie tuples as lists, not the data given
+        if codec=='zlib':
+            raw=json.dumps(data)
+            value=json.loads(raw)
+        elif codec=='binary':
+            raw=packCompact(data)
+            value=unpackCompact(raw)
+        else:
+            raise StandardError('%s is not a valid codec : %s' % (codec, self.codecs))
+        payload=zlib.compress(raw)
+        contentHash=hashlib.sha1(payload).hexdigest()
+        self.__memoise(contentHash, value)
+        return '%s|%s|%s|%s' % (self.HEADER, codec, contentHash, base64.b64encode(payload))
+    
+    def decode(self, data):
+        '''
+        decode a string made by encode back to it's complex data
+        '''
+        if not self.isEncoded(data):
+            return json.loads(data)
+        _, codec, contentHash, payload=str(data).split('|', 3)
+        if contentHash in self.memo:
+            self.hits+=1
+            self.memo[contentHash]=self.memo.pop(contentHash)
+            return cPickle.loads(self.memo[contentHash])
+        self.misses+=1
+        payload=base64.b64decode(payload)
+        if not hashlib.sha1(payload).hexdigest()==contentHash:
+            raise ValueError('MetaAttrCodec : content hash mismatch, the attr data is corrupt')
+        if codec=='zlib':
+            value=json.loads(zlib.decompress(payload))
+        elif codec=='binary':
+            value=unpackCompact(zlib.decompress(payload))
+        else:
+            raise StandardError('%s is not a valid codec : %s' % (codec, self.codecs))
+        self.__memoise(contentHash, value)
+        return value
+    
+    def __memoise(self, contentHash, value):
+        self.memo.pop(contentHash, None)
+        self.memo[contentHash]=cPickle.dumps(value, 2)
+        while len(self.memo)>self.memoSize:
+            self.memo.popitem(last=False)
+    
+    def clear(self):
+        self.memo.clear()
+    
+    def stats(self):
+        return {'hits':self.hits, 'misses':self.misses, 'size':len(self.memo)}
+
+global RED9_META_ATTRCODEC
+RED9_META_ATTRCODEC = MetaAttrCodec()
+
 #@pymelHandler
 def isMetaNode(node, mTypes=[], checkInstance=True, returnMClass=False):
     '''
@@ -673,74 +1551,933 @@ def isMetaNodeInherited(node, mInstances=[]):
                 return True
     return False
 
-def isMetaNodeClassGrp(node, mClassGrps=[]):
+def isMetaNodeClassGrp(node, mClassGrps=[]):
+    '''
+    check the mClassGrp attr to see if it matches the given
+    '''
+    if not node:
+        return False
+    if issubclass(type(node), MetaClass):
+        node=node.mNode
+    if not hasattr(mClassGrps,'__iter__'):
+        mClassGrps=[mClassGrps]
+    for grp in mClassGrps:
+        log.debug('mGroup testing: %s' % node)
+        try:
+            if cmds.getAttr('%s.mClassGrp' % node) == grp:
+                return True
+        except:
+            log.debug('mNode has no MClassGrp attr, must be a legacy system and needs updating!! %s' % node)
+
+            
+@r9General.Timer
+def getMetaNodes(mTypes=[], mInstances=[], mClassGrps=[], mAttrs=None, dataType='mClass', nTypes=None, mSystemRoot=False, **kws):
+    '''
+    Get all mClass nodes in scene and return as mClass objects if possible
+    :param mTypes: only return meta nodes of a given type
+    :param mInstances: idea - this will check subclass inheritance, ie, MetaRig would
+            return ALL nodes who's class is inherited from MetaRig. Allows you to
+            group the data more efficiently by base classes and their inheritance
+    :param mClassGrps: checks the mClassGrp used to soft grp nodes and mark ones as a certain
+            system type without looking at class inheritance. Good for marking key classes as bases
+    :param mAttrs: uses the FilterNode.lsSearchAttributes call to match nodes via given attrs
+    :param dataType: default='mClass' return the nodes already instantiated to
+                the correct class object. If not then return the Maya node itself
+    :param nTypes: only inspect nodes of a given Type
+    '''
+    mNodes=[]
+    if not nTypes:
+        nodes = cmds.ls(type=getMClassNodeTypes(), l=True)
+    else:
+        nodes = cmds.ls(type=nTypes, l=True)
+    if not nodes:
+        return mNodes
+    for node in nodes:
+        mNode=False
+        if not mInstances:
+            if isMetaNode(node, mTypes=mTypes):
+                mNode=True
+        else:
+            if isMetaNodeInherited(node,mInstances):
+                mNode=True
+        if mNode:
+            if mClassGrps:
+                if not hasattr(mClassGrps,'__iter__'):
+                    mClassGrps=[mClassGrps]
+                if isMetaNodeClassGrp(node, mClassGrps):
+                    mNodes.append(node)
+            else:
+                mNodes.append(node)
+    if not mNodes:
+        return mNodes
+    if mAttrs:
+        #lazy to avoid cyclic imports
+        import Red9_CoreUtils as r9Core
+        mNodes=r9Core.FilterNode().lsSearchAttributes(mAttrs, nodes=mNodes)
+    if dataType=='mClass':
+        return[MetaClass(node,**kws) for node in mNodes]
+    else:
+        return mNodes
+
+
+def getMClassDataFromNodes(nodes):
+    '''
+    Batch version of getMClassDataFromNode. Rather than a getAttr call per node for
+    the mClass and mClassGrp attrs, all the nodes are added to a single MSelectionList
+    and the attrs are read directly via the api.
+    
+    :param nodes: list of Maya nodes to inspect
+    :return: list of (node, MObject, mClass, mClassGrp) tuples, mClass is the registered
+        mClass key the node would be bound to (as getMClassDataFromNode) or None, 
+        mClassGrp is the raw value of the mClassGrp attr or None if the node doesn't have it
+    '''
+    data=[]
+    selList=OpenMaya.MSelectionList()
+    for node in nodes:
+        selList.add(node)
+    depNodeFn=OpenMaya.MFnDependencyNode()
+    for i, node in enumerate(nodes):
+        mobj=OpenMaya.MObject()
+        selList.getDependNode(i, mobj)
+        mClass, mClassGrp = getMClassDataFromMObject(mobj, depNodeFn)
+        data.append((node, mobj, mClass, mClassGrp))
+    return data
+
+def getMClassDataFromMObject(mobj, depNodeFn=None):
+    '''
+    api version of getMClassDataFromNode, reads the mClass and mClassGrp attrs
+    directly from the MObject
+    
+    :param depNodeFn: optional MFnDependencyNode to re-use when called in a loop
+    :return: (mClass, mClassGrp) where mClass is the registered mClass key the node
+        would be bound to or None, mClassGrp is the raw attr value or None
+    '''
+    if depNodeFn is None:
+        depNodeFn=OpenMaya.MFnDependencyNode()
+    depNodeFn.setObject(mobj)
+    mClassAttr=None
+    mClassGrp=None
+    if depNodeFn.hasAttribute('mClass'):
+        mClassAttr=depNodeFn.findPlug('mClass', False).asString()
+    if depNodeFn.hasAttribute('mClassGrp'):
+        mClassGrp=depNodeFn.findPlug('mClassGrp', False).asString()
+    
+    # same resolution order as getMClassDataFromNode
+    mClass=None
+    if mClassAttr is not None and mClassAttr in RED9_META_REGISTERY:
+        mClass=mClassAttr
+    elif mClassAttr is not None and mClassGrp is not None:
+        if mClassGrp in RED9_META_REGISTERY:
+            mClass=mClassGrp
+    elif 'Meta%s' % depNodeFn.typeName() in RED9_META_REGISTERY:
+        mClass='Meta%s' % depNodeFn.typeName()
+    return mClass, mClassGrp
+
+def getMClassMatcher(mTypes=[], mInstances=[]):
+    '''
+    return a predicate that tests an mClass key against the given filters, the same
+    rules as isMetaNode(mTypes) and isMetaNodeInherited(mInstances), used by the bulk
+    and indexed calls where the mClass is already known
+    '''
+    typeKeys=mTypesToRegistryKey(mTypes) if mTypes else []
+    instanceClasses=[RED9_META_REGISTERY[key] for key in mTypesToRegistryKey(mInstances)] if mInstances else []
+    
+    def matched(mClass):
+        if not mClass or not mClass in RED9_META_REGISTERY:
+            return False
+        if mInstances:
+            return any(issubclass(RED9_META_REGISTERY[mClass], cls) for cls in instanceClasses)
+        if mTypes:
+            return mClass in typeKeys
+        return True
+    return matched
+
+def _instantiateMetaNode(node, mClass, mobj, **kws):
+    '''
+    fast path used by the bulk calls to instantiate an mNode whose mClass has already
+    been resolved. The cache is tested directly against the MObject and the mClass
+    is handed over to __init__ so the isMetaNode checks aren't re-run.
+    '''
+    if RED9_META_NODECACHE:
+        cached=RED9_META_NODECACHE.getFromMObject(mobj)
+        if cached is not None:
+            RED9_META_NODECACHE.hits+=1
+            return cached
+    RED9_META_NODECACHE.misses+=1
+    MetaClass.cached=None
+    MetaClass._resolvedMClass=(node, mClass)
+    mNode=object.__new__(RED9_META_REGISTERY[mClass])
+    mNode.__init__(node, **kws)
+    return mNode
+
+@r9General.Timer
+def getMetaNodesBulk(mTypes=[], mInstances=[], mClassGrps=[], mAttrs=None, dataType='mClass', nTypes=None, mSystemRoot=False, **kws):
+    '''
+    Bulk version of getMetaNodes, takes the same args and returns the same data.
+    The mClass and mClassGrp attrs of all candidate nodes are read in one batched api 
+    pass and then classified in Python rather than running isMetaNode, isMetaNodeClassGrp
+    and a full MetaClass(node) instantiation test per node. Use this on large scenes.
+    
+    :param mTypes: only return meta nodes of a given type
+    :param mInstances: only return nodes who's class is inherited from the given mClass
+    :param mClassGrps: only return nodes who's mClassGrp attr matches
+    :param mAttrs: uses the FilterNode.lsSearchAttributes call to match nodes via given attrs
+    :param dataType: default='mClass' return the nodes already instantiated to
+                the correct class object. If not then return the Maya node itself
+    :param nTypes: only inspect nodes of a given Type
+    '''
+    if not nTypes:
+        nodes = cmds.ls(type=getMClassNodeTypes(), l=True)
+    else:
+        nodes = cmds.ls(type=nTypes, l=True)
+    if not nodes:
+        return []
+    
+    mClassMatched=getMClassMatcher(mTypes, mInstances)
+    if mClassGrps and not hasattr(mClassGrps,'__iter__'):
+        mClassGrps=[mClassGrps]
+    
+    matched=[]
+    for node, mobj, mClass, mClassGrp in getMClassDataFromNodes(nodes):
+        if not mClassMatched(mClass):
+            continue
+        if mClassGrps and not mClassGrp in mClassGrps:
+            continue
+        matched.append((node, mobj, mClass))
+    if not matched:
+        return []
+    if mAttrs:
+        #lazy to avoid cyclic imports
+        import Red9_CoreUtils as r9Core
+        filtered=set(r9Core.FilterNode().lsSearchAttributes(mAttrs, nodes=[data[0] for data in matched]))
+        matched=[data for data in matched if data[0] in filtered]
+    if dataType=='mClass':
+        return [_instantiateMetaNode(node, mClass, mobj, **kws) for node, mobj, mClass in matched]
+    else:
+        return [data[0] for data in matched]
+
+def getPlugName(plug):
+    '''
+    return the attr part of the plug name, long names and multi indices included,
+    ie 'SUP_Ctrls[0]' as listConnections(p=True) returns after the node name
+    '''
+    return plug.partialName(False, False, False, False, False, True)
+
+def getMObjectName(mobj, longName=True):
+    '''
+    return the node name for the given MObject, full path for dag nodes so
+    that it matches the cmds.ls(l=True) and MetaClass.mNode returns
+    
+    :param longName: if False dag nodes are given the shortest unique path,
+        as cmds.listConnections returns them
+    '''
+    if mobj.hasFn(OpenMaya.MFn.kDagNode):
+        dPath=OpenMaya.MDagPath()
+        OpenMaya.MDagPath.getAPathTo(mobj, dPath)
+        if not longName:
+            return dPath.partialPathName()
+        return dPath.fullPathName()
+    return OpenMaya.MFnDependencyNode(mobj).name()
+
+class MetaNetworkGraph(object):
+    '''
+    Adjacency map of the message wiring between the mNodes in the scene so that walking
+    a network doesn't have to call listConnections and isMetaNode per node, per step.
+    The mClass of every node comes from the batched getMClassDataFromNodes call and the
+    connections are read from the MObjects that call returns, so node names always match
+    the long names used by MetaClass.mNode.
+    
+    By default the graph is built for the whole scene in a single pass. With lazy=True
+    nothing is read up front, the connections of a node are only read the first time
+    they're asked for via getLinked, so a walk only ever touches the network it's in.
+    
+    As with getConnectedMetaNodes a link is only followed if the plug on the node being
+    queried is a message attr, the source plug for children, the destination for parents.
+    
+    The graph is a snapshot, build a new one if the network is edited.
+    
+    >>> graph=MetaNetworkGraph()
+    >>> mRig.getChildMetaNodes(walk=True, graph=graph)
+    >>> mNode.getParentMetaNode(graph=graph)
+    '''
+    def __init__(self, nTypes=None, lazy=False):
+        self.nTypes=nTypes
+        self.lazy=lazy
+        self.mClasses={}    # node : mClass
+        self.mClassGrps={}  # node : mClassGrp
+        self.mObjects={}    # node : MObject
+        self.children={}    # node : [child mNodes] wired from this node's message attrs
+        self.parents={}     # node : [parent mNodes] wired to this node's message attrs
+        self.edges=[]       # (parent, parentAttr, child, childAttr) between mNodes
+        self.links=[]       # (mNode, mNodeAttr, node, nodeAttr) for all message links, ie ctrls
+        self.classified=set()                        # nodes whose mClass has been looked up
+        self.expanded={'children':set(), 'parents':set()}  # nodes whose links have been read
+        if not lazy:
+            self.build(nTypes)
+        
+    def build(self, nTypes=None):
+        nodes=cmds.ls(type=nTypes or getMClassNodeTypes(), l=True)
+        if not nodes:
+            return
+        self.__classify(nodes)
+        for node, mobj in self.mObjects.items():
+            self.linkNode(node, mobj)
+        # every mNode's links are now known in both directions
+        self.expanded['children'].update(self.mObjects)
+        self.expanded['parents'].update(self.mObjects)
+    
+    def __classify(self, nodes):
+        self.classified.update(nodes)
+        for node, mobj, mClass, mClassGrp in getMClassDataFromNodes(nodes):
+            if mClass:
+                self.mClasses[node]=mClass
+                self.mClassGrps[node]=mClassGrp
+                self.mObjects[node]=mobj
+    
+    def linkNode(self, node, mobj):
+        '''
+        add the connections from the given node's source plugs to the mNodes in the graph.
+        The child link needs this node's plug to be a message, the parent link the child's
+        '''
+        depNodeFn=OpenMaya.MFnDependencyNode(mobj)
+        plugs=OpenMaya.MPlugArray()
+        connected=OpenMaya.MPlugArray()
+        try:
+            depNodeFn.getConnections(plugs)
+        except RuntimeError:
+            return
+        for i in range(plugs.length()):
+            plug=plugs[i]
+            isMessage=plug.attribute().hasFn(OpenMaya.MFn.kMessageAttribute)
+            parentAttr=OpenMaya.MFnAttribute(plug.attribute()).name()
+            plug.connectedTo(connected, False, True)
+            for j in range(connected.length()):
+                child=getMObjectName(connected[j].node())
+                childAttr=OpenMaya.MFnAttribute(connected[j].attribute()).name()
+                if isMessage:
+                    self.links.append((node, parentAttr, child, childAttr))
+                if not child in self.mClasses:
+                    continue
+                if isMessage:
+                    self.edges.append((node, parentAttr, child, childAttr))
+                    self.__link(self.children, node, child)
+                if connected[j].attribute().hasFn(OpenMaya.MFn.kMessageAttribute):
+                    self.__link(self.parents, child, node)
+    
+    def expand(self, node, direction='children', mobj=None):
+        '''
+        read the links of a single node in the given direction, classifying any
+        nodes on the other end that haven't been seen yet in one batched call
+        
+        :param direction: 'children' for the nodes wired from this node's message attrs,
+            'parents' for the nodes wired into them
+        :param mobj: the MObject of the node if it's not already in the graph
+        '''
+        self.expanded[direction].add(node)
+        if mobj is None:
+            mobj=self.mObjects[node] if node in self.mObjects else getMObject(node)
+        depNodeFn=OpenMaya.MFnDependencyNode(mobj)
+        plugs=OpenMaya.MPlugArray()
+        connected=OpenMaya.MPlugArray()
+        try:
+            depNodeFn.getConnections(plugs)
+        except RuntimeError:
+            return
+        toChildren=direction=='children'
+        found=[]
+        for i in range(plugs.length()):
+            plug=plugs[i]
+            if not plug.attribute().hasFn(OpenMaya.MFn.kMessageAttribute):
+                continue
+            plug.connectedTo(connected, not toChildren, toChildren)
+            for j in range(connected.length()):
+                found.append((OpenMaya.MFnAttribute(plug.attribute()).name(),
+                              getMObjectName(connected[j].node()),
+                              OpenMaya.MFnAttribute(connected[j].attribute()).name()))
+        unknown=[linked for _, linked, _ in found if not linked in self.classified]
+        if unknown:
+            unknown=list(set(unknown))
+            nodes=cmds.ls(unknown, type=self.nTypes or getMClassNodeTypes(), l=True)
+            self.classified.update(unknown)
+            if nodes:
+                self.__classify(nodes)
+        for attr, linked, linkedAttr in found:
+            if toChildren:
+                self.links.append((node, attr, linked, linkedAttr))
+            if not linked in self.mClasses:
+                continue
+            if toChildren:
+                self.edges.append((node, attr, linked, linkedAttr))
+                self.__link(self.children, node, linked)
+            else:
+                self.__link(self.parents, node, linked)
+    
+    def getLinked(self, node, direction='children', mobj=None):
+        '''
+        return the mNodes linked to the given node in the given direction,
+        reading the node's connections first if they aren't in the graph yet
+        '''
+        if not node in self.expanded[direction]:
+            self.expand(node, direction, mobj)
+        adjacency=self.children if direction=='children' else self.parents
+        return adjacency.get(node, [])
+    
+    def __link(self, adjacency, node, linked):
+        linkedNodes=adjacency.setdefault(node, [])
+        if not linked in linkedNodes:
+            linkedNodes.append(linked)
+    
+    def mClassFilter(self, mTypes=[], mInstances=[], mAttrs=None):
+        '''
+        return a predicate that tests a node in the graph against the given filters,
+        the same rules as isMetaNode(mTypes), isMetaNodeInherited(mInstances) and
+        FilterNode.lsSearchAttributes(mAttrs)
+        '''
+        mClassMatched=getMClassMatcher(mTypes, mInstances)
+        attrChecked=set()
+        attrMatched=set()
+        
+        def matched(node):
+            if mAttrs:
+                if not node in attrChecked:
+                    # test every mNode the graph has found so far in one search, a lazy
+                    # graph only runs it again once a walk reaches nodes found since
+                    #lazy to avoid cyclic imports
+                    import Red9_CoreUtils as r9Core
+                    nodes=[mNode for mNode in self.mClasses if not mNode in attrChecked]
+                    attrChecked.update(nodes)
+                    attrChecked.add(node)
+                    if nodes:
+                        attrMatched.update(r9Core.FilterNode().lsSearchAttributes(mAttrs, nodes=nodes))
+                if not node in attrMatched:
+                    return False
+            return mClassMatched(self.mClasses.get(node))
+        return matched
+    
+    def walk(self, node, direction='children', matched=None, mobj=None):
+        '''
+        breadth first walk of the graph from the given node
+        
+        :param direction: 'children' to walk down the network, 'parents' to walk up
+        :param matched: optional predicate, nodes that fail it are neither returned nor walked through
+        :param mobj: the MObject of the start node if it's not already in the graph
+        '''
+        visited=set([node])
+        queue=deque([node])
+        nodes=[]
+        while queue:
+            current=queue.popleft()
+            for linked in self.getLinked(current, direction, mobj if current==node else None):
+                if linked in visited:
+                    continue
+                visited.add(linked)
+                if matched and not matched(linked):
+                    continue
+                nodes.append(linked)
+                queue.append(linked)
+        return nodes
+    
+    def instantiate(self, nodes, **kws):
+        '''
+        return the given graph nodes as MetaClass objects, via the bulk fast path
+        as the mClass is already known
+        '''
+        return [_instantiateMetaNode(node, self.mClasses[node], self.mObjects[node], **kws) for node in nodes]
+
+def getPlugValue(plug):
+    '''
+    read the value of a simple plug directly via the api, used by the bulk
+    calls so that reading attrs across a network doesn't getAttr per attr.
+    Handles numeric, enum, unit and string attrs, returns None for anything else.
+    Unit attrs are returned in the ui units, as getAttr does
+    '''
+    attr=plug.attribute()
+    if attr.hasFn(OpenMaya.MFn.kEnumAttribute):
+        return plug.asShort()
+    if attr.hasFn(OpenMaya.MFn.kNumericAttribute):
+        unitType=OpenMaya.MFnNumericAttribute(attr).unitType()
+        if unitType==OpenMaya.MFnNumericData.kBoolean:
+            return plug.asBool()
+        if unitType in (OpenMaya.MFnNumericData.kInt, OpenMaya.MFnNumericData.kLong,
+                        OpenMaya.MFnNumericData.kShort, OpenMaya.MFnNumericData.kByte,
+                        OpenMaya.MFnNumericData.kChar):
+            return plug.asInt()
+        if unitType in (OpenMaya.MFnNumericData.kFloat, OpenMaya.MFnNumericData.kDouble):
+            return plug.asDouble()
+        return None
+    if attr.hasFn(OpenMaya.MFn.kUnitAttribute):
+        # the plug holds internal units, convert to the ui units getAttr returns
+        unitType=OpenMaya.MFnUnitAttribute(attr).unitType()
+        if unitType==OpenMaya.MFnUnitAttribute.kDistance:
+            return plug.asMDistance().asUnits(OpenMaya.MDistance.uiUnit())
+        if unitType==OpenMaya.MFnUnitAttribute.kAngle:
+            return plug.asMAngle().asUnits(OpenMaya.MAngle.uiUnit())
+        if unitType==OpenMaya.MFnUnitAttribute.kTime:
+            return plug.asMTime().asUnits(OpenMaya.MTime.uiUnit())
+        return plug.asDouble()
+    if attr.hasFn(OpenMaya.MFn.kTypedAttribute):
+        if OpenMaya.MFnTypedAttribute(attr).attrType()==OpenMaya.MFnData.kString:
+            return plug.asString()
+    return None
+
+class MetaNetworkSnapshot(object):
+    '''
+    Read only, materialised copy of the meta networks in the scene. Built once from the
+    batched MetaNetworkGraph plus an api read of the selected attrs, then held in plain
+    dicts so that the repeated questions the tools ask, all the MetaRigs, their ctrls,
+    child systems and mirror data, don't walk the live scene each time.
+    
+    The snapshot can be saved to disk, loaded back and diffed against a later snapshot.
+    As it needs nothing from the scene once built it can also back a fake cmds in the
+    UnitTests, see SnapshotCmds in metaNetworkUnitTest.
+    
+    >>> snap=MetaNetworkSnapshot.fromScene()
+    >>> for rig in snap.getMetaRigs():
+    >>>     snap.getCtrls(rig)
+    >>> snap.save('C:/temp/network.json')
+    >>> MetaNetworkSnapshot.load('C:/temp/network.json').diff(snap)
+    
+    Data layout:
+        nodes : {node : {'mClass':str, 'mClassGrp':str, 'nodeType':str, 'attrs':{attr:value}}},
+            linked nodes that aren't mNodes, ie controllers, have an mClass of None
+        links : [(mNode, mNodeAttr, node, nodeAttr)] for every message link from an mNode
+    '''
+    version=1
+    # attrs read from the mNodes and from the linked (ctrl) nodes by default
+    META_ATTRS=['mNodeID', 'mSystemRoot', 'mirrorSide', 'rigType', 'part', 'systemType', 'CTRL_Prefix']
+    LINKED_ATTRS=['mirrorSide', 'mirrorIndex', 'mirrorAxis']
+    
+    def __init__(self, nodes=None, links=None):
+        self.nodes=nodes or {}
+        self.links=[tuple(link) for link in links or []]
+        self.__index()
+    
+    def __index(self):
+        self.children={}
+        self.parents={}
+        self.linked={}   # node : {attr : [linked nodes]}
+        for parent, parentAttr, child, childAttr in self.links:
+            self.linked.setdefault(parent, {}).setdefault(parentAttr, []).append(child)
+            if self.isMetaNode(child):
+                if not child in self.children.setdefault(parent, []):
+                    self.children[parent].append(child)
+                if not parent in self.parents.setdefault(child, []):
+                    self.parents[child].append(parent)
+    
+    @classmethod
+    def fromScene(cls, metaAttrs=None, linkedAttrs=None, nTypes=None):
+        '''
+        build the snapshot from the current scene
+        
+        :param metaAttrs: attrs to read from the mNodes, default cls.META_ATTRS
+        :param linkedAttrs: attrs to read from the linked nodes that aren't mNodes, default cls.LINKED_ATTRS
+        :param nTypes: clamp the mNodes inspected to the given nodeTypes
+        '''
+        if metaAttrs is None:
+            metaAttrs=cls.META_ATTRS
+        if linkedAttrs is None:
+            linkedAttrs=cls.LINKED_ATTRS
+        graph=MetaNetworkGraph(nTypes=nTypes)
+        nodes={}
+        for node, mobj in graph.mObjects.items():
+            nodes[node]={'mClass':graph.mClasses[node],
+                         'mClassGrp':graph.mClassGrps[node],
+                         'nodeType':OpenMaya.MFnDependencyNode(mobj).typeName(),
+                         'attrs':cls.__readAttrs(mobj, metaAttrs)}
+        linkedNodes=[link[2] for link in graph.links if not link[2] in nodes]
+        if linkedNodes:
+            selList=OpenMaya.MSelectionList()
+            for node in set(linkedNodes):
+                selList.add(node)
+            for i in range(selList.length()):
+                mobj=OpenMaya.MObject()
+                selList.getDependNode(i, mobj)
+                nodes[getMObjectName(mobj)]={'mClass':None, 'mClassGrp':None,
+                                             'nodeType':OpenMaya.MFnDependencyNode(mobj).typeName(),
+                                             'attrs':cls.__readAttrs(mobj, linkedAttrs)}
+        return cls(nodes, graph.links)
+    
+    @staticmethod
+    def __readAttrs(mobj, attrs):
+        data={}
+        depNodeFn=OpenMaya.MFnDependencyNode(mobj)
+        for attr in attrs:
+            if depNodeFn.hasAttribute(attr):
+                value=getPlugValue(depNodeFn.findPlug(attr, False))
+                if value is not None:
+                    data[attr]=value
+        return data
+    
+    # Serialise
+    #-----------------------------------------------------------------------------------
+    
+    def toDict(self):
+        return {'version':self.version,
+                'nodes':self.nodes,
+                'links':[list(link) for link in self.links]}
+    
+    @classmethod
+    def fromDict(cls, data):
+        return cls(data.get('nodes', {}), data.get('links', []))
+    
+    def save(self, filepath):
+        with open(filepath, 'w') as f:
+            json.dump(self.toDict(), f, sort_keys=True)
+        log.debug('MetaNetworkSnapshot saved : %s' % filepath)
+    
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'r') as f:
+            return cls.fromDict(json.load(f))
+    
+    def diff(self, other):
+        '''
+        compare this snapshot to another, ie one taken later in the session
+        
+        :return: dict {'added':[nodes], 'removed':[nodes], 'changed':{node:{key:(this, other)}},
+            'linksAdded':[links], 'linksRemoved':[links]}, all empty if the networks match
+        '''
+        changed={}
+        for node in set(self.nodes) & set(other.nodes):
+            data=self.nodes[node]
+            otherData=other.nodes[node]
+            nodeChanges={}
+            for key in ('mClass', 'mClassGrp'):
+                if data.get(key)!=otherData.get(key):
+                    nodeChanges[key]=(data.get(key), otherData.get(key))
+            attrs=data.get('attrs', {})
+            otherAttrs=otherData.get('attrs', {})
+            for attr in set(attrs) | set(otherAttrs):
+                if attrs.get(attr)!=otherAttrs.get(attr):
+                    nodeChanges[attr]=(attrs.get(attr), otherAttrs.get(attr))
+            if nodeChanges:
+                changed[node]=nodeChanges
+        links=set(self.links)
+        otherLinks=set(other.links)
+        return {'added':sorted(set(other.nodes) - set(self.nodes)),
+                'removed':sorted(set(self.nodes) - set(other.nodes)),
+                'changed':changed,
+                'linksAdded':sorted(otherLinks - links),
+                'linksRemoved':sorted(links - otherLinks)}
+    
+    # Queries
+    #-----------------------------------------------------------------------------------
+    
+    def isMetaNode(self, node, mTypes=[], mInstances=[]):
+        '''
+        snapshot version of isMetaNode / isMetaNodeInherited. Inheritance is tested
+        against the RED9_META_REGISTERY, unregistered classes only match by name
+        '''
+        mClass=self.nodes.get(node, {}).get('mClass')
+        if not mClass:
+            return False
+        if mInstances:
+            for key in mTypesToRegistryKey(mInstances):
+                if mClass==key or (mClass in RED9_META_REGISTERY and issubclass(RED9_META_REGISTERY[mClass], RED9_META_REGISTERY[key])):
+                    return True
+            return False
+        if mTypes:
+            return mClass in mTypesToRegistryKey(mTypes)
+        return True
+    
+    def getMetaNodes(self, mTypes=[], mInstances=[], mClassGrps=[]):
+        if mClassGrps and not hasattr(mClassGrps, '__iter__'):
+            mClassGrps=[mClassGrps]
+        return sorted(node for node, data in self.nodes.items()
+                      if self.isMetaNode(node, mTypes, mInstances)
+                      and (not mClassGrps or data.get('mClassGrp') in mClassGrps))
+    
+    def getMetaRigs(self, mInstances='MetaRig'):
+        '''
+        all the MetaRig root nodes, those with no parent mNode
+        '''
+        return [node for node in self.getMetaNodes(mInstances=mInstances) if not self.parents.get(node)]
+    
+    def getChildMetaNodes(self, node, walk=False):
+        if not walk:
+            return list(self.children.get(node, []))
+        visited=set([node])
+        queue=deque([node])
+        nodes=[]
+        while queue:
+            for child in self.children.get(queue.popleft(), []):
+                if not child in visited:
+                    visited.add(child)
+                    nodes.append(child)
+                    queue.append(child)
+        return nodes
+    
+    def getParentMetaNode(self, node):
+        parents=self.parents.get(node)
+        if parents:
+            return parents[0]
+    
+    def getMessageLinks(self, node, cAttrs=[]):
+        '''
+        the message links from the given mNode as {attr:[nodes]}, optionally
+        filtered by the connection attr names, wildcards supported
+        '''
+        import fnmatch
+        linked=self.linked.get(node, {})
+        if not cAttrs:
+            return dict(linked)
+        return dict((attr, nodes) for attr, nodes in linked.items()
+                    if any(fnmatch.fnmatch(attr, pattern) for pattern in cAttrs))
+    
+    def getCtrls(self, node, walk=True):
+        '''
+        snapshot version of MetaRig.getChildren : all the controllers linked to the
+        system and, if walk, it's child systems via the CTRL_Prefix attrs
+        '''
+        ctrls=[]
+        systems=[node]
+        if walk:
+            systems.extend(self.getChildMetaNodes(node, walk=True))
+        for system in systems:
+            prefix=self.getAttr(system, 'CTRL_Prefix', 'CTRL')
+            for attr, nodes in sorted(self.getMessageLinks(system, ['RigCtrls', '%s_*' % prefix]).items()):
+                ctrls.extend(linked for linked in nodes if not linked in ctrls and not self.isMetaNode(linked))
+        return ctrls
+    
+    def getMirrorData(self, node):
+        '''
+        the mirror attrs of the given linked node
+        '''
+        attrs=self.nodes.get(node, {}).get('attrs', {})
+        return dict((attr, attrs[attr]) for attr in self.LINKED_ATTRS if attr in attrs)
+    
+    def getAttr(self, node, attr, default=None):
+        return self.nodes.get(node, {}).get('attrs', {}).get(attr, default)
+
+class MetaConnectionIndex(object):
     '''
-    check the mClassGrp attr to see if it matches the given
+    The RED9_META_CONNECTIONINDEX object. Reverse index from any node to the mNodes it's
+    message linked to, so "which mNode / rig is this node part of" is a dict lookup rather
+    than a listConnections per registered nodeType plus an isMetaNode test per result.
+    
+    The index is built lazily in one pass on the first query, then kept in sync by the
+    connectionChanged event, which is only required from the RED9_META_EVENTBUS while
+    the index is built. It's dropped on scene new / open and reference load / unload
+    and rebuilt on the next query.
+    
+    Entries are keyed by MObjectHandle.hashCode() so renames and reparenting don't
+    invalidate them. The hashCode of a deleted node can be re-used so every entry also
+    holds the MObjectHandle, an entry is only used while that handle is valid and still
+    points at the node queried. The mClass isn't held, it's read from the mNode when
+    queried as a setAttr on the mClass attr, ie convertMClassType, doesn't make a
+    connection event. Each link is held as (direction, mNodeHash, mNodeAttr,
+    nodeAttr) : mNodeHandle where direction matches the getConnectedMetaNodes flags,
+    'source' when the mNode is upstream of the node, 'destination' when it's downstream,
+    and the attrs are the full plug names, multi indices included. As in
+    getConnectedMetaNodes only connections where the node's own plug is a message attr
+    are indexed.
     '''
-    if not node:
-        return False
-    if issubclass(type(node), MetaClass):
-        node=node.mNode
-    if not hasattr(mClassGrps,'__iter__'):
-        mClassGrps=[mClassGrps]
-    for grp in mClassGrps:
-        log.debug('mGroup testing: %s' % node)
-        try:
-            if cmds.getAttr('%s.mClassGrp' % node) == grp:
-                return True
-        except:
-            log.debug('mNode has no MClassGrp attr, must be a legacy system and needs updating!! %s' % node)
+    def __init__(self):
+        self.index={}      # nodeHash : (MObjectHandle, {(direction, mNodeHash, mNodeAttr, nodeAttr) : mNodeHandle})
+        self.mNodes={}     # mNodeHash : MObjectHandle
+        self.nodeTypes={}  # Maya nodeType : bool, is it or does it inherit from a registered mNode type
+        self.registered=[]
+        self.built=False
+    
+    def isAvailable(self):
+        '''
+        the index needs MObjectHandle.hashCode, 2016 onwards
+        '''
+        return hasattr(OpenMaya.MObjectHandle, 'hashCode')
+    
+    def clear(self, *args):
+        self.index.clear()
+        self.mNodes.clear()
+        self.built=False
+        RED9_META_EVENTBUS.release('connectionChanged', 'connectionIndex')
+    
+    def build(self):
+        self.clear()
+        RED9_META_EVENTBUS.require('connectionChanged', 'connectionIndex')
+        nodes=cmds.ls(type=getMClassNodeTypes(), l=True)
+        if nodes:
+            plugs=OpenMaya.MPlugArray()
+            depNodeFn=OpenMaya.MFnDependencyNode()
+            for node, mobj, mClass, _ in getMClassDataFromNodes(nodes):
+                if not mClass:
+                    continue
+                self.__registerMNode(mobj)
+                depNodeFn.setObject(mobj)
+                try:
+                    depNodeFn.getConnections(plugs)
+                except RuntimeError:
+                    continue
+                for i in range(plugs.length()):
+                    self.__indexPlug(plugs[i])
+        self.built=True
+        log.debug('MetaConnectionIndex built : %i nodes indexed' % len(self.index))
+    
+    def isMetaNodeType(self, mobj):
+        '''
+        is the given MObject of one of the registered mNode types, or inherited from one,
+        as cmds.ls(type=getMClassNodeTypes()) would match. The answer is cached per Maya
+        nodeType so the connection callback can filter on it without touching the scene
+        '''
+        if self.registered!=getMClassNodeTypes():
+            self.registered=list(getMClassNodeTypes())
+            self.nodeTypes.clear()
+        nodeType=OpenMaya.MFnDependencyNode(mobj).typeName()
+        if not nodeType in self.nodeTypes:
+            inherited=cmds.nodeType(nodeType, isTypeName=True, inherited=True) or [nodeType]
+            self.nodeTypes[nodeType]=any(nType in self.registered for nType in inherited)
+        return self.nodeTypes[nodeType]
+    
+    @staticmethod
+    def __isNode(handle, mobj):
+        '''
+        the handle is still valid and points at the given MObject, not a new node
+        that's been given the same hashCode
+        '''
+        return handle.isValid() and handle.object()==mobj
+    
+    def __registerMNode(self, mobj):
+        handle=OpenMaya.MObjectHandle(mobj)
+        self.mNodes[handle.hashCode()]=handle
+        return handle
+    
+    def __getMNode(self, mobj):
+        '''
+        return the MObjectHandle of the given mNode if it's registered, stale entries are dropped
+        '''
+        mNodeHash=getMObjectHandleHash(mobj)
+        handle=self.mNodes.get(mNodeHash)
+        if handle is None:
+            return
+        if not self.__isNode(handle, mobj):
+            self.mNodes.pop(mNodeHash, None)
+            return
+        return handle
+    
+    def __getLinks(self, mobj, create=False):
+        '''
+        return the links dict of the given node, stale entries are dropped
+        '''
+        nodeHash=getMObjectHandleHash(mobj)
+        data=self.index.get(nodeHash)
+        if data and not self.__isNode(data[0], mobj):
+            self.index.pop(nodeHash, None)
+            data=None
+        if data is None:
+            if not create:
+                return
+            data=self.index[nodeHash]=(OpenMaya.MObjectHandle(mobj), OrderedDict())
+        return data[1]
+    
+    def __indexPlug(self, plug):
+        '''
+        index all the connections to the given mNode plug
+        '''
+        connected=OpenMaya.MPlugArray()
+        mNodeHandle=self.__getMNode(plug.node())
+        mNodeAttr=getPlugName(plug)
+        # mNode.attr >> node.attr : the mNode is the source of the node
+        plug.connectedTo(connected, False, True)
+        for i in range(connected.length()):
+            self.__add(connected[i], 'source', mNodeHandle, mNodeAttr)
+        # node.attr >> mNode.attr : the mNode is the destination of the node
+        plug.connectedTo(connected, True, False)
+        for i in range(connected.length()):
+            self.__add(connected[i], 'destination', mNodeHandle, mNodeAttr)
+    
+    def __add(self, nodePlug, direction, mNodeHandle, mNodeAttr):
+        if not nodePlug.attribute().hasFn(OpenMaya.MFn.kMessageAttribute):
+            return
+        links=self.__getLinks(nodePlug.node(), create=True)
+        links[(direction, mNodeHandle.hashCode(), mNodeAttr, getPlugName(nodePlug))]=mNodeHandle
+    
+    def __remove(self, nodePlug, direction, mNodeHandle, mNodeAttr):
+        links=self.__getLinks(nodePlug.node())
+        if links:
+            links.pop((direction, mNodeHandle.hashCode(), mNodeAttr, getPlugName(nodePlug)), None)
+    
+    def connectionChanged(self, srcPlug, destPlug, made):
+        '''
+        keep the index in sync, called from the module connection callback
+        '''
+        if not self.built:
+            return
+        if not srcPlug.attribute().hasFn(OpenMaya.MFn.kMessageAttribute) \
+                and not destPlug.attribute().hasFn(OpenMaya.MFn.kMessageAttribute):
+            return
+        update=self.__add if made else self.__remove
+        for mNodePlug, nodePlug, direction in ((srcPlug, destPlug, 'source'), (destPlug, srcPlug, 'destination')):
+            mNodeHandle=self.__getMNode(mNodePlug.node())
+            if mNodeHandle is None:
+                if not made or not self.isMetaNodeType(mNodePlug.node()):
+                    continue
+                mClass, _ = getMClassDataFromMObject(mNodePlug.node())
+                if not mClass:
+                    continue
+                mNodeHandle=self.__registerMNode(mNodePlug.node())
+            update(nodePlug, direction, mNodeHandle, getPlugName(mNodePlug))
+    
+    def removeMObject(self, mobj):
+        if self.__getLinks(mobj) is not None:
+            self.index.pop(getMObjectHandleHash(mobj), None)
+        if self.__getMNode(mobj) is not None:
+            self.mNodes.pop(getMObjectHandleHash(mobj), None)
+    
+    def getConnections(self, node, source=True, destination=True):
+        '''
+        return the indexed connections for the given node
+        
+        :param node: Maya node name or MObject
+        :return: list of (mNode, mClass, mObject, mNodeAttr, nodeAttr) for all valid linked mNodes,
+            the mNode named as cmds.listConnections would and the mClass read from the node now
+        '''
+        if not self.built:
+            self.build()
+        if not isinstance(node, OpenMaya.MObject):
+            try:
+                selList=OpenMaya.MSelectionList()
+                selList.add(node)
+                mobj=OpenMaya.MObject()
+                selList.getDependNode(0, mobj)
+                node=mobj
+            except RuntimeError:
+                return []
+        connections=[]
+        depNodeFn=OpenMaya.MFnDependencyNode()
+        links=self.__getLinks(node) or {}
+        for (direction, mNodeHash, mNodeAttr, nodeAttr), handle in links.items():
+            if (direction=='source' and not source) or (direction=='destination' and not destination):
+                continue
+            if not handle.isValid():
+                continue
+            mobj=handle.object()
+            mNodeHandle=self.mNodes.get(mNodeHash)
+            if mNodeHandle is None or not self.__isNode(mNodeHandle, mobj):
+                continue
+            mClass, _ = getMClassDataFromMObject(mobj, depNodeFn)
+            if not mClass:
+                continue
+            connections.append((getMObjectName(mobj, longName=False), mClass, mobj, mNodeAttr, nodeAttr))
+        return connections
 
-            
-@r9General.Timer
-def getMetaNodes(mTypes=[], mInstances=[], mClassGrps=[], mAttrs=None, dataType='mClass', nTypes=None, mSystemRoot=False, **kws):
+def metaConnectionCallback(srcPlug, destPlug, made, *args):
     '''
-    Get all mClass nodes in scene and return as mClass objects if possible
-    :param mTypes: only return meta nodes of a given type
-    :param mInstances: idea - this will check subclass inheritance, ie, MetaRig would
-            return ALL nodes who's class is inherited from MetaRig. Allows you to
-            group the data more efficiently by base classes and their inheritance
-    :param mClassGrps: checks the mClassGrp used to soft grp nodes and mark ones as a certain
-            system type without looking at class inheritance. Good for marking key classes as bases
-    :param mAttrs: uses the FilterNode.lsSearchAttributes call to match nodes via given attrs
-    :param dataType: default='mClass' return the nodes already instantiated to
-                the correct class object. If not then return the Maya node itself
-    :param nTypes: only inspect nodes of a given Type
+    Subscribed to the connectionChanged event to keep the RED9_META_CONNECTIONINDEX in sync
     '''
-    mNodes=[]
-    if not nTypes:
-        nodes = cmds.ls(type=getMClassNodeTypes(), l=True)
-    else:
-        nodes = cmds.ls(type=nTypes, l=True)
-    if not nodes:
-        return mNodes
-    for node in nodes:
-        mNode=False
-        if not mInstances:
-            if isMetaNode(node, mTypes=mTypes):
-                mNode=True
-        else:
-            if isMetaNodeInherited(node,mInstances):
-                mNode=True
-        if mNode:
-            if mClassGrps:
-                if not hasattr(mClassGrps,'__iter__'):
-                    mClassGrps=[mClassGrps]
-                if isMetaNodeClassGrp(node, mClassGrps):
-                    mNodes.append(node)
-            else:
-                mNodes.append(node)
-    if not mNodes:
-        return mNodes
-    if mAttrs:
-        #lazy to avoid cyclic imports
-        import Red9_CoreUtils as r9Core
-        mNodes=r9Core.FilterNode().lsSearchAttributes(mAttrs, nodes=mNodes)
-    if dataType=='mClass':
-        return[MetaClass(node,**kws) for node in mNodes]
-    else:
-        return mNodes
+    if not RED9_META_CONNECTIONINDEX.built:
+        return
+    try:
+        # the callback fires for every connection in the scene, only links to an mNode type are indexed
+        if not RED9_META_CONNECTIONINDEX.isMetaNodeType(srcPlug.node()) \
+                and not RED9_META_CONNECTIONINDEX.isMetaNodeType(destPlug.node()):
+            return
+        RED9_META_CONNECTIONINDEX.connectionChanged(srcPlug, destPlug, made)
+    except StandardError, error:
+        #never let a callback error out, drop the index so it's rebuilt on the next query
+        log.debug('MetaConnectionIndex update failed, resetting : %s' % error)
+        RED9_META_CONNECTIONINDEX.clear()
 
+global RED9_META_CONNECTIONINDEX
+RED9_META_CONNECTIONINDEX = MetaConnectionIndex()
 
 def getMetaRigs(mInstances='MetaRig', mClassGrps=['MetaRig']):
     '''
@@ -750,22 +2487,22 @@ def getMetaRigs(mInstances='MetaRig', mClassGrps=['MetaRig']):
     using the mClassGrps variable. This probably will expand as it's tested
     '''
     # try the Red9 Production Rig nodes first
-    mRigs=getMetaNodes(mInstances=['Red9_MetaRig', 'Pro_MetaRig','Pro_MetaRig_FacialUI'], mClassGrps=['Pro_BodyRig','Pro_FacialUI'])
+    mRigs=getMetaNodesBulk(mInstances=['Red9_MetaRig', 'Pro_MetaRig','Pro_MetaRig_FacialUI'], mClassGrps=['Pro_BodyRig','Pro_FacialUI'])
     if mRigs:
         return mRigs
     
     # not found, lets widen to all instances of MetaRig with mClassGrp also set
-    mRigs=getMetaNodes(mInstances=mInstances, mClassGrps=mClassGrps)
+    mRigs=getMetaNodesBulk(mInstances=mInstances, mClassGrps=mClassGrps)
     if mRigs:
         return mRigs
     
     # ok widen again to all instances of MetaRig, ignoring the mClassGroup
-    mRigs=getMetaNodes(mTypes=mInstances)
+    mRigs=getMetaNodesBulk(mTypes=mInstances)
     if mRigs:
-        return getMetaNodes(mTypes=mInstances)
+        return mRigs
     else:
         # final try, mInstances of MetaRig
-        return getMetaNodes(mInstances=mInstances)
+        return getMetaNodesBulk(mInstances=mInstances)
     
 def getUnregisteredMetaNodes():
     '''
@@ -800,6 +2537,28 @@ def getConnectedMetaNodes(nodes, source=True, destination=True, mTypes=[], mInst
     mNodes=[]
     connections=[]
     
+    if not nTypes and RED9_META_CONNECTIONINDEX.isAvailable():
+        # indexed lookup, the mClass is already known so no isMetaNode test per result
+        if not type(nodes)==list:
+            nodes=[nodes]
+        mClassMatched=getMClassMatcher(mTypes, mInstances)
+        found={}
+        for node in nodes:
+            if issubclass(type(node), MetaClass):
+                node=node.mNode
+            for mNode, mClass, mobj, _, _ in RED9_META_CONNECTIONINDEX.getConnections(node, source, destination):
+                if mClassMatched(mClass):
+                    found[mNode]=(mClass, mobj)
+        if not found:
+            return mNodes
+        if mAttrs:
+            #lazy to avoid cyclic imports
+            import Red9_CoreUtils as r9Core
+            found=dict((node, found[node]) for node in r9Core.FilterNode().lsSearchAttributes(mAttrs, nodes=found.keys()))
+        if dataType=='mClass':
+            return [_instantiateMetaNode(node, mClass, mobj, **kws) for node, (mClass, mobj) in found.items()]
+        return found.keys()
+    
     if not nTypes:
         nTypes = getMClassNodeTypes()
     #if mTypes and not type(mTypes)==list:mTypes=[mTypes]
@@ -929,6 +2688,7 @@ def  convertNodeToMetaData(nodes,mClass):
         ideally you should use the convertMClassType func now as that wraps this if the
         nodes passed in aren't already instanitated or bound to meta
     '''
+    import Red9_CoreUtils as r9Core  # lazy loaded
     if not type(nodes)==list:
         nodes=[nodes]
     for node in nodes:
@@ -1222,6 +2982,7 @@ class MClassNodeUI(object):
         rebuild the list based on the filter typed in, Note that results are 
         converted to upper before the match so it's case IN-sensitive
         '''
+        import Red9_CoreUtils as r9Core  # lazy loaded
         self.shortname=False
         self.stripNamespaces=False
         filterby=cmds.textFieldGrp('filterByName', q=True, text=True)
@@ -1380,10 +3141,182 @@ class MClassNodeUI(object):
 # --- Main Meta Class --- ------
 # ----------------------------------------------------------------------------
 
+def melString(value):
+    '''
+    return the given string quoted and escaped as a MEL string literal
+    '''
+    return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+
+def melFloat(value):
+    '''
+    return the given float as a MEL float literal, MEL has no inf or nan so
+    non-finite values raise a ValueError
+    '''
+    value=float(value)
+    if math.isinf(value) or math.isnan(value):
+        raise ValueError('%r has no MEL float literal' % value)
+    return repr(value)
+
+class MetaBatchEdit(object):
+    '''
+    The queue used by MetaClass.batchEdit(), holds the pending addAttr calls and
+    attr sets for a single mNode until the block is flushed.
+    
+    On flush the attr types and lock states come from the api plugs rather than
+    per attr cmds queries, and the numeric, enum and string sets, along with the
+    unlock / relock of any locked attrs, are run as a single MEL setAttr block.
+    If the block fails part way, ie a locked attr set without force, the attrs are
+    set again one by one so that every other set still goes through and every
+    unlocked attr is relocked, the failures are raised once the flush is done.
+    Message links and any other attr types still go through the MetaClass setters.
+    '''
+    def __init__(self, mNode):
+        self.mNode=mNode
+        self.adds=OrderedDict()   # attr : (value, attrType, hidden, kws)
+        self.sets=OrderedDict()   # attr : (value, force)
+        self.flushing=False
+    
+    def queueAdd(self, attr, value, attrType, hidden, kws):
+        self.adds[attr]=(value, attrType, hidden, kws)
+        
+    def queueSet(self, attr, value, force=True):
+        if attributeDataType(value)=='float':
+            melFloat(value)  # reject inf / nan now rather than part way through the flush
+        self.sets[attr]=(value, force)
+        
+    def flush(self):
+        '''
+        push all queued edits to the Maya node
+        '''
+        if not self.adds and not self.sets:
+            return
+        mNode=self.mNode
+        node=mNode.mNode
+        nodeLocked=False
+        self.flushing=True
+        try:
+            if mNode._lockState:
+                cmds.lockNode(node, lock=False)
+                nodeLocked=True
+            for attr, (value, attrType, hidden, kws) in self.adds.items():
+                mNode.addAttr(attr, value, attrType=attrType, hidden=hidden, **kws)
+            
+            depNodeFn=object.__getattribute__(mNode, '_MFnDependencyNode')
+            attrCmds=[]  # (attr, unlock, set, relock) MEL per attr
+            remaining=[]
+            for attr, (value, force) in self.sets.items():
+                if not depNodeFn.hasAttribute(attr):
+                    log.debug('attr : %s doesnt exist on MayaNode > class attr only' % attr)
+                    continue
+                plug=depNodeFn.findPlug(attr, False)
+                command=self.__melSetAttr(attr, plug, value)
+                if not command:
+                    remaining.append((attr, value, force))
+                    continue
+                plugName=melString('%s.%s' % (node, attr))
+                unlock=relock=None
+                if force and plug.isLocked():
+                    unlock='setAttr -l 0 %s;' % plugName
+                    #string attrs historically weren't re-locked after being set
+                    if not command.startswith('setAttr -type "string"'):
+                        relock='setAttr -l 1 %s;' % plugName
+                attrCmds.append((attr, unlock, command, relock))
+            errors=[]
+            if attrCmds:
+                try:
+                    mel.eval('\n'.join(line for cmdLines in attrCmds for line in cmdLines[1:] if line))
+                except RuntimeError, error:
+                    log.debug('batchEdit MEL block failed, setting the attrs one by one : %s' % error)
+                    for attr, unlock, command, relock in attrCmds:
+                        try:
+                            if unlock:
+                                mel.eval(unlock)
+                            mel.eval(command)
+                        except RuntimeError, error:
+                            errors.append('%s : %s' % (attr, error))
+                        finally:
+                            if relock:
+                                mel.eval(relock)
+            
+            #anything the MEL block can't set goes through the MetaClass setters
+            for attr, value, force in remaining:
+                attrType=mNode.attrType(attr)
+                locked=force and depNodeFn.findPlug(attr, False).isLocked()
+                if locked:
+                    cmds.setAttr('%s.%s' % (node, attr), l=False)
+                try:
+                    if attrType=='enum':
+                        mNode.__setEnumAttr__(attr, value)
+                    elif attrType=='message':
+                        mNode.__setMessageAttr__(attr, value, force)
+                    elif mNode.__setStandardAttr__(attr, attrType, value):
+                        locked=False
+                except StandardError, error:
+                    errors.append('%s : %s' % (attr, error))
+                finally:
+                    if locked:
+                        cmds.setAttr('%s.%s' % (node, attr), l=True)
+            if errors:
+                raise StandardError('batchEdit on %s failed to set : %s' % (node, errors))
+        finally:
+            self.flushing=False
+            self.adds.clear()
+            self.sets.clear()
+            if nodeLocked:
+                cmds.lockNode(node, lock=True)
+    
+    def discard(self):
+        '''
+        drop the queued edits without pushing them to the Maya node
+        '''
+        if self.adds or self.sets:
+            log.warning('batchEdit on %s failed, queued edits discarded : %s' % (self.mNode.mNode,
+                                                                                  self.adds.keys()+self.sets.keys()))
+        self.adds.clear()
+        self.sets.clear()
+    
+    def __melSetAttr(self, attr, plug, value):
+        '''
+        return the MEL setAttr command for the given plug and value, or None if the
+        set needs the MetaClass setters, ie message links, compounds and arrays
+        '''
+        plugName=melString('%s.%s' % (self.mNode.mNode, attr))
+        valueType=attributeDataType(value)
+        attrObj=plug.attribute()
+        if attrObj.hasFn(OpenMaya.MFn.kEnumAttribute):
+            if valueType=='string' or valueType=='unicode':
+                try:
+                    value=OpenMaya.MFnEnumAttribute(attrObj).fieldIndex(value)
+                except:
+                    raise ValueError('Invalid enum string passed in: string is not in enum keys')
+            elif not valueType in ['bool', 'int']:
+                return None
+            return 'setAttr %s %i;' % (plugName, value)
+        if attrObj.hasFn(OpenMaya.MFn.kTypedAttribute):
+            if not OpenMaya.MFnTypedAttribute(attrObj).attrType()==OpenMaya.MFnData.kString:
+                return None
+            if valueType=='complex':
+                value=RED9_META_ATTRCODEC.encode(value, object.__getattribute__(self.mNode, 'complexCodecs').get(attr, 'json'))
+            elif not valueType in ['string', 'unicode']:
+                return None
+            return 'setAttr -type "string" %s %s;' % (plugName, melString(value))
+        if plug.isCompound() or plug.isArray():
+            return None
+        if attrObj.hasFn(OpenMaya.MFn.kNumericAttribute) or attrObj.hasFn(OpenMaya.MFn.kUnitAttribute):
+            if valueType in ['bool', 'int']:
+                return 'setAttr %s %i;' % (plugName, value)
+            if valueType=='float':
+                return 'setAttr %s %s;' % (plugName, melFloat(value))
+        return None
+
+
 class MetaClass(object):
     
     cached = None
-    UNMANAGED=['mNode', 'mNodeID', '_MObject', '_MObjectHandle', '_MFnDependencyNode', '_lockState', 'lockState', '_forceAsMeta']
+    _resolvedMClass = None  # (node, mClass) handed from __new__ / bulk calls to __init__ so isMetaNode isn't re-run
+    _batchEdit = None  # MetaBatchEdit queue bound whilst in a batchEdit block
+    complexCodecs = {}  # attr : MetaAttrCodec codec for complex attrs, json if not given, copied per instance
+    UNMANAGED=['mNode', 'mNodeID', '_MObject', '_MObjectHandle', '_MFnDependencyNode', '_lockState', 'lockState', '_forceAsMeta', '_batchEdit', 'complexCodecs']
         
     def __new__(cls, *args, **kws):
         '''
@@ -1418,6 +3351,7 @@ class MetaClass(object):
                 _registeredMClass=RED9_META_REGISTERY[mClass]
                 try:
                     log.debug('### Instantiating existing mClass : %s >> %s ###' % (mClass,_registeredMClass))
+                    MetaClass._resolvedMClass=(mNode, mClass)
                     return super(cls.__class__, cls).__new__(_registeredMClass,*args,**kws)
                 except:
                     log.debug('Failed to initialize mClass : %s' % _registeredMClass)
@@ -1454,6 +3388,11 @@ class MetaClass(object):
             log.debug('CACHE : Aborting __init__ on pre-cached MetaClass Object')
             return
         
+        # mClass already resolved for this node by __new__ or the bulk calls
+        resolved=MetaClass._resolvedMClass
+        MetaClass._resolvedMClass=None
+        resolvedMClass=resolved is not None and node is not None and resolved[0] is node
+        
         log.debug('Meta__init__ main args :: node=%s, name=%s, nodeType=%s' % (node, name, nodeType))
         #data that will not get pushed to the Maya node
         object.__setattr__(self, '_MObject', '')
@@ -1469,6 +3408,7 @@ class MetaClass(object):
 
         object.__setattr__(self, '_lockState', False)    # by default all mNode's are unlocked, manage this in any subclass if needed
         object.__setattr__(self, '_forceAsMeta', False)  # force all getAttr calls to return mClass objects even for starndard Maya nodes
+        object.__setattr__(self, 'complexCodecs', dict(self.__class__.complexCodecs))  # so opting an attr in never leaks to the class
         wrapped_node=False
         
         if not node:
@@ -1503,7 +3443,7 @@ class MetaClass(object):
         else:
             self.mNode=node
 
-            if isMetaNode(node):
+            if resolvedMClass or isMetaNode(node):
                 log.debug('Meta Node Passed in : %s' % node)
                 registerMClassNodeCache(self)
             else:
@@ -1789,6 +3729,10 @@ class MetaClass(object):
         object.__setattr__(self, attr, value)
         
         if attr not in MetaClass.UNMANAGED and not attr=='UNMANAGED':
+            batch=object.__getattribute__(self, '_batchEdit')
+            if batch and not batch.flushing:
+                batch.queueSet(attr, value, force)
+                return
             if self.hasAttr(attr):
                 locked=False
                 if self.attrIsLocked(attr) and force:
@@ -1809,45 +3753,90 @@ class MetaClass(object):
                           
                 #Standard Attribute
                 else:
-                    attrString='%s.%s' % (mnode, attr)       # mayaNode.attribute for cmds.get/set calls
-                    #attrType=cmds.getAttr(attrString, type=True)  # the MayaNode attribute valueType
-                    valueType=attributeDataType(value)            # DataType passed in to be set as Value
-                    #log.debug('setting attribute type : %s to value : %s' % (attrType,value))
-                    
-                    if attrType=='string':
-                        if valueType=='string' or valueType=='unicode':
-                            cmds.setAttr(attrString, value, type='string')
-                            log.debug("setAttr : %s : type : 'string' to value : %s" % (attr,value))
-                            return
-                        elif valueType=='complex':
-                            log.debug("setAttr : %s : type : 'complex_string' to value : %s" % (attr,self.__serializeComplex(value)))
-                            cmds.setAttr(attrString, self.__serializeComplex(value), type='string')
-                            return
-                        
-                    elif attrType in ['double3','float3'] and valueType=='complex':
-                        try:
-                            cmds.setAttr(attrString, value[0], value[1], value[2])
-                        except ValueError, error:
-                            raise ValueError(error)
-                    elif attrType == 'doubleArray':
-                        cmds.setAttr(attrString, value, type='doubleArray')
-                    elif attrType == 'matrix':
-                        cmds.setAttr(attrString, value, type='matrix')
-                        
-                    #elif attrType=='TdataCompound': #ie blendShape weights = multi data or joint.minRotLimitEnable
-                    #    pass
-                    else:
-                        try:
-                            cmds.setAttr(attrString, value)
-                        except StandardError,error:
-                            log.debug('failed to setAttr %s - might be connected' % attrString)
-                            raise StandardError(error)
-                    log.debug("setAttr : %s : type : '%s' to value : %s" % (attr, attrType,value))
+                    if self.__setStandardAttr__(attr, attrType, value):
+                        return
                 if locked:
                     self.attrSetLocked(attr,True)
             else:
                 log.debug('attr : %s doesnt exist on MayaNode > class attr only' % attr)
     
+    def __setStandardAttr__(self, attr, attrType, value):
+        '''
+        Standard attrs : the setAttr handling for all attrs that aren't enums or
+        message links, shared by __setattr__ and the batchEdit flush. Returns True
+        for string attrs as historically these didn't re-lock the attr after setting
+        '''
+        attrString='%s.%s' % (self.mNode, attr)       # mayaNode.attribute for cmds.get/set calls
+        #attrType=cmds.getAttr(attrString, type=True)  # the MayaNode attribute valueType
+        valueType=attributeDataType(value)            # DataType passed in to be set as Value
+        #log.debug('setting attribute type : %s to value : %s' % (attrType,value))
+        
+        if attrType=='string':
+            if valueType=='string' or valueType=='unicode':
+                cmds.setAttr(attrString, value, type='string')
+                log.debug("setAttr : %s : type : 'string' to value : %s" % (attr,value))
+                return True
+            elif valueType=='complex':
+                serialized=self.__serializeComplex(value, object.__getattribute__(self, 'complexCodecs').get(attr, 'json'))
+                log.debug("setAttr : %s : type : 'complex_string' to value : %s" % (attr,serialized))
+                cmds.setAttr(attrString, serialized, type='string')
+                return True
+            
+        elif attrType in ['double3','float3'] and valueType=='complex':
+            try:
+                cmds.setAttr(attrString, value[0], value[1], value[2])
+            except ValueError, error:
+                raise ValueError(error)
+        elif attrType == 'doubleArray':
+            cmds.setAttr(attrString, value, type='doubleArray')
+        elif attrType == 'matrix':
+            cmds.setAttr(attrString, value, type='matrix')
+            
+        #elif attrType=='TdataCompound': #ie blendShape weights = multi data or joint.minRotLimitEnable
+        #    pass
+        else:
+            try:
+                cmds.setAttr(attrString, value)
+            except StandardError,error:
+                log.debug('failed to setAttr %s - might be connected' % attrString)
+                raise StandardError(error)
+        log.debug("setAttr : %s : type : '%s' to value : %s" % (attr, attrType,value))
+    
+    @contextmanager
+    def batchEdit(self):
+        '''
+        Context manager to batch up attribute edits on this mNode. Whilst in the block
+        all attr sets and any addAttr calls for new attrs are queued, then flushed in
+        one pass on exit: the node is unlocked once, the new attrs are added, then the
+        numeric, enum and string sets are run as a single MEL block with each locked attr
+        unlocked and relocked within it.
+        
+        >>> with mNode.batchEdit():
+        >>>     mNode.addAttr('newAttr', 1.0)
+        >>>     mNode.part='arm'
+        >>>     mNode.mirrorSide=1
+        
+        .. note::
+            reading an attr inside the block returns the current value on the Maya node,
+            the queued values are only pushed to the node when the block exits. If the
+            block raises then the queue is discarded and the dropped attrs are logged.
+        '''
+        if object.__getattribute__(self, '_batchEdit'):
+            #nested, the outer block flushes
+            yield object.__getattribute__(self, '_batchEdit')
+            return
+        batch=MetaBatchEdit(self)
+        object.__setattr__(self, '_batchEdit', batch)
+        try:
+            try:
+                yield batch
+            except:
+                batch.discard()
+                raise
+            batch.flush()
+        finally:
+            object.__setattr__(self, '_batchEdit', None)
+    
     def __getMessageAttr__(self, attr):
         '''
         separated func as it's the kind of thing that other classes may want to overload
@@ -1888,13 +3877,29 @@ class MetaClass(object):
             
             #stops recursion, do not getAttr on mNode here
             mNode=object.__getattribute__(self, "mNode")
-            if not mNode or not cmds.objExists(mNode):
+            if not mNode:
+                return object.__getattribute__(self, attr)
+            
+            #the mClass schema holds the attrType so reads skip the objExists and
+            #getAttr(type=True) calls once an attr has been read on any node of the class
+            mClass=object.__getattribute__(self, '__class__')
+            schema=RED9_META_ATTRSCHEMA.getSchema(mClass.__name__)
+            entry=schema.get(attr)
+            if entry is None:
+                try:
+                    attrType=cmds.getAttr('%s.%s' % (mNode,attr),type=True)
+                except:
+                    attrType=None
+                #attrs on neither the node nor the class aren't cached, they may be added later
+                if attrType or hasattr(mClass, attr):
+                    entry=schema[attr]=[attrType, None]
+            else:
+                attrType=entry[0]
+            if not attrType:
                 return object.__getattribute__(self, attr)
             else:
                 #MayaNode processing - retrieve attrVals on the MayaNode
                 try:
-                    attrType=cmds.getAttr('%s.%s' % (mNode,attr),type=True)
-                    
                     #Message Link handling
                     #=====================
                     if attrType=='message':
@@ -1902,18 +3907,34 @@ class MetaClass(object):
 
                     #Standard Maya Attr handling
                     #===========================
-                    attrVal=cmds.getAttr('%s.%s' % (mNode,attr), silent=True)
+                    try:
+                        attrVal=cmds.getAttr('%s.%s' % (mNode,attr), silent=True)
+                    except:
+                        #the cached attr has gone from the node, type it again next read
+                        RED9_META_ATTRSCHEMA.invalidate(mClass.__name__, attr)
+                        raise
                     if attrType=='string':
                         #for string data we pass it via the JSON decoder such that
-                        #complex data can be managed and returned correctly
-                        try:
-                            attrVal=self.__deserializeComplex(attrVal)
-                            if type(attrVal)==dict:
-                                return attrVal
-                                #log.debug('Making LinkedDict')
-                                #return self.LinkedDict([self,attr],attrVal)
-                        except:
-                            log.debug('string is not JSON deserializable')
+                        #complex data can be managed and returned correctly. Whether the
+                        #attr holds json is settled by the first non-empty value read,
+                        #after that plain strings only get the cheap first character test
+                        if entry is not None and entry[1] is None and attrVal:
+                            try:
+                                decoded=self.__deserializeComplex(attrVal)
+                                entry[1]=True
+                                return decoded
+                            except:
+                                entry[1]=False
+                                log.debug('string is not JSON deserializable')
+                        elif entry is None or entry[1] or RED9_META_ATTRCODEC.isDecodable(attrVal):
+                            try:
+                                attrVal=self.__deserializeComplex(attrVal)
+                                if type(attrVal)==dict:
+                                    return attrVal
+                                    #log.debug('Making LinkedDict')
+                                    #return self.LinkedDict([self,attr],attrVal)
+                            except:
+                                log.debug('string is not JSON deserializable')
                     elif attrType=='double3' or attrType=='float3':
                         return attrVal[0]  # return (x,x,x) not [(x,x,x)] as standard Maya does
                 #else:
@@ -1923,9 +3944,10 @@ class MetaClass(object):
         except StandardError,error:
             raise StandardError(error)
               
-    def __serializeComplex(self, data):
+    def __serializeComplex(self, data, codec='json'):
         '''
-        Serialize complex data such as dicts to a JSON string
+        Serialize complex data such as dicts to a JSON string, or the given
+        MetaAttrCodec codec if the attr has opted in via complexCodecs
         
         Test the len of the string, anything over 32000 (16bit) gets screwed by the
         Maya attribute template and truncated IF you happened to select the string in the
@@ -1933,18 +3955,20 @@ class MetaClass(object):
         bit thanks to MarkJ for that as it was doing my head in!!
         http://markj3d.blogspot.co.uk/2012/11/maya-string-attr-32k-limit.html
         '''
-        if len(data)>32700:
+        serialized=RED9_META_ATTRCODEC.encode(data, codec)
+        if len(serialized)>32700:
             log.debug('Warning >> Length of string is over 16bit Maya Attr Template limit - lock this after setting it!')
-        return json.dumps(data)
+        return serialized
     
     def __deserializeComplex(self, data):
         '''
-        Deserialize data from a JSON string back to it's original complex data
+        Deserialize data from a JSON string, or a MetaAttrCodec encoded string,
+        back to it's original complex data
         '''
         #log.debug('deserializing data via JSON')
         if type(data) == unicode:
-            return json.loads(str(data))
-        return json.loads(data)
+            data=str(data)
+        return RED9_META_ATTRCODEC.decode(data)
     
     @nodeLockManager
     def __delattr__(self, attr):
@@ -1954,6 +3978,7 @@ class MetaClass(object):
             if self.hasAttr(attr):
                 cmds.setAttr('%s.%s' % (self.mNode,attr), l=False)
                 cmds.deleteAttr('%s.%s' % (self.mNode, attr))
+                RED9_META_ATTRSCHEMA.invalidate(object.__getattribute__(self, '__class__').__name__, attr)
                 
         except StandardError,error:
             raise StandardError(error)
@@ -2043,6 +4068,13 @@ class MetaClass(object):
         if attrType and attrType=='enum' and not 'enumName' in kws:
             raise ValueError('enum attrType must be passed with "enumName" keyword in args')
         
+        batch=object.__getattribute__(self, '_batchEdit')
+        if batch and not batch.flushing and not self.hasAttr(attr):
+            #in a batchEdit block, new attrs are added when the block is flushed
+            batch.queueAdd(attr, value, attrType, hidden, kws)
+            object.__setattr__(self, attr, value)
+            return True
+        
         DataTypeKws = {'string': {'longName':attr, 'dt':'string'}, \
                      'unicode': {'longName':attr, 'dt':'string'}, \
                      'int': {'longName':attr, 'at':'long'}, \
@@ -2099,6 +4131,7 @@ class MetaClass(object):
                 DataTypeKws[attrType].update(addkwsToEdit)  # merge in **kws, allows you to pass in all the standard addAttr kws
                 log.debug('addAttr : %s : valueType : %s > dataType kws: %s' % (attr, attrType, DataTypeKws[attrType]))
                 cmds.addAttr(self.mNode, **DataTypeKws[attrType])
+                RED9_META_ATTRSCHEMA.invalidate(object.__getattribute__(self, '__class__').__name__, attr)
 
                 if attrType == 'double3' or attrType == 'float3':
                     attr1 = '%sX' % attr
@@ -2654,7 +4687,7 @@ class MetaClass(object):
             return mChild
         
     @r9General.Timer
-    def getChildMetaNodes(self, walk=False, mAttrs=None, stepover=False, **kws):
+    def getChildMetaNodes(self, walk=False, mAttrs=None, stepover=False, graph=None, **kws):
         '''
         Find any connected Child MetaNodes to this mNode.
 
@@ -2664,6 +4697,8 @@ class MetaClass(object):
             we continue to walk down a tree if it's parent didn't match the given type, default is False
             which will abort a tree who's parent didn't match. With stepover=True we simply stepover
             that node and continue down all child nodes
+        :param graph: a MetaNetworkGraph to answer the query from. The walk builds a lazy one from
+            this node if not given, pass one in when making several calls against the same network
 
         .. note::
             mAttrs is only searching attrs on the mNodes themselves, not all children
@@ -2675,70 +4710,37 @@ class MetaClass(object):
             also take ALL of that functions **kws functionality in the initial search:
             source=True, destination=True, mTypes=[], mInstances=[], mAttrs=None, dataType='mClass'
         '''
-        if not walk:
+        if not walk and not graph:
             return getConnectedMetaNodes(self.mNode, source=False, destination=True, mAttrs=mAttrs, dataType='mClass', **kws)
+        mTypes=kws.get('mTypes', [])
+        mInstances=kws.get('mInstances', [])
+        if walk and stepover and not mTypes and not mInstances:
+            # stepover only returns the nodes that match the given types
+            return []
+        if not graph:
+            graph=MetaNetworkGraph(nTypes=kws.get('nTypes'), lazy=True)
+        if walk and stepover:
+            # walk through unmatched nodes, only the mAttrs filter stops the walk, the type match is done after
+            matched=graph.mClassFilter(mAttrs=mAttrs)
         else:
-            metaNodes=[]
-            if stepover:
-                children=getConnectedMetaNodes(self.mNode, source=False, destination=True, mAttrs=mAttrs, dataType='unicode')  #, **kws)
-            else:
-                children=getConnectedMetaNodes(self.mNode, source=False, destination=True, mAttrs=mAttrs, dataType='unicode', **kws)
-            if children:
-                runaways=0
-                depth=0
-                processed=[]
-                extendedChildren=[]
-                while children and runaways<=1000:
-                    for child in children:
-                        mNode=child
-                        if mNode not in processed:
-                            metaNodes.append(child)
-                        else:
-                            #print('skipping as node already processed : %s' % mNode)
-                            children.remove(child)
-                            continue
-                            #log.info('mNode added to metaNodes : %s' % mNode)
-                        children.remove(child)
-                        processed.append(mNode)
-                        #log.info( 'connections too : %s' % mNode)
-                        if stepover:
-                            # if we're stepping over unmatched children then we remove the kws and deal with the match later
-                            extendedChildren.extend(getConnectedMetaNodes(mNode,source=False,destination=True,mAttrs=mAttrs, dataType='unicode'))  # , **kws))
-                        else:
-                            extendedChildren.extend(getConnectedMetaNodes(mNode,source=False,destination=True,mAttrs=mAttrs, dataType='unicode', **kws))
-                        #log.info('left to process : %s' % ','.join([c.mNode for c in children]))
-                        if not children:
-                            if extendedChildren:
-                                log.debug('Child MetaNode depth extended %i' % depth)
-                                #log.debug('Extended Depth child List: %s' % ','.join([c.mNode for c in extendedChildren]))
-                                children.extend(extendedChildren)
-                                extendedChildren=[]
-                                depth+=1
-                        runaways+=1
-                childmNodes=[MetaClass(node) for node in metaNodes]
-                typematched=[]
-                if stepover:
-                    if 'mTypes' in kws:
-                        for node in childmNodes:
-                            if isMetaNodeInherited(node, kws['mTypes']):
-                                log.debug('getChildMetaNodes : mTypes matched : %s' % node)
-                                if not node in typematched:
-                                    typematched.append(node)
-                    if 'mInstances' in kws:
-                        for node in childmNodes:
-                            if isMetaNodeInherited(node, kws['mInstances']):
-                                log.debug('getChildMetaNodes : mInstances matched : %s' % node)
-                                if not node in typematched:
-                                    typematched.append(node)
-                    return typematched
-                else:
-                    return childmNodes
-        return []
+            matched=graph.mClassFilter(mTypes=mTypes, mInstances=mInstances, mAttrs=mAttrs)
+        mobj=None if self.mNode in graph.mObjects else self.mNodeMObject
+        if walk:
+            nodes=graph.walk(self.mNode, 'children', matched, mobj)
+        else:
+            nodes=[node for node in graph.getLinked(self.mNode, 'children', mobj) if matched(node)]
+        if walk and stepover:
+            # stepover has always matched both mTypes and mInstances by inheritance
+            inherited=graph.mClassFilter(mInstances=mTypesToRegistryKey(mTypes) + mTypesToRegistryKey(mInstances))
+            nodes=[node for node in nodes if inherited(node)]
+        return graph.instantiate(nodes)
     
-    def getParentMetaNode(self, **kws):
+    def getParentMetaNode(self, graph=None, **kws):
         '''
         Find any connected Parent MetaNode to this mNode
         
+        :param graph: optional MetaNetworkGraph to answer the query from rather than the scene
+        
         .. note::
             Because the **kws are passed directly to the getConnectedMetaNods func, it will
             also take ALL of that functions kws
@@ -2746,6 +4748,13 @@ class MetaClass(object):
             
         TODO: implement a walk here to go upstream
         '''
+        if graph:
+            matched=graph.mClassFilter(kws.get('mTypes', []), kws.get('mInstances', []), kws.get('mAttrs'))
+            mobj=None if self.mNode in graph.mObjects else self.mNodeMObject
+            parents=[node for node in graph.getLinked(self.mNode, 'parents', mobj) if matched(node)]
+            if parents:
+                return graph.instantiate(parents[:1])[0]
+            return
         mNodes=getConnectedMetaNodes(self.mNode,source=True,destination=False, **kws)
         if mNodes:
             return mNodes[0]
@@ -2826,6 +4835,22 @@ class MetaClass(object):
         if type(node)==list:
             raise StandardError("getNodeConnectionMetaDataMap: node must be a single node, not an list")
         mNodes={}
+        if RED9_META_CONNECTIONINDEX.isAvailable():
+            # indexed, the first mNode linked upstream of the node that matches mTypes
+            connections=RED9_META_CONNECTIONINDEX.getConnections(node, source=True, destination=False)
+            if not connections:
+                return mNodes
+            mClassMatched=getMClassMatcher(mTypes)
+            for _, mClass, mobj, mNodeAttr, _ in connections:
+                if mClassMatched(mClass):
+                    mNodes['metaAttr'] = mNodeAttr
+                    depNodeFn=OpenMaya.MFnDependencyNode(mobj)
+                    if depNodeFn.hasAttribute('mNodeID'):
+                        mNodes['metaNodeID']=depNodeFn.findPlug('mNodeID', False).asString()
+                    else:
+                        mNodes['metaNodeID']=node.split(':')[-1].split('|')[-1]
+                    return mNodes
+            return mNodes
         #why not use the r9Meta.getConnectedMetaNodes ?? > well here we're using
         #the c=True flag to get both plugs back in one go to process later
         connections=[]
@@ -2834,7 +4859,7 @@ class MetaClass(object):
             if con:
                 connections.extend(con)
         if not connections:
-            return connections
+            return mNodes
 
         log.debug('%s : connectionMap : %s' % (node.split('|')[-1].split(':')[-1],connections[1::2]))
 
@@ -2931,6 +4956,8 @@ class MetaRig(MetaClass):
     systems. This is the core of how we hook all our tools to meta
     in a seamless manner and bind some core functionality.
     '''
+    complexCodecs = {'zeroPose': 'binary'}  # pose caches, any other attr given to poseCacheStore is added per instance
+    
     def __init__(self,*args,**kws):
         '''
         :param name: name of the node and in this case, the RigSystem itself
@@ -3004,7 +5031,7 @@ class MetaRig(MetaClass):
         TODO: allow the mirror block to include an offset so that if you need to inverse AND offset 
         by 180 to get left and right working you can still do so.
         '''
-        #import Red9_AnimationUtils as r9Anim  # lazy load to avoid cyclic imports
+        import Red9_AnimationUtils as r9Anim  # lazy load to avoid cyclic imports
         
         if isinstance(node,list):
             raise StandardError('node must be a single Maya Object')
@@ -3175,6 +5202,7 @@ class MetaRig(MetaClass):
         :param nodeName: Name of the MetaClass network node created
         :param mClass: the class to be used for the support node - 'MetaRigSubSystem' by default
         '''
+        import Red9_AnimationUtils as r9Anim  # lazy loaded
         r9Anim.MirrorHierarchy()._validateMirrorEnum(side)  # ??? do we just let the enum __setattr__ handle this?
 
         if not attr:
@@ -3212,6 +5240,7 @@ class MetaRig(MetaClass):
             you must run this binding function before using any of
             the inbuilt mirror functions
         '''
+        import Red9_AnimationUtils as r9Anim  # lazy loaded
         self.MirrorClass = r9Anim.MirrorHierarchy(nodes=self.getChildren(walk=True))
         try:
             self.MirrorClass.getMirrorSets()
@@ -3226,6 +5255,7 @@ class MetaRig(MetaClass):
         
         :param mirrorMap: mirror file to load
         '''
+        import Red9_AnimationUtils as r9Anim  # lazy loaded
         if not self.MirrorClass:
             self.MirrorClass = self.getMirrorData()
         if not os.path.exists(mirrorMap):
@@ -3238,6 +5268,7 @@ class MetaRig(MetaClass):
         
         :param filepath: filepath to store the mirrorMap too
         '''
+        import Red9_AnimationUtils as r9Anim  # lazy loaded
         if not self.MirrorClass:
             self.MirrorClass = self.getMirrorData()
 
@@ -3341,6 +5372,7 @@ class MetaRig(MetaClass):
         self.poseCache.settings.incRoots=incRoots
         self.poseCache.poseSave(self.mNode, filepath=filepath, useFilter=True, *args, **kws)  # no path so cache against this pose instance
         if attr:
+            self.complexCodecs.setdefault(attr, 'binary')
             if not self.hasAttr(attr):
                 self.addAttr(attr, value=self.poseCache.poseDict, hidden=True)
             else:
@@ -3478,6 +5510,7 @@ class MetaRig(MetaClass):
         :param nodes: if given only return the extent of the animation data from the given nodes
         :param setTimeLine: if True set the playback timeranges also, default=False
         '''
+        import Red9_AnimationUtils as r9Anim  # lazy loaded
         if not nodes:
             nodes=self.getChildren(walk=True)
         return r9Anim.animRangeFromNodes(nodes,setTimeline=setTimeline)
@@ -3489,9 +5522,10 @@ class MetaRig(MetaClass):
         
         :param nodes: nodes to check, if None process the entire rig
         '''
+        import Red9_CoreUtils as r9Core  # lazy loaded
         if not nodes:
             nodes=self.getChildren()
-        return r9Anim.r9Core.FilterNode.lsAnimCurves(nodes, safe=True) or False
+        return r9Core.FilterNode.lsAnimCurves(nodes, safe=True) or False
 
     def cutKeys(self, nodes=[], reset=True):
         '''
@@ -3500,10 +5534,11 @@ class MetaRig(MetaClass):
         :param nodes: if passed in only cutKeys on given nodes
         :param reset: if true reset the rig after key removal
         '''
+        import Red9_CoreUtils as r9Core  # lazy loaded
         if not nodes:
             nodes=self.getChildren()
         if self.hasKeys(nodes):
-            cmds.cutKey(r9Anim.r9Core.FilterNode.lsAnimCurves(nodes, safe=True))
+            cmds.cutKey(r9Core.FilterNode.lsAnimCurves(nodes, safe=True))
         if reset:
             self.loadZeroPose(nodes)
 
@@ -4327,6 +6362,7 @@ class MetaTimeCodeHUD(MetaHUDNode):
         '''
         add a node with the TimeCode attrs on it to monitor
         '''
+        import Red9_CoreUtils as r9Core  # lazy loaded
         if not type(nodes)==list:
             nodes=[nodes]
 
@@ -4367,6 +6403,7 @@ class MetaTimeCodeHUD(MetaHUDNode):
         
     @r9General.Timer
     def connectTimecodeSystems(self, metaRigs=True):
+        import Red9_CoreUtils as r9Core  # lazy loaded
         if metaRigs:
             rigs=getMetaNodes(mInstances=MetaRig)
             flt=r9Core.FilterNode([rig for rig in rigs if rig.isValid()])
@@ -4398,11 +6435,10 @@ def metaData_sceneCleanups(*args):
     resetCacheOnSceneNew()
     
 
-#Setup the callbacks to clear the cache when required
-if not RED9_META_CALLBACKS['Open']:
-    RED9_META_CALLBACKS['Open'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeOpen, metaData_sceneCleanups))
-if not RED9_META_CALLBACKS['New']:
-    RED9_META_CALLBACKS['New'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeNew, metaData_sceneCleanups))
+#Setup the callbacks to keep the caches coherent with the scene
+RED9_META_EVENTBUS.subscribe('sceneNew', metaData_sceneCleanups)
+RED9_META_EVENTBUS.subscribe('connectionChanged', metaConnectionCallback)
+RED9_META_EVENTBUS.bindEmitter(MayaCacheEmitter())
 
 # if r9Setup.mayaVersion()<=2015:
 #     #dulplicate cache callbacks so the UUIDs are managed correctly
@@ -4412,3 +6448,8 @@ if not RED9_META_CALLBACKS['New']:
 #         RED9_META_CALLBACKS['DuplicatePost'].append(OpenMaya.MModelMessage.addAfterDuplicateCallback(__poseDuplicateCache))
 
 
+
+#Pick up any class manifests the session has been pointed at
+for manifest in os.environ.get('RED9_META_MANIFEST', '').split(os.pathsep):
+    if manifest and os.path.exists(manifest):
+        registerMClassManifest(manifest)
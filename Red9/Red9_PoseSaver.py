@@ -389,7 +389,7 @@ class DataMap(object):
                     continue
                 for attr, val in self.poseDict[key]['attrs'].items():
                     try:
-                        val = eval(val)
+                        val = r9Core.decodeLiteral(val)
                     except:
                         pass
                     log.debug('node : %s : attr : %s : val %s' % (dest, attr, val))
@@ -472,7 +472,7 @@ class DataMap(object):
             print 'metaRig : ', self.metaRig
             if 'metaPose' in self.infoDict and self.metaRig:
                 try:
-                    if eval(self.infoDict['metaPose']):
+                    if r9Core.decodeLiteral(self.infoDict['metaPose']):
                         self.matchMethod = 'metaData'
                 except:
                     self.matchMethod = 'metaData'
@@ -538,7 +538,8 @@ class DataMap(object):
                 try:
                     metaDict=getMetaDict(node)
                     for key in poseKeys:
-                        if poseKeys[key]['metaData']==metaDict:
+                        # older poses stored [] for a node with no metaData
+                        if (poseKeys[key]['metaData'] or {})==metaDict:
                             matchedPairs.append((key,node))
                             log.debug('poseKey : %s %s >> matched MetaData : %s' % (key, node, poseKeys[key]['metaData']))
                             poseKeys.pop(key)
@@ -793,7 +794,7 @@ class PoseData(DataMap):
                         log.debug('Skipping attr as requested : %s' % attr)
                         continue
                     try:
-                        val = eval(val)
+                        val = r9Core.decodeLiteral(val)
                     except:
                         pass
                     log.debug('node : %s : attr : %s : val %s' % (dest, attr, val))
@@ -13,15 +13,46 @@ Core is the library of Python modules that make the backbone of the Red9 Pack
 :Note that the registerMClassInheritanceMapping() call is after all the imports
 so that the global RED9_META_REGISTERY is built up correctly
 
+:Note that if the RED9_MINIMAL environment variable is set only Red9_General and
+Red9_Meta are imported, the rest of the core is imported by start() or when you
+import the module directly. This is for batch and farm jobs that only need MetaData
+
 '''
 
+import os
+
 import Red9_General
 import Red9_Meta
-import Red9_Tools
-import Red9_CoreUtils
-import Red9_AnimationUtils
-import Red9_PoseSaver
-import Red9_Audio
+
+
+def _importCore():
+    '''
+    import the rest of the core modules, deferred in a minimal session
+    '''
+    global Red9_Tools, Red9_CoreUtils, Red9_AnimationUtils, Red9_PoseSaver, Red9_Audio
+    import Red9_Tools
+    import Red9_CoreUtils
+    import Red9_AnimationUtils
+    import Red9_PoseSaver
+    import Red9_Audio
+    Red9_Meta.registerMClassInheritanceMapping()
+
+if not os.environ.get('RED9_MINIMAL'):
+    _importCore()
+
+
+def start(minimal=False, **kws):
+    '''
+    Main entry point for the StudioPack
+    
+    :param minimal: only set up what's needed to run MetaData, no menus, UI hooks,
+        python packages, pro_pack or client boots and the rest of the core isn't
+        imported. Use this for batch render and farm jobs
+    :param kws: passed to Red9.startup.setup.start()
+    '''
+    if not minimal:
+        _importCore()
+    Red9_General.r9Setup.start(minimal=minimal, **kws)
 
 
 
@@ -29,6 +60,7 @@ def _reload():
     '''
     reload carefully and re-register the RED9_META_REGISTRY
     '''
+    _importCore()
     reload(Red9_General)
     reload(Red9_Meta)
     reload(Red9_Tools)
@@ -45,6 +77,7 @@ def _setlogginglevel_debug(module='all'):
     '''
     Dev wrapper to set the logging level to debug
     '''
+    _importCore()
     if module=='r9Core' or  module=='all':
         Red9_CoreUtils.log.setLevel(Red9_CoreUtils.logging.DEBUG)
         print('Red9_CoreUtils set to DEBUG state')
@@ -72,6 +105,7 @@ def _setlogginglevel_info(module='all'):
     '''
     Dev wrapper to set the logging to Info, usual state
     '''
+    _importCore()
     if module=='r9Core' or  module=='all':
         Red9_CoreUtils.log.setLevel(Red9_CoreUtils.logging.INFO)
         print('Red9_CoreUtils set to INFO state')
@@ -101,6 +101,71 @@ set_language()
 # -----------------------------------------------------------------------------------------
 
 MAYA_INTERNAL_DATA = {}  # cached Maya internal vars for speed
+SESSION_CALLBACKS = []   # callbacks used to refresh the MAYA_INTERNAL_DATA session values
+SESSION_KEYS = set()     # the MAYA_INTERNAL_DATA keys filled by sessionData
+
+FPS_MAPPING = {"game": 15.0, "film": 24.0, "pal": 25.0, "ntsc": 30.0, "show": 48.0, "palf": 50.0, "ntscf": 60.0}
+
+def sessionData(key, probe):
+    '''
+    return the session value cached in MAYA_INTERNAL_DATA under key, running
+    the probe to fill it on first use. Values that can change in the session are
+    cleared by the callbacks bound in registerSessionCallbacks, these are bound
+    here on first use and if they can't be the value isn't cached at all
+    '''
+    if not key in MAYA_INTERNAL_DATA:
+        if not registerSessionCallbacks():
+            return probe()
+        MAYA_INTERNAL_DATA[key] = probe()
+        SESSION_KEYS.add(key)
+    return MAYA_INTERNAL_DATA[key]
+
+def refreshSessionData(*args, **kws):
+    '''
+    clear the given keys from the session cache so they're re-probed on next use
+    
+    :param keys: list of keys to clear, if not given all the values cached by sessionData
+        are cleared, the rest of MAYA_INTERNAL_DATA is left alone
+    '''
+    keys = kws.get('keys')
+    if keys is None:
+        keys = list(SESSION_KEYS)
+    for key in keys:
+        MAYA_INTERNAL_DATA.pop(key, None)
+        SESSION_KEYS.discard(key)
+
+def registerSessionCallbacks():
+    '''
+    bind the callbacks that keep the session cache valid, the fps is re-probed
+    when the time unit changes and the pro_pack status when a plugin loads
+    
+    :return: True if the callbacks are bound
+    '''
+    if SESSION_CALLBACKS:
+        return True
+    try:
+        import maya.OpenMaya as OpenMaya
+        SESSION_CALLBACKS.append(OpenMaya.MEventMessage.addEventCallback('timeUnitChanged',
+                                        partial(refreshSessionData, keys=['fps'])))
+        for message in [OpenMaya.MSceneMessage.kAfterPluginLoad, OpenMaya.MSceneMessage.kAfterPluginUnload]:
+            SESSION_CALLBACKS.append(OpenMaya.MSceneMessage.addCallback(message,
+                                        partial(refreshSessionData, keys=['pro_pack'])))
+    except (ImportError, RuntimeError), error:
+        log.debug('Red9 : session callbacks could not be bound : %s' % error)
+        removeSessionCallbacks()
+        return False
+    return True
+
+def removeSessionCallbacks():
+    '''
+    remove the session callbacks, the values they kept valid are cleared with them
+    '''
+    if SESSION_CALLBACKS:
+        import maya.OpenMaya as OpenMaya
+        for callback in SESSION_CALLBACKS:
+            OpenMaya.MMessage.removeCallback(callback)
+        del SESSION_CALLBACKS[:]
+    refreshSessionData()
 
 def mayaFullSpecs():
     print 'Maya version : ', mayaVersion()
@@ -162,10 +227,10 @@ def mayaUpAxis(setAxis=None):
             return 'y'
     
 def mayaIsBatch():
-    return cmds.about(batch=True)
+    return sessionData('batch', lambda: cmds.about(batch=True))
 
 def osBuild():
-    build = cmds.about(os=True)
+    build = sessionData('os', lambda: cmds.about(os=True))
     if build == 'win64':
         return 64
     elif build == 'win32':
@@ -175,8 +240,7 @@ def getCurrentFPS():
     '''
     returns the current frames per second as a number, rather than a useless string
     '''
-    fpsDict = {"game": 15.0, "film": 24.0, "pal": 25.0, "ntsc": 30.0, "show": 48.0, "palf": 50.0, "ntscf": 60.0}
-    return  fpsDict[cmds.currentUnit(q=True, fullName=True, time=True)]
+    return sessionData('fps', lambda: FPS_MAPPING[cmds.currentUnit(q=True, fullName=True, time=True)])
 
   
 
@@ -849,8 +913,11 @@ def pro_pack_path():
 
 def has_pro_pack():
     '''
-    Red9 Pro_Pack is available and activated as user
+    Red9 Pro_Pack is available and activated as user, cached for the session
     '''
+    return sessionData('pro_pack', _probe_pro_pack)
+
+def _probe_pro_pack():
     if os.path.exists(pro_pack_path()):
         try:
             #new pro_pack call
@@ -986,12 +1053,13 @@ def __reload_clients__():
 # BOOT CALL ---
 # -----------------------------------------------------------------------------------------
     
-def start(Menu=True, MayaUIHooks=True, MayaOverloads=True, parentMenu='MayaWindow'):
+def start(Menu=True, MayaUIHooks=True, MayaOverloads=True, parentMenu='MayaWindow', minimal=False):
     '''
     Main entry point for the StudioPack
     @param Menu: Add the Red9 Menu to the Maya Main Menus
     @param MayUIHooks: Add the Red9 hooks to Maya Native UI's
     @param MayaOverloads: run the Maya native script hacks for Red9 - integrates into native Maya ui's
+    @param minimal: only setup the paths and session callbacks, for batch jobs that just need MetaData
     '''
     log.info('Red9 StudioPack v%s : author: %s' % (red9_getVersion(), red9_getAuthor()))
     log.info('Red9 StudioPack Setup Calls :: Booting from >> %s' % red9ModulePath())
@@ -1018,10 +1086,16 @@ def start(Menu=True, MayaUIHooks=True, MayaOverloads=True, parentMenu='MayaWindo
     #Need to add a Mel Folder to the scripts path
     addScriptsPath(os.path.join(red9ModulePath(),'core'))
     
+    registerSessionCallbacks()
+    
+    if minimal:
+        log.info('Red9 StudioPack Minimal Complete!')
+        return
+    
     #Add the Packages folder
     addPythonPackages()
     
-    if not cmds.about(batch=True):
+    if not mayaIsBatch():
         if Menu:
             try:
                 menuSetup(parent=parentMenu)
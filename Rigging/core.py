@@ -175,13 +175,15 @@ class MetaRig(Red9_Meta.MetaRig, MetaEnhanced):
             # Build the red 9 meta rig with our name
             super(MetaRig, self).__init__(name=full_name, **kwargs)
             self._build_mode = True
-            self.part = kwargs["part"]
-            # Setup the mirror side
-            self.mirrorSide = _fullSide_(kwargs["side"])
-            # Set the rig type
-            self.rigType = kwargs["endSuffix"]
-            # Set this as non system root by default
-            self.mSystemRoot = False
+            # Queue the attributes so that they are set in one pass
+            with self.batchEdit():
+                self.part = kwargs["part"]
+                # Setup the mirror side
+                self.mirrorSide = _fullSide_(kwargs["side"])
+                # Set the rig type
+                self.rigType = kwargs["endSuffix"]
+                # Set this as non system root by default
+                self.mSystemRoot = False
         else:
             super(MetaRig, self).__init__(*args, **kwargs)
             self._build_mode = False
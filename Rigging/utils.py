@@ -32,13 +32,13 @@ def exportCrlShapes():
                             "knots": top.numKnots()}
             curvesData[top.name()] = detailedInfo
 
-    libFile.write_json(CTRLS_INFO_INFO, curvesData)
+    libFile.write_json(CTRLS_INFO_INFO, curvesData, atomic=True)
     logger.info("Curve information written to: %s" % CTRLS_INFO_INFO)
 
 
 def buildCtrlShape(type=""):
     """Create a curve from the json file"""
-    curvesData = libFile.load_json(CTRLS_INFO_INFO)
+    curvesData = libFile.cached_load(CTRLS_INFO_INFO)
 
     if curvesData.has_key(type):
         detailedInfo = curvesData[type]
@@ -54,7 +54,7 @@ def buildCtrlShape(type=""):
 
 def buildAllCtrlsShapes():
     """Build all curves from the json file"""
-    curvesData = libFile.load_json(CTRLS_INFO_INFO)
+    curvesData = libFile.cached_load(CTRLS_INFO_INFO)
     for crv in curvesData.keys():
         buildCtrlShape(crv)
 
@@ -96,14 +96,14 @@ def saveTestJoint(parentJoint, systemType):
 
     joint_info[systemType] = currentJointData
 
-    libFile.write_json(TEST_JOINTS_INFO, joint_info)
+    libFile.write_json(TEST_JOINTS_INFO, joint_info, atomic=True)
 
 
 def createTestJoint(systemType):
     """
     @param systemType: The test joint associated with the class;
     """
-    current_joint_data = libFile.load_json(TEST_JOINTS_INFO)[systemType]
+    current_joint_data = libFile.cached_load(TEST_JOINTS_INFO)[systemType]
     testJoints = []
     for joint, index in zip(current_joint_data, range(len(current_joint_data))):
         pm.select(cl=1)
@@ -0,0 +1,107 @@
+"""
+@package UnitTests.libCryptoUnitTest
+@brief Testing for the Vigenere cipher
+@details Here we are testing that the translate based cipher and the stream methods give exactly the same encoded text
+as the original character by character cipher, so that text encoded by either one can be decoded by the other.
+"""
+import base64
+import random
+import struct
+import zlib
+from StringIO import StringIO
+
+from PKD_Tools import libCrypto
+from PKD_Tools import libUnitTests
+
+if __name__ == '__main__':
+    for module in [libUnitTests, libCrypto]:
+        reload(module)
+
+## Key used to encode the test payloads
+TEST_KEY = "PKD_Tools"
+
+## Encode and decode chunk sizes used to read the streams. These do not line up with the key length
+STREAM_CHUNK_SIZES = [(3, 4), (12, 12), (3000, 4000), (3 * 2 ** 14, 2 ** 16)]
+
+
+def reference_encode(text, key):
+    """
+    The original character by character encode
+    @param text: (string) The text that is being encoded
+    @param key: (string) The cipher key
+    @return: The encoded text
+    """
+    text = '{}{}'.format(text, struct.pack('i', zlib.crc32(text)))
+    enc = []
+    for i in range(len(text)):
+        key_c = key[i % len(key)]
+        enc_c = chr((ord(text[i]) + ord(key_c)) % 256)
+        enc.append(enc_c)
+
+    return base64.urlsafe_b64encode("".join(enc))
+
+
+def random_payload(size, seed=0):
+    """
+    Create a payload which uses every byte value
+    @param size: (int) Number of bytes
+    @param seed: (int) Random seed so that the payload is the same every run
+    @return (string) The payload
+    """
+    generator = random.Random(seed)
+    return "".join(chr(generator.randint(0, 255)) for _ in range(size))
+
+
+class UnitTestCase(libUnitTests.UnitTestCase):
+    """Base Class For All Unit Test."""
+
+    def __init__(self, testName, **kwargs):
+        super(UnitTestCase, self).__init__(testName, **kwargs)
+
+    def encode_matches_reference(self):
+        """Test that encode gives the same text as the original cipher and decode reverses it"""
+        for size in [0, 1, 5, 9, 100, 10007]:
+            payload = random_payload(size, size)
+            encoded = libCrypto.encode(payload, TEST_KEY)
+            self.assertEqual(encoded, reference_encode(payload, TEST_KEY), "Testing encode of %i bytes" % size)
+            self.assertEqual(libCrypto.decode(encoded, TEST_KEY), payload, "Testing decode of %i bytes" % size)
+
+    def stream_matches_reference(self):
+        """Test that the stream methods give the same text as the original cipher whatever the chunk size"""
+        for size in [0, 1, 10, 10007]:
+            payload = random_payload(size, size)
+            expected = reference_encode(payload, TEST_KEY)
+            for encodeChunk, decodeChunk in STREAM_CHUNK_SIZES:
+                target = StringIO()
+                libCrypto.encode_stream(StringIO(payload), target, TEST_KEY, encodeChunk)
+                self.assertEqual(target.getvalue(), expected,
+                                 "Testing encode_stream of %i bytes in chunks of %i" % (size, encodeChunk))
+                target = StringIO()
+                libCrypto.decode_stream(StringIO(expected), target, TEST_KEY, decodeChunk)
+                self.assertEqual(target.getvalue(), payload,
+                                 "Testing decode_stream of %i bytes in chunks of %i" % (size, decodeChunk))
+
+    def stream_detects_corruption(self):
+        """Test that a changed character fails the checksum of the stream decode"""
+        encoded = list(reference_encode(random_payload(1000), TEST_KEY))
+        encoded[500] = "A" if encoded[500] != "A" else "B"
+        with self.assertRaises(AssertionError):
+            libCrypto.decode_stream(StringIO("".join(encoded)), StringIO(), TEST_KEY, 400)
+
+
+class BatchTest(libUnitTests.BatchTest):
+    """Cipher batch test"""
+
+    def addTest(self, testName, **kwargs):
+        # Generalised function to add a test to a suite
+        self.suite.addTest(UnitTestCase(testName, **kwargs))
+
+    def test_cipher(self):
+        self.suite = libUnitTests.unittest.TestSuite()
+        for test in ["encode_matches_reference", "stream_matches_reference", "stream_detects_corruption"]:
+            self.addTest(test)
+        self.run_test("Testing cipher")
+
+
+unit = BatchTest()
+unit.test_cipher()
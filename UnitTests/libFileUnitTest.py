@@ -0,0 +1,249 @@
+"""
+@package UnitTests.libFileUnitTest
+@brief Testing for the file helpers
+@details Here we are testing that the data files written and read through libFile come back the same as the plain json
+module would give us, and that an atomic write leaves nothing behind but the target file.
+"""
+import fnmatch
+import json
+import os
+import tempfile
+import threading
+
+from PKD_Tools import libFile
+from PKD_Tools import libUnitTests
+
+if __name__ == '__main__':
+    for module in [libUnitTests, libFile]:
+        reload(module)
+
+## Depth and width of the generated folder tree
+TREE_DEPTH = 3
+TREE_WIDTH = 3
+
+## Dictionary which is written out to the test data files
+TEST_DATA = {"SkinInfo": dict(("geo%i" % i, {"joints": ["joint%i" % j for j in range(i % 5)], "weight": i * 0.25})
+                              for i in range(2000)),
+             "Version": 2}
+
+
+def reference_iter_folder(folder, pattern, recursive=True, files=True, folders=False):
+    """
+    The folder scan done the old way with os.walk and fnmatch
+    @param folder (string) The target folder
+    @param pattern (string) Glob pattern which the file/folder name needs to match
+    @param recursive (bool) Also scan all the subfolders
+    @param files (bool) Return the files
+    @param folders (bool) Return the folders
+    @return sorted list of maya compliant paths
+    """
+    result = []
+    for root, dirNames, fileNames in os.walk(folder):
+        names = (fileNames if files else []) + (dirNames if folders else [])
+        result.extend(libFile.join(root, name) for name in names if fnmatch.fnmatch(name, pattern))
+        if not recursive:
+            break
+    return sorted(result)
+
+
+def build_tree(folder, depth=TREE_DEPTH):
+    """
+    Fill a folder with a tree of json and text files
+    @param folder (string) The target folder
+    @param depth (int) The number of folder levels below the target folder
+    """
+    for i in range(TREE_WIDTH):
+        for extension in ["json", "txt"]:
+            with open(os.path.join(folder, "file%i.%s" % (i, extension)), "w") as f:
+                f.write("{}")
+        if depth:
+            subFolder = os.path.join(folder, "sub%i" % i)
+            os.mkdir(subFolder)
+            build_tree(subFolder, depth - 1)
+
+
+class UnitTestCase(libUnitTests.UnitTestCase):
+    """Base Class For All Unit Test."""
+
+    def __init__(self, testName, **kwargs):
+        super(UnitTestCase, self).__init__(testName, **kwargs)
+
+    def json_items_match_load(self):
+        """Test that the streamed items of a nested dict match the fully loaded file. The data spans several chunks"""
+        for fileName in ["data.json", "data.json.gz"]:
+            path = os.path.join(self.folder, fileName)
+            libFile.write_json(path, TEST_DATA, compact=True)
+            data = libFile.load_json(path)
+            self.assertEqual(sorted(libFile.iter_json_items(path, "SkinInfo")), sorted(data["SkinInfo"].items()),
+                             "Testing the streamed items of %s" % fileName)
+            self.assertEqual(sorted(libFile.iter_json_items(path)), sorted(data.items()),
+                             "Testing the top level items of %s" % fileName)
+        self.assertGreater(os.path.getsize(os.path.join(self.folder, "data.json")), libFile.JSON_CHUNK_SIZE,
+                           "Testing the data is larger than one chunk")
+
+    def atomic_write_replaces_file(self):
+        """Test that the atomic write replaces the content, keeps the file mode and leaves no temp file behind"""
+        for fileName in ["atomic.json", "atomic"]:
+            path = os.path.join(self.folder, fileName)
+            libFile.write_json(path, {"old": True})
+            os.chmod(path, 0o644)
+            libFile.write_json(path, TEST_DATA, atomic=True)
+            with open(path) as f:
+                self.assertEqual(json.load(f), json.loads(json.dumps(TEST_DATA)),
+                                 "Testing the atomic write of %s" % fileName)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o644, "Testing the mode of %s is kept" % fileName)
+        self.assertEqual(sorted(os.listdir(self.folder)), ["atomic", "atomic.json"],
+                         "Testing no temp files are left behind")
+
+    def atomic_write_new_file(self):
+        """Test that a new file written atomically gets the default permissions instead of the private temp file mode"""
+        path = os.path.join(self.folder, "new.json")
+        libFile.write_json(path, TEST_DATA, atomic=True)
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o666 & ~umask, "Testing the new file has the umask mode")
+
+    def cached_load_follows_file(self):
+        """Test that the cached data is only parsed again once the file has changed"""
+        path = os.path.join(self.folder, "cached.json")
+        libFile.write_json(path, TEST_DATA)
+        libFile.invalidate_cache()
+        parsed = []
+
+        def _loader(filePath):
+            parsed.append(filePath)
+            return libFile.load_json(filePath)
+
+        for _ in range(5):
+            self.assertEqual(libFile.cached_load(path, _loader)["Version"], 2, "Testing the cached data")
+        self.assertEqual(len(parsed), 1, "Testing the file was parsed once")
+        # A write through libFile drops the entry straight away
+        libFile.write_json(path, {"Version": 3})
+        self.assertEqual(libFile.cached_load(path, _loader), {"Version": 3}, "Testing the data after write_json")
+        # A write from outside changes the size of the file
+        with open(path, "w") as f:
+            json.dump({"Version": 40}, f)
+        self.assertEqual(libFile.cached_load(path, _loader), {"Version": 40}, "Testing the data after a write")
+        self.assertEqual(len(parsed), 3, "Testing the file was parsed again after each change")
+        info = libFile.cache_info()
+        self.assertEqual((info["entries"], info["usage"]), (1, os.path.getsize(path)), "Testing the cache usage")
+
+    def cached_load_returns_copy(self):
+        """Test that modifying the returned data does not change what the next caller gets"""
+        path = os.path.join(self.folder, "copy.json")
+        libFile.write_json(path, TEST_DATA)
+        data = libFile.cached_load(path)
+        data["SkinInfo"]["geo1"]["joints"].append("extra")
+        data["Version"] = 99
+        fresh = libFile.cached_load(path)
+        self.assertEqual(fresh, libFile.load_json(path), "Testing the cached data was not modified by the caller")
+
+    def cached_load_double_miss(self):
+        """Test that two threads which miss the same file at the same time only count its size once"""
+        path = os.path.join(self.folder, "miss.json")
+        libFile.write_json(path, TEST_DATA)
+        libFile.invalidate_cache()
+        arrived = []
+        bothArrived = threading.Event()
+
+        def _loader(filePath):
+            # Hold both threads in the loader so that they both miss
+            arrived.append(filePath)
+            if len(arrived) == 2:
+                bothArrived.set()
+            bothArrived.wait(5)
+            return libFile.load_json(filePath)
+
+        threads = [threading.Thread(target=libFile.cached_load, args=(path, _loader)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(arrived), 2, "Testing both threads missed")
+        info = libFile.cache_info()
+        self.assertEqual((info["entries"], info["usage"]), (1, os.path.getsize(path)),
+                         "Testing the file is only counted once: %s" % info)
+
+    def iter_folder_matches_walk(self):
+        """Test that the folder scan finds the same paths as os.walk, with and without threads"""
+        folder = tempfile.mkdtemp(dir=self.folder)
+        build_tree(folder)
+        for recursive in [False, True]:
+            for threads in [0, 4]:
+                for pattern, files, folders in [("*.json", True, False), ("sub*", False, True), ("*", True, True)]:
+                    result = sorted(libFile.iter_folder(folder, pattern, recursive, files, folders, threads))
+                    self.assertEqual(result, reference_iter_folder(folder, pattern, recursive, files, folders),
+                                     "Testing iter_folder %s recursive=%s threads=%i" % (pattern, recursive, threads))
+
+    def iter_folder_symlink_cycle(self):
+        """Test that a symlink back up the tree is listed but not followed"""
+        if not hasattr(os, "symlink"):
+            return
+        folder = tempfile.mkdtemp(dir=self.folder)
+        build_tree(folder, 1)
+        os.symlink(folder, os.path.join(folder, "sub0", "loop"))
+        for threads in [0, 4]:
+            result = list(libFile.iter_folder(folder, "*", True, True, True, threads))
+            self.assertEqual(len(result), len(set(result)), "Testing no path is returned twice")
+            self.assertIn(libFile.join(os.path.join(folder, "sub0"), "loop"), result,
+                          "Testing the symlinked folder is listed")
+
+    def iter_folder_stops_early(self):
+        """Test that the threaded scan streams the paths and can be abandoned part way"""
+        folder = tempfile.mkdtemp(dir=self.folder)
+        build_tree(folder)
+        threads = set(threading.enumerate())
+        scan = libFile.iter_folder(folder, "*.json", True, threads=4)
+        first = next(scan)
+        workers = set(threading.enumerate()) - threads
+        self.assertEqual(len(workers), 4, "Testing the workers are running")
+        scan.close()
+        self.assertTrue(first.endswith(".json"), "Testing the first path came through before the scan completed")
+        # Give the workers a moment to pick up the stop signal
+        for worker in workers:
+            worker.join(5)
+        self.assertFalse([worker for worker in workers if worker.is_alive()], "Testing the workers are stopped")
+
+
+class Droid(libUnitTests.Droid):
+    """Setup an empty folder for the data files"""
+
+    def setup_folder(self):
+        return tempfile.mkdtemp(prefix="libFileUnitTest")
+
+
+class BatchTest(libUnitTests.BatchTest):
+    """File helpers batch test"""
+
+    def __init__(self):
+        super(BatchTest, self).__init__()
+        self.droid = Droid()
+
+    def addTest(self, testName, **kwargs):
+        # Generalised function to add a test to a suite
+        self.suite.addTest(UnitTestCase(testName, **kwargs))
+
+    def test_json_files(self):
+        self.suite = libUnitTests.unittest.TestSuite()
+        self.addTest("json_items_match_load", folder=self.droid.setup_folder())
+        self.addTest("atomic_write_replaces_file", folder=self.droid.setup_folder())
+        self.addTest("atomic_write_new_file", folder=self.droid.setup_folder())
+        self.run_test("Testing json files")
+
+    def test_cached_load(self):
+        self.suite = libUnitTests.unittest.TestSuite()
+        for test in ["cached_load_follows_file", "cached_load_returns_copy", "cached_load_double_miss"]:
+            self.addTest(test, folder=self.droid.setup_folder())
+        self.run_test("Testing cached load")
+
+    def test_iter_folder(self):
+        self.suite = libUnitTests.unittest.TestSuite()
+        for test in ["iter_folder_matches_walk", "iter_folder_symlink_cycle", "iter_folder_stops_early"]:
+            self.addTest(test, folder=self.droid.setup_folder())
+        self.run_test("Testing iter folder")
+
+
+unit = BatchTest()
+unit.test_json_files()
+unit.test_cached_load()
+unit.test_iter_folder()
@@ -0,0 +1,138 @@
+"""
+@package UnitTests.libXmlUnitTest
+@brief Testing for the xml helpers
+@details Here we are testing that the streamed xml records come back the same as the records of the fully converted
+file, and that the deformerWeights reader gives the same numbers as the xml.
+"""
+import itertools
+import os
+import tempfile
+
+from PKD_Tools import libUnitTests
+from PKD_Tools import libXml
+
+if __name__ == '__main__':
+    for module in [libUnitTests, libXml]:
+        reload(module)
+
+## Leaf text and the value ConvertXmlToDict is expected to give for it
+NUMBER_CASES = [("12", 12.0), ("-3", -3.0), ("0.25", 0.25), ("-1.5", -1.5), ("2e-05", 2e-05), ("1e5", "1e5"),
+                ("1.2.3", "1.2.3"), ("abc", "abc"), ("", "")]
+
+## Characters used to build every short leaf text for the number detection
+NUMBER_ALPHABET = "01-.eE+ a"
+
+## Number of records written to the test files
+RECORD_COUNT = 500
+
+## deformerWeights style file with a shape block and two weights blocks
+DEFORMER_WEIGHTS_XML = """<?xml version="1.0"?>
+<deformerWeight>
+  <headerInfo fileName="test.xml" worldMatrix="1 0 0 0 0 1 0 0 0 0 1 0 0 0 0 1"/>
+  <shape name="bodyShape" group="1" stride="3" size="%(count)i" max="%(count)i">
+%(points)s
+  </shape>
+  <weights deformer="skinCluster1" source="joint1" shape="bodyShape" layer="0" defaultValue="0.000" size="%(count)i" max="%(count)i">
+%(weights)s
+  </weights>
+  <weights deformer="skinCluster1" source="joint2" shape="bodyShape" layer="1" defaultValue="0.000" size="0" max="0">
+  </weights>
+</deformerWeight>
+"""
+
+
+def write_records(path):
+    """
+    Write an xml file where the records are nested a few levels below the root
+    @param path (string) Target path of the xml file
+    @return list of the records as converted by ConvertXmlToDict
+    """
+    records = [{"index": str(i), "name": "joint%i" % i, "value": str(i * 0.5), "child": {"index": str(i)}}
+               for i in range(RECORD_COUNT)]
+    libXml.write_xml(path, {"Root": {"Header": {"version": "2"}, "Group": {"Items": {"record": records}}}})
+    return libXml.ConvertXmlToDict(path, dict)["Root"]["Group"]["Items"]["record"]
+
+
+class UnitTestCase(libUnitTests.UnitTestCase):
+    """Base Class For All Unit Test."""
+
+    def __init__(self, testName, **kwargs):
+        super(UnitTestCase, self).__init__(testName, **kwargs)
+
+    def number_conversion(self):
+        """Test that only the leaf texts which were numbers before are converted to floats"""
+        path = os.path.join(self.folder, "numbers.xml")
+        libXml.write_xml(path, {"Root": dict(("leaf%i" % i, text) for i, (text, _) in enumerate(NUMBER_CASES))})
+        result = libXml.ConvertXmlToDict(path)["Root"]
+        for i, (text, expected) in enumerate(NUMBER_CASES):
+            self.assertEqual(result["leaf%i" % i], expected, "Testing the conversion of '%s'" % text)
+            self.assertEqual(type(result["leaf%i" % i]), type(expected), "Testing the type of '%s'" % text)
+
+    def number_detection_matches_chain(self):
+        """Test that the fast number detection gives the same answer as the original replace chain"""
+        for length in range(1, 6):
+            for chars in itertools.product(NUMBER_ALPHABET, repeat=length):
+                text = "".join(chars)
+                expected = text.replace('e-', '', 1).replace("-", "", 1).replace('.', '', 1).isdigit()
+                self.assertEqual(libXml._is_number(text), expected, "Testing the detection of '%s'" % text)
+
+    def records_match_convert(self):
+        """Test that the streamed records match the records of the fully converted file"""
+        path = os.path.join(self.folder, "records.xml")
+        expected = write_records(path)
+        self.assertEqual(list(libXml.iter_xml_records(path, "record")), expected, "Testing the nested records")
+        self.assertEqual(list(libXml.iter_xml_records(path, "Header")), [{"version": 2.0}],
+                         "Testing a record outside the nested group")
+        self.assertEqual(list(libXml.iter_xml_records(path, "missing")), [], "Testing a tag that is not in the file")
+
+    def deformer_weights_match_xml(self):
+        """Test that the deformerWeights arrays hold the same numbers as the xml attributes"""
+        if libXml.numpy is None:
+            return
+        path = os.path.join(self.folder, "skinCluster1.xml")
+        count = RECORD_COUNT
+        with open(path, "w") as f:
+            f.write(DEFORMER_WEIGHTS_XML % {
+                "count": count,
+                "points": "\n".join('<point index="%i" value="%i %.3f -%i"/>' % (i, i, i * 0.5, i) for i in range(count)),
+                "weights": "\n".join('<point index="%i" value="%.3f"/>' % (i, i / float(count)) for i in range(count))})
+        info = libXml.read_deformer_weights(path)
+        self.assertEqual(info["headerInfo"]["fileName"], "test.xml", "Testing the header")
+        shape = info["shape"][0]
+        self.assertEqual(shape["value"].shape, (count, 3), "Testing the shape has a row per point")
+        self.assertEqual(shape["value"][10].tolist(), [10.0, 5.0, -10.0], "Testing a shape point")
+        weights = info["weights"]
+        self.assertEqual([block["source"] for block in weights], ["joint1", "joint2"], "Testing the weight blocks")
+        self.assertEqual(weights[0]["index"].tolist(), range(count), "Testing the weight indices")
+        self.assertAlmostEqual(weights[0]["value"][250], 0.5, 6, "Testing a weight value")
+        self.assertEqual(len(weights[1]["value"]), 0, "Testing an empty weight block")
+
+
+class Droid(libUnitTests.Droid):
+    """Setup an empty folder for the xml files"""
+
+    def setup_folder(self):
+        return tempfile.mkdtemp(prefix="libXmlUnitTest")
+
+
+class BatchTest(libUnitTests.BatchTest):
+    """Xml helpers batch test"""
+
+    def __init__(self):
+        super(BatchTest, self).__init__()
+        self.droid = Droid()
+
+    def addTest(self, testName, **kwargs):
+        # Generalised function to add a test to a suite
+        self.suite.addTest(UnitTestCase(testName, **kwargs))
+
+    def test_xml_files(self):
+        self.suite = libUnitTests.unittest.TestSuite()
+        for test in ["number_conversion", "number_detection_matches_chain", "records_match_convert",
+                     "deformer_weights_match_xml"]:
+            self.addTest(test, folder=self.droid.setup_folder())
+        self.run_test("Testing xml files")
+
+
+unit = BatchTest()
+unit.test_xml_files()
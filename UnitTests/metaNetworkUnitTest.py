@@ -3,6 +3,9 @@
 @brief Testing for meta node functionalitis
 @details Here we are testing that all the a meta network is created and saved. Once you have reopened the file you should be recall most of the data.
 """
+import os
+import tempfile
+
 import pymel.core as pm
 
 from PKD_Tools import libUnitTests
@@ -16,6 +19,194 @@ if __name__ == '__main__':
         reload(module)
 
 
+class FakeAttrCmds(object):
+    """Stands in for maya.cmds inside Red9_Meta and serves the attrs of a node from a dict rather than the scene. Every
+    call is counted so that a test can check exactly what reached the backend"""
+
+    def __init__(self, attrs):
+        """
+        @param attrs: (dict) attr name to (attrType, value) for each attr that exists on the node
+        """
+        self.attrs = attrs
+        self.calls = {}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def objExists(self, node):
+        self._count("objExists")
+        return True
+
+    def getAttr(self, plug, type=False, silent=False):
+        self._count("getAttr")
+        attr = plug.split(".", 1)[1]
+        if attr not in self.attrs:
+            raise ValueError("No object matches name: %s" % plug)
+        attrType, value = self.attrs[attr]
+        return attrType if type else value
+
+
+class SnapshotMissError(StandardError):
+    """Raised by SnapshotCmds for a cmds call it can't answer from the snapshot"""
+
+    def __init__(self, command):
+        """
+        @param command: (string) The cmds call that was made
+        """
+        super(SnapshotMissError, self).__init__("SnapshotCmds does not answer cmds.%s" % command)
+        self.command = command
+
+
+class SnapshotCmds(object):
+    """Read only stand in for maya.cmds answered from a MetaNetworkSnapshot. Swap it in as the cmds of Red9_Meta and the
+    meta lookups run against the saved network rather than the scene. Only the queries the meta lookups make are
+    answered, any other call raises SnapshotMissError so a test sees exactly what would have gone to the scene. Every
+    call is counted.
+
+    Nodes are always returned by the long names held in the snapshot, nodeTypes match exactly (no inheritance) and only
+    the message links from the mNodes are known"""
+
+    def __init__(self, snapshot):
+        """
+        @param snapshot: (MetaNetworkSnapshot) The network which answers the calls
+        """
+        self.snapshot = snapshot
+        self.calls = {}
+
+    def __getattr__(self, name):
+        raise SnapshotMissError(name)
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _node(self, name):
+        """Resolve the given name to the long name in the snapshot, None if it is not there"""
+        if name in self.snapshot.nodes:
+            return name
+        if not name.startswith("|"):
+            for node in self.snapshot.nodes:
+                if node.split("|")[-1] == name:
+                    return node
+
+    @staticmethod
+    def _as_list(nodes):
+        if nodes is None:
+            return []
+        if isinstance(nodes, basestring):
+            return [nodes]
+        return list(nodes)
+
+    def _attr(self, node, attr):
+        """Return (attrType, value) of the given attr or None if the snapshot does not hold it"""
+        data = self.snapshot.nodes[node]
+        if attr in ("mClass", "mClassGrp") and data.get(attr) is not None:
+            return "string", data[attr]
+        attrs = data.get("attrs", {})
+        if attr in attrs:
+            value = attrs[attr]
+            if isinstance(value, bool):
+                return "bool", value
+            if isinstance(value, (int, long)):
+                return "long", value
+            if isinstance(value, float):
+                return "double", value
+            return "string", value
+        for parent, parentAttr, child, childAttr in self.snapshot.links:
+            if (parent == node and parentAttr == attr) or (child == node and childAttr == attr):
+                return "message", None
+
+    def objExists(self, name):
+        self._count("objExists")
+        node, _, attr = name.partition(".")
+        node = self._node(node)
+        if not node:
+            return False
+        return not attr or self._attr(node, attr) is not None
+
+    def ls(self, *args, **kwargs):
+        self._count("ls")
+        nTypes = self._as_list(kwargs.get("type", kwargs.get("typ")))
+        nodes = self._as_list(args[0]) if args else sorted(self.snapshot.nodes)
+        found = []
+        for node in nodes:
+            node = self._node(node)
+            if node and node not in found:
+                if not nTypes or self.snapshot.nodes[node].get("nodeType") in nTypes:
+                    found.append(node)
+        return found
+
+    def nodeType(self, name):
+        self._count("nodeType")
+        node = self._node(name)
+        if not node:
+            raise RuntimeError("No object matches name: %s" % name)
+        return self.snapshot.nodes[node].get("nodeType")
+
+    def attributeQuery(self, attr, node=None, exists=False, **kwargs):
+        self._count("attributeQuery")
+        if not exists or kwargs:
+            raise SnapshotMissError("attributeQuery(%s)" % ", ".join(sorted(kwargs) or ["exists=False"]))
+        resolved = self._node(node)
+        if not resolved:
+            raise RuntimeError("No object matches name: %s" % node)
+        return self._attr(resolved, attr) is not None
+
+    def getAttr(self, plug, type=False, **kwargs):
+        self._count("getAttr")
+        node, _, attr = plug.partition(".")
+        node = self._node(node)
+        data = self._attr(node, attr) if node else None
+        if data is None:
+            raise ValueError("No object matches name: %s" % plug)
+        return data[0] if type else data[1]
+
+    def listConnections(self, nodes=None, source=True, destination=True, connections=False, plugs=False, type=None,
+                        **kwargs):
+        """As cmds.listConnections, takes both the long and short flags s, d, c, p"""
+        self._count("listConnections")
+        source = kwargs.get("s", source)
+        destination = kwargs.get("d", destination)
+        connections = kwargs.get("c", connections)
+        plugs = kwargs.get("p", plugs)
+        nTypes = self._as_list(type)
+        result = []
+        for name in self._as_list(nodes):
+            name, _, attr = name.partition(".")
+            node = self._node(name)
+            if not node:
+                continue
+            for parent, parentAttr, child, childAttr in self.snapshot.links:
+                if destination and parent == node and (not attr or attr == parentAttr):
+                    this, other, otherAttr = parentAttr, child, childAttr
+                elif source and child == node and (not attr or attr == childAttr):
+                    this, other, otherAttr = childAttr, parent, parentAttr
+                else:
+                    continue
+                if nTypes and self.snapshot.nodes.get(other, {}).get("nodeType") not in nTypes:
+                    continue
+                if connections:
+                    result.append("%s.%s" % (node, this))
+                result.append("%s.%s" % (other, otherAttr) if plugs else other)
+        return result or None
+
+
+def reference_child_meta_nodes(node):
+    """
+    The child walk done the old way, one getConnectedMetaNodes call per node
+    @param node: (string) The mNode to walk down from
+    @return sorted list of the child meta nodes, the start node is not included
+    """
+    found = []
+    children = Red9_Meta.getConnectedMetaNodes(node, source=False, destination=True, dataType="unicode")
+    while children:
+        child = children.pop(0)
+        if child in found or child == node:
+            continue
+        found.append(child)
+        children.extend(Red9_Meta.getConnectedMetaNodes(child, source=False, destination=True, dataType="unicode"))
+    return sorted(found)
+
+
 class UnitTestCase(libUnitTests.UnitTestCase):
     """Base Class For All Unit Test."""
 
@@ -26,6 +217,375 @@ class UnitTestCase(libUnitTests.UnitTestCase):
         """Test Inheritence of meta classes"""
         self.assertTrue(isinstance(self.targetNode, Red9_Meta.MetaClass), "Checking Inheritance from Red9 meta")
 
+    def attribute_reads_are_cached(self):
+        """Test that once an attribute has been read the schema cache reduces repeat reads to a single getAttr"""
+        mClass = type(self.targetNode).__name__
+        Red9_Meta.RED9_META_ATTRSCHEMA.invalidate(mClass)
+        fake = FakeAttrCmds({self.variable_name: ("string", "C")})
+        cmds = Red9_Meta.cmds
+        Red9_Meta.cmds = fake
+        try:
+            for _ in range(10):
+                self.assertEqual(getattr(self.targetNode, self.variable_name), "C", "Testing the value from the fake")
+        finally:
+            Red9_Meta.cmds = cmds
+        self.assertEqual(fake.calls, {"getAttr": 11},
+                         "Testing that %s is typed once and then read with one call: %s" % (self.variable_name, fake.calls))
+        self.assertEqual(Red9_Meta.RED9_META_ATTRSCHEMA.getSchema(mClass)[self.variable_name], ["string", False],
+                         "Testing the plain string was flagged as not json by the first read")
+
+    def schema_follows_added_attr(self):
+        """Test that an attr which was cached as missing is found once it has been added to the node"""
+        attr = "schemaTestAttr"
+        with self.assertRaises(StandardError):
+            getattr(self.targetNode, attr)
+        pm.addAttr(self.targetNode.mNode, longName=attr, attributeType="long")
+        pm.setAttr("%s.%s" % (self.targetNode.mNode, attr), 5)
+        self.assertEqual(getattr(self.targetNode, attr), 5, "Testing the added attr is read from the node")
+        pm.deleteAttr("%s.%s" % (self.targetNode.mNode, attr))
+        with self.assertRaises(StandardError):
+            getattr(self.targetNode, attr)
+
+    def schema_shared_by_class(self):
+        """Test that the schema is shared by the nodes of a class and that the json flag is worked out once"""
+        first = Red9_Meta.MetaClass(name="schemaFirst")
+        second = Red9_Meta.MetaClass(name="schemaSecond")
+        Red9_Meta.RED9_META_ATTRSCHEMA.invalidate("MetaClass")
+        for mNode in [first, second]:
+            mNode.addAttr("sharedPrefix", "L_")
+            mNode.addAttr("sharedData", {"a": 1})
+        self.assertEqual(first.sharedPrefix, "L_", "Testing the plain string on the first node")
+        self.assertEqual(first.sharedData, {"a": 1}, "Testing the json string on the first node")
+        fake = FakeAttrCmds({"sharedPrefix": ("string", "R_"), "sharedData": ("string", '{"b": 2}')})
+        cmds = Red9_Meta.cmds
+        Red9_Meta.cmds = fake
+        try:
+            self.assertEqual(second.sharedPrefix, "R_", "Testing the plain string on the second node")
+            self.assertEqual(second.sharedData, {"b": 2}, "Testing the json string on the second node")
+        finally:
+            Red9_Meta.cmds = cmds
+        self.assertEqual(fake.calls, {"getAttr": 2}, "Testing the second node used the class schema: %s" % fake.calls)
+        schema = Red9_Meta.RED9_META_ATTRSCHEMA.getSchema("MetaClass")
+        self.assertEqual((schema["sharedPrefix"], schema["sharedData"]), (["string", False], ["string", True]),
+                         "Testing the json flags")
+        pm.delete(first.mNode, second.mNode)
+
+    def cache_follows_events(self):
+        """Test that the node cache is updated by the cache events without a scene change"""
+        emitter = Red9_Meta.RED9_META_EVENTBUS.bindEmitter(Red9_Meta.FakeCacheEmitter())
+        try:
+            mobj = self.targetNode._MObject
+            self.assertIsNotNone(Red9_Meta.RED9_META_NODECACHE.keyFromMObject(mobj),
+                                 "Testing %s is cached" % self.targetNode.mNode)
+            emitter.nodeRemoved(mobj)
+            self.assertIsNone(Red9_Meta.RED9_META_NODECACHE.keyFromMObject(mobj),
+                              "Testing the nodeRemoved event evicts %s" % self.targetNode.mNode)
+            Red9_Meta.registerMClassNodeCache(self.targetNode)
+            emitter.sceneNew()
+            self.assertFalse(Red9_Meta.RED9_META_NODECACHE, "Testing the sceneNew event clears the cache")
+        finally:
+            Red9_Meta.RED9_META_EVENTBUS.bindEmitter(Red9_Meta.MayaCacheEmitter())
+            Red9_Meta.registerMClassNodeCache(self.targetNode)
+
+    def node_cache_follows_deletion(self):
+        """Test that repeat lookups come from the node cache and that only deleted meta nodes reach the nodeRemoved event"""
+        mNode = Red9_Meta.MetaClass(name="cacheTestNode")
+        Red9_Meta.RED9_META_NODECACHE.resetStats()
+        for _ in range(5):
+            self.assertIs(Red9_Meta.MetaClass(mNode.mNode), mNode, "Testing the instance comes from the cache")
+        stats = Red9_Meta.getMetaCacheStats()
+        self.assertEqual((stats["hits"], stats["misses"]), (5, 0), "Testing the lookups were cache hits: %s" % stats)
+        bus = Red9_Meta.RED9_META_EVENTBUS
+        emitted = bus.emitted["nodeRemoved"]
+        pm.delete(pm.createNode("multiplyDivide"))
+        self.assertEqual(bus.emitted["nodeRemoved"], emitted, "Testing a utility node deletion is filtered out")
+        mobj = mNode._MObject
+        pm.delete(mNode.mNode)
+        self.assertEqual(bus.emitted["nodeRemoved"], emitted + 1, "Testing the network node deletion is emitted")
+        self.assertIsNone(Red9_Meta.RED9_META_NODECACHE.keyFromMObject(mobj), "Testing the deleted node is evicted")
+
+    def bulk_matches_get_meta_nodes(self):
+        """Test that the batched getMetaNodesBulk finds the same nodes and classes as getMetaNodes"""
+        queries = [{}, {"mTypes": ["MetaRig"]}, {"mInstances": ["MetaRig"]}, {"mTypes": [core.Ctrl]},
+                   {"mClassGrps": ["MetaRig"]}, {"nTypes": ["network"]}, {"mAttrs": "mirrorSide=1"}]
+        for kwargs in queries:
+            for dataType in ["node", "mClass"]:
+                expected = Red9_Meta.getMetaNodes(dataType=dataType, **kwargs)
+                result = Red9_Meta.getMetaNodesBulk(dataType=dataType, **kwargs)
+                if dataType == "mClass":
+                    expected = [(node.mNode, type(node)) for node in expected]
+                    result = [(node.mNode, type(node)) for node in result]
+                self.assertEqual(sorted(result), sorted(expected), "Testing getMetaNodesBulk(%s, dataType=%s)" %
+                                 (kwargs, dataType))
+
+    def connection_index_matches_scene(self):
+        """Test that the connection index gives the same meta nodes as listConnections, follows a connection made
+        after it was built and keeps the multi index of the meta attr"""
+        cmds = Red9_Meta.cmds
+        hub = Red9_Meta.MetaClass(name="indexHub")
+        hubNode = hub.mNode
+        ctrl = self.targetNode.mNode
+        reference = {"dataType": "unicode", "nTypes": Red9_Meta.getMClassNodeTypes()}
+        Red9_Meta.RED9_META_CONNECTIONINDEX.clear()
+        self.assertEqual(sorted(Red9_Meta.getConnectedMetaNodes(ctrl, dataType="unicode")),
+                         sorted(Red9_Meta.getConnectedMetaNodes(ctrl, **reference)), "Testing the built index")
+        cmds.addAttr(hubNode, ln="indexLinks", at="message", m=True)
+        cmds.addAttr(ctrl, ln="indexParent", at="message")
+        try:
+            cmds.connectAttr("%s.indexLinks[3]" % hubNode, "%s.indexParent" % ctrl)
+            self.assertEqual(sorted(Red9_Meta.getConnectedMetaNodes(ctrl, dataType="unicode")),
+                             sorted(Red9_Meta.getConnectedMetaNodes(ctrl, **reference)), "Testing the updated index")
+            attrs = [nodeAttr for _, _, _, mNodeAttr, nodeAttr in
+                     Red9_Meta.RED9_META_CONNECTIONINDEX.getConnections(ctrl) if mNodeAttr == "indexLinks[3]"]
+            self.assertEqual(attrs, ["indexParent"], "Testing the multi index is kept")
+            metaData = Red9_Meta.MetaClass.getNodeConnectionMetaDataMap(ctrl, mTypes=["MetaClass"])
+            self.assertEqual(metaData["metaAttr"], "indexLinks[3]", "Testing the pose metaAttr keeps the multi index")
+            cmds.disconnectAttr("%s.indexLinks[3]" % hubNode, "%s.indexParent" % ctrl)
+            self.assertNotIn(hubNode, Red9_Meta.getConnectedMetaNodes(ctrl, dataType="unicode"),
+                             "Testing the index follows the disconnect")
+        finally:
+            cmds.deleteAttr("%s.indexParent" % ctrl)
+            hub.delete()
+
+    def connection_index_follows_deletion(self):
+        """Test that the index doesn't give the links of a deleted node to a new node, and that the pose metaData of an
+        unconnected node is the same type as a connected one"""
+        mNode = Red9_Meta.MetaClass(name="indexTestNode")
+        node = pm.createNode("transform", name="indexTestTarget")
+        mNode.connectChild(str(node), "Target")
+        name = node.longName()
+        self.assertIn(mNode.mNode, Red9_Meta.getConnectedMetaNodes(name, dataType="unicode"), "Testing the link")
+        pm.delete(node)
+        node = pm.createNode("transform", name="indexTestTarget")
+        self.assertEqual(node.longName(), name, "Testing the new node has the same name")
+        self.assertEqual(Red9_Meta.getConnectedMetaNodes(name, dataType="unicode"), [],
+                         "Testing the new node has no links")
+        self.assertEqual(Red9_Meta.MetaClass.getNodeConnectionMetaDataMap(name), {},
+                         "Testing the metaData of an unconnected node")
+        pm.delete(node)
+        mNode.delete()
+
+    def connection_index_follows_class_change(self):
+        """Test that the index filters and builds the linked mNode by its current mClass after convertMClassType"""
+        mNode = Red9_Meta.MetaClass(name="indexConvertNode")
+        node = pm.createNode("transform", name="indexConvertTarget")
+        mNode.connectChild(str(node), "Target")
+        name = node.longName()
+        self.assertEqual(len(Red9_Meta.getConnectedMetaNodes(name, mTypes=["MetaClass"])), 1, "Testing the link")
+        converted = Red9_Meta.convertMClassType(mNode, "MetaRig")
+        self.assertEqual(Red9_Meta.getConnectedMetaNodes(name, mTypes=["MetaClass"]), [],
+                         "Testing the old mClass no longer matches")
+        found = Red9_Meta.getConnectedMetaNodes(name, mTypes=["MetaRig"])
+        self.assertEqual([type(linked) for linked in found], [Red9_Meta.MetaRig], "Testing the new mClass is built")
+        pm.delete(node)
+        converted.delete()
+
+    def events_bound_on_demand(self):
+        """Test that the rename and connection callbacks are only bound while required and are suspended while
+        a file or reference loads"""
+        bus = Red9_Meta.MetaCacheEventBus()
+        emitter = bus.bindEmitter(Red9_Meta.FakeCacheEmitter())
+        self.assertEqual(emitter.bound, set(), "Testing nothing is bound until required")
+        bus.require("connectionChanged", "test")
+        self.assertEqual(emitter.bound, set(["connectionChanged"]), "Testing the required event is bound")
+        bus.beforeOpen()
+        self.assertEqual(emitter.bound, set(), "Testing kBeforeOpen suspends the callbacks")
+        bus.beforeLoadReference()
+        bus.afterLoadReference()
+        self.assertEqual(emitter.bound, set(), "Testing a reference load inside the open keeps them suspended")
+        bus.resume("open")
+        self.assertEqual(emitter.bound, set(["connectionChanged"]), "Testing kAfterOpen binds them again")
+        bus.release("connectionChanged", "test")
+        self.assertEqual(emitter.bound, set(), "Testing the last release unbinds the event")
+        index = Red9_Meta.RED9_META_CONNECTIONINDEX
+        demand = Red9_Meta.RED9_META_EVENTBUS.demand["connectionChanged"]
+        index.build()
+        self.assertIn("connectionIndex", demand, "Testing the built index requires the connection event")
+        index.clear()
+        self.assertNotIn("connectionIndex", demand, "Testing the cleared index releases it")
+
+    def batch_edit_is_one_call(self):
+        """Test that a batchEdit block sets all of its attrs, keeps the locks and reaches the scene in one MEL call"""
+        mNode = Red9_Meta.MetaClass(name="batchTestNode")
+        mNode.addAttr("weight", 0.0)
+        mNode.addAttr("count", 0)
+        mNode.addAttr("label", "")
+        mNode.addAttr("side", attrType="enum", enumName="Centre:Left:Right")
+        mNode.attrSetLocked("weight", True)
+        cmdsCounter = libUnitTests.CountingCmds(Red9_Meta.cmds)
+        melCounter = libUnitTests.CountingCmds(Red9_Meta.mel)
+        Red9_Meta.cmds, Red9_Meta.mel = cmdsCounter, melCounter
+        try:
+            with mNode.batchEdit():
+                mNode.weight = 0.5
+                mNode.count = 3
+                mNode.label = 'arm "L"\n'
+                mNode.side = "Left"
+        finally:
+            Red9_Meta.cmds, Red9_Meta.mel = cmdsCounter.cmds, melCounter.cmds
+        self.assertEqual((cmdsCounter.calls, melCounter.calls), ({}, {"eval": 1}),
+                         "Testing the batch was flushed in one call: %s %s" % (cmdsCounter.calls, melCounter.calls))
+        node = mNode.mNode
+        self.assertEqual([pm.getAttr("%s.%s" % (node, attr)) for attr in ["weight", "count", "label", "side"]],
+                         [0.5, 3, 'arm "L"\n', 1], "Testing the queued values were set")
+        self.assertTrue(pm.getAttr("%s.weight" % node, lock=True), "Testing the locked attr was relocked")
+
+    def batch_edit_discards_on_error(self):
+        """Test that a batchEdit block which raises leaves the node as it was"""
+        mNode = Red9_Meta.MetaClass(name="batchErrorNode")
+        mNode.addAttr("count", 0)
+        with self.assertRaises(RuntimeError):
+            with mNode.batchEdit():
+                mNode.count = 5
+                raise RuntimeError("Testing a failed batch")
+        self.assertEqual(pm.getAttr("%s.count" % mNode.mNode), 0, "Testing the queued value was not set")
+        self.assertIsNone(mNode._batchEdit, "Testing the batch was unbound")
+
+    def batch_edit_failed_set(self):
+        """Test that a set which fails in the MEL block doesn't stop the others or leave a forced attr unlocked"""
+        mNode = Red9_Meta.MetaClass(name="batchFailNode")
+        mNode.addAttr("weight", 0.0)
+        mNode.addAttr("scale", 1.0)
+        mNode.addAttr("count", 0)
+        mNode.attrSetLocked("weight", True)
+        mNode.attrSetLocked("scale", True)
+        with self.assertRaises(StandardError):
+            with mNode.batchEdit():
+                mNode.scale = 2.0
+                mNode.__setattr__("weight", 0.5, force=False)
+                mNode.count = 3
+        node = mNode.mNode
+        self.assertEqual([pm.getAttr("%s.%s" % (node, attr)) for attr in ["weight", "scale", "count"]], [0.0, 2.0, 3],
+                         "Testing only the locked attr set without force failed")
+        for attr in ["weight", "scale"]:
+            self.assertTrue(pm.getAttr("%s.%s" % (node, attr), lock=True), "Testing %s is still locked" % attr)
+        with self.assertRaises(ValueError):
+            with mNode.batchEdit():
+                mNode.count = 4
+                mNode.scale = float("inf")
+        self.assertEqual(pm.getAttr("%s.count" % node), 3, "Testing the non-finite float was rejected when queued")
+        mNode.delete()
+
+    def complex_attr_codec(self):
+        """Test that a complex attr opted into the binary codec round trips and repeat reads come from the memo"""
+        pose = dict(("node%i" % i, {"translateX": i * 0.5, "visibility": True, "ID": str(i)}) for i in range(500))
+        self.targetNode.complexCodecs["testPose"] = "binary"
+        self.targetNode.addAttr("testPose", value=pose, hidden=True)
+        stored = pm.getAttr("%s.testPose" % self.targetNode.mNode)
+        self.assertTrue(Red9_Meta.RED9_META_ATTRCODEC.isEncoded(stored), "Testing the pose is stored binary encoded")
+        self.assertLess(len(stored), len(Red9_Meta.json.dumps(pose)), "Testing the binary pose is smaller than json")
+        hits = Red9_Meta.RED9_META_ATTRCODEC.hits
+        self.assertEqual(self.targetNode.testPose, pose, "Testing the binary pose round trips")
+        self.assertEqual(Red9_Meta.RED9_META_ATTRCODEC.hits, hits + 1, "Testing the read came from the memo")
+        self.assertEqual(Red9_Meta.MetaClass.complexCodecs, {}, "Testing the opt in didn't leak to the class")
+        rig = Red9_Meta.MetaRig(name="codecTestRig")
+        self.assertEqual(rig.complexCodecs, {"zeroPose": "binary"}, "Testing MetaRig opts its pose cache in")
+        rig.delete()
+
+    def codec_memo_matches_decode(self):
+        """Test that the value memoised by encode is the same as a decode of the stored string would give"""
+        data = {"pose": (1.0, 2.0), 3: ["a", (True, None)], "name": "arm"}
+        for codec in ["zlib", "binary"]:
+            attrCodec = Red9_Meta.MetaAttrCodec()
+            encoded = attrCodec.encode(data, codec)
+            memoised = attrCodec.decode(encoded)
+            self.assertEqual(attrCodec.hits, 1, "Testing the %s read came from the memo" % codec)
+            attrCodec.clear()
+            self.assertEqual(memoised, attrCodec.decode(encoded), "Testing the %s memo matches the decode" % codec)
+
+    def scene_traffic_is_profiled(self):
+        """Test that the profiler records the meta scene traffic and writes a folded flame graph"""
+        with Red9_Meta.profileSceneTraffic() as profile:
+            for _ in range(5):
+                getattr(self.targetNode, self.variable_name)
+        self.assertEqual(profile.commands["getAttr"][0], 5, "Testing the getAttr calls are counted")
+        self.assertEqual(sum(count for count, _ in profile.callers.values()), 5, "Testing every call has a caller")
+        self.assertNotIsInstance(Red9_Meta.cmds, Red9_Meta.r9General.ProfiledCmds, "Testing the cmds are restored")
+        with open(profile.writeFlameGraph()) as flame:
+            lines = flame.read().splitlines()
+        self.assertTrue(lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines),
+                        "Testing the flame graph is in the folded format")
+
+    def child_meta_nodes_match_walk(self):
+        """Test that the graph walk finds the same child meta nodes as walking the network one node at a time, and that
+        the lazy graph only reads the network it walks"""
+        other = Red9_Meta.MetaRig(name="UnconnectedRig")
+        try:
+            expected = reference_child_meta_nodes(self.targetNode.mNode)
+            self.assertTrue(expected, "Testing the network has child meta nodes")
+            result = self.targetNode.getChildMetaNodes(walk=True)
+            self.assertEqual(sorted(node.mNode for node in result), expected, "Testing the walk")
+            graph = Red9_Meta.MetaNetworkGraph(lazy=True)
+            result = self.targetNode.getChildMetaNodes(walk=True, graph=graph)
+            self.assertEqual(sorted(node.mNode for node in result), expected, "Testing the walk with a lazy graph")
+            self.assertNotIn(other.mNode, graph.mClasses, "Testing the lazy graph did not read the other network")
+            result = self.targetNode.getChildMetaNodes(walk=True, graph=Red9_Meta.MetaNetworkGraph())
+            self.assertEqual(sorted(node.mNode for node in result), expected, "Testing the walk with a scene graph")
+            direct = Red9_Meta.getConnectedMetaNodes(self.targetNode.mNode, source=False, destination=True)
+            self.assertEqual(sorted(node.mNode for node in self.targetNode.getChildMetaNodes(graph=graph)),
+                             sorted(node.mNode for node in direct), "Testing the direct children from the graph")
+        finally:
+            other.delete()
+
+    def child_meta_nodes_stepover(self):
+        """Test that stepover walks through the unmatched nodes and returns nothing without a type filter"""
+        self.assertEqual(self.targetNode.getChildMetaNodes(walk=True, stepover=True), [],
+                         "Testing stepover without mTypes or mInstances")
+        expected = [node for node in reference_child_meta_nodes(self.targetNode.mNode)
+                    if Red9_Meta.isMetaNodeInherited(node, [core.TransSubSystem])]
+        self.assertTrue(expected, "Testing the network has sub systems")
+        result = self.targetNode.getChildMetaNodes(walk=True, stepover=True, mTypes=[core.TransSubSystem])
+        self.assertEqual(sorted(node.mNode for node in result), expected, "Testing stepover with mTypes")
+
+    def snapshot_matches_scene(self):
+        """Test that the network snapshot gives the same child systems as the live scene"""
+        snapshot = Red9_Meta.MetaNetworkSnapshot.fromScene()
+        live = [node.mNode for node in self.targetNode.getChildMetaNodes(walk=True)]
+        self.assertEqual(sorted(snapshot.getChildMetaNodes(self.targetNode.mNode, walk=True)), sorted(live),
+                         "Testing snapshot child meta nodes")
+
+    def snapshot_backs_cmds(self):
+        """Test that the snapshot can stand in for maya.cmds and answers the meta lookups the same as the scene"""
+        snapshot = Red9_Meta.MetaNetworkSnapshot.fromScene()
+        kws = {"source": False, "destination": True, "dataType": "unicode", "nTypes": Red9_Meta.getMClassNodeTypes()}
+        cmds = Red9_Meta.cmds
+        live = sorted(cmds.ls(Red9_Meta.getConnectedMetaNodes(self.targetNode.mNode, **kws), l=True))
+        fake = SnapshotCmds(snapshot)
+        Red9_Meta.cmds = fake
+        try:
+            result = sorted(Red9_Meta.getConnectedMetaNodes(self.targetNode.mNode, **kws))
+            mClass = Red9_Meta.getMClassDataFromNode(self.targetNode.mNode, checkInstance=False)
+        finally:
+            Red9_Meta.cmds = cmds
+        self.assertTrue(fake.calls.get("listConnections"), "Testing the lookup went through the snapshot")
+        self.assertEqual(result, live, "Testing the connected meta nodes from the snapshot")
+        self.assertEqual(mClass, self.targetNode.mClass, "Testing the mClass from the snapshot")
+        with self.assertRaises(SnapshotMissError):
+            fake.select(self.targetNode.mNode)
+
+    def snapshot_reads_ui_units(self):
+        """Test that the snapshot reads unit attrs in the same ui units as getAttr"""
+        cmds = Red9_Meta.cmds
+        node = self.targetNode.mNode
+        units = cmds.currentUnit(q=True, linear=True), cmds.currentUnit(q=True, angle=True)
+        cmds.currentUnit(linear="mm", angle="rad")
+        try:
+            cmds.setAttr(node + ".translateX", 12.5)
+            cmds.setAttr(node + ".rotateY", 0.5)
+            snapshot = Red9_Meta.MetaNetworkSnapshot.fromScene(metaAttrs=["translateX", "rotateY"])
+            for attr in ["translateX", "rotateY"]:
+                self.assertAlmostEqual(snapshot.getAttr(node, attr), cmds.getAttr("%s.%s" % (node, attr)), 6,
+                                       "Testing %s is read in ui units" % attr)
+        finally:
+            cmds.setAttr(node + ".translateX", 0)
+            cmds.setAttr(node + ".rotateY", 0)
+            cmds.currentUnit(linear=units[0], angle=units[1])
+
+    def snapshot_is_unchanged(self):
+        """Test that the reopened network matches the snapshot that was saved with the file"""
+        diff = Red9_Meta.MetaNetworkSnapshot.load(self.snapshot_file).diff(Red9_Meta.MetaNetworkSnapshot.fromScene())
+        self.assertFalse(any(diff.values()), "Testing the reopened network against the snapshot: %s" % diff)
+
     def is_sub_component(self):
         """Test Inheritence of meta classes"""
         self.assertTrue(self.targetNode.isSubComponent, "Checking if control is subcomponent")
@@ -43,6 +603,7 @@ class Droid(object):
         self.masterRig = None
         self.metaNode = None
         self.saved_file = None
+        self.snapshot_file = None
         self.myCtrl = None
         self.mRig = None
 
@@ -65,6 +626,7 @@ class Droid(object):
         fkSystem.convertSystemToSubSystem("FK")
 
     def reinitialise_meta_network(self):
+        self.save_snapshot()
         self.save_file()
         pm.newFile(f=1)
         self.open_file()
@@ -78,10 +640,14 @@ class Droid(object):
         self.myCtrl = Red9_Meta.MetaClass("C_Core_FK_Ctrl")
 
     def save_file(self):
-        self.saved_file = pm.saveAs(r"c:\temp\testMeta.ma")
+        self.saved_file = pm.saveAs(os.path.join(tempfile.gettempdir(), "testMeta.ma"))
 
     def open_file(self):
-        pm.openFile(r"c:\temp\testMeta.ma")
+        pm.openFile(os.path.join(tempfile.gettempdir(), "testMeta.ma"))
+
+    def save_snapshot(self):
+        self.snapshot_file = os.path.join(tempfile.gettempdir(), "testMeta.json")
+        Red9_Meta.MetaNetworkSnapshot.fromScene().save(self.snapshot_file)
 
     def create_advanced_ctrl_meta_network(self):
         self.create_simple_ctrl_meta_network()
@@ -128,6 +694,28 @@ class BatchTest(libUnitTests.BatchTest):
         self.addTest("variable_is_not_none", targetNode=self.droid.myCtrl, variable_name="prnt")
         self.addTest("is_sub_component", targetNode=self.droid.myCtrl)
         self.addTest("is_not_sub_component", targetNode=self.droid.mRig)
+        self.addTest("attribute_reads_are_cached", targetNode=self.droid.myCtrl, variable_name="part")
+        self.addTest("attribute_reads_are_cached", targetNode=self.droid.myCtrl, variable_name="mirrorSide")
+        self.addTest("schema_follows_added_attr", targetNode=self.droid.myCtrl)
+        self.addTest("schema_shared_by_class")
+        self.addTest("child_meta_nodes_match_walk", targetNode=self.droid.mRig)
+        self.addTest("child_meta_nodes_stepover", targetNode=self.droid.mRig)
+        self.addTest("snapshot_matches_scene", targetNode=self.droid.mRig)
+        self.addTest("snapshot_backs_cmds", targetNode=self.droid.mRig)
+        self.addTest("snapshot_reads_ui_units", targetNode=self.droid.mRig)
+        self.addTest("cache_follows_events", targetNode=self.droid.myCtrl)
+        self.addTest("node_cache_follows_deletion")
+        self.addTest("bulk_matches_get_meta_nodes")
+        self.addTest("connection_index_matches_scene", targetNode=self.droid.myCtrl)
+        self.addTest("connection_index_follows_deletion")
+        self.addTest("connection_index_follows_class_change")
+        self.addTest("events_bound_on_demand")
+        self.addTest("batch_edit_is_one_call")
+        self.addTest("batch_edit_discards_on_error")
+        self.addTest("batch_edit_failed_set")
+        self.addTest("complex_attr_codec", targetNode=self.droid.mRig)
+        self.addTest("codec_memo_matches_decode")
+        self.addTest("scene_traffic_is_profiled", targetNode=self.droid.myCtrl, variable_name="part")
         self.run_test("Testing meta creation")
 
     def test_meta_reopen(self):
@@ -139,6 +727,7 @@ class BatchTest(libUnitTests.BatchTest):
         self.addTest("test_meta_inheritance", targetNode=self.droid.myCtrl, targetClass=core.Ctrl)
         self.addTest("variable_is_not_none", targetNode=self.droid.myCtrl, variable_name="xtra")
         self.addTest("variable_is_not_none", targetNode=self.droid.myCtrl, variable_name="prnt")
+        self.addTest("snapshot_is_unchanged", snapshot_file=self.droid.snapshot_file)
         self.run_test("Testing meta reopen")
 
     def test_ik_creation(self):
@@ -0,0 +1,515 @@
+"""
+@package UnitTests.red9CoreUtilsUnitTest
+@brief Testing for the Red9 core utils node filters
+@details The filters are run against a synthetic rig like hierarchy so that the results can be checked against a plain
+reference implementation and timed at a production scale.
+"""
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+
+import pymel.core as pm
+from maya import cmds
+
+from PKD_Tools import libUnitTests
+from PKD_Tools.Red9 import Red9_CoreUtils
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+if __name__ == '__main__':
+    reload(libUnitTests)
+
+## Number of transforms in the synthetic hierarchy
+HIERARCHY_SIZE = 5000
+
+## Seconds processFilter is allowed to take on the synthetic hierarchy
+FILTER_BUDGET = 2.0
+
+## Literal strings that decodeLiteral must give the same value and type as eval for
+LITERAL_CORPUS = ["1", "-1", "1.5", "-2.5e-05", ".5", "5.", "12L", "1e10", "True", "False", "None", "[]", "()", "{}",
+                  "[1.0, 2.0, 3.0]", "(1.0,)", "(1.0)", "((1, 2), (3, 4))", "[ 1 , 2 , ]", "'abc'", "'it\"s'",
+                  "\"a\\'b\"", "u'\\u00e9'", "r'a\\\\b'", "{'a': [1, (2, 3)], 2: None}", "010", "[010, -010L, 0]",
+                  "(010)", "[1, 2.5, -3e2, ]", "( 1 , 2 )", u"'\xe9'", u"[u'\xe9', '\xe9\\n']", u"u'\\\xe9'",
+                  u"ur'\\u00e9\xe9'"]
+
+## Strings that decodeLiteral must reject
+LITERAL_REJECTS = ["__import__('os').system('ls')", "open('pose.pose')", "lambda: 0", "[x for x in range(3)]",
+                   "1 + 1", "abc", "None.x", "Truex", "[True()]", "{1, 2}", "[1, 2", "(1, 2]", "{1:}", "1 2", "",
+                   "-"]
+
+## Number of random values in the fuzz corpus
+LITERAL_FUZZ_SIZE = 2000
+
+## Small rig for the fake hierarchy backend, given in listRelatives order
+FAKE_HIERARCHY = [("|rig", "transform"),
+                  ("|rig|L_Ctrl", "transform"),
+                  ("|rig|L_Ctrl|L_CtrlShape", "nurbsCurve"),
+                  ("|rig|L_Ctrl|L_Grp", "transform"),
+                  ("|rig|L_Ctrl|L_Grp|R_Ctrl", "transform"),
+                  ("|rig|L_Ctrl|L_Grp|R_Ctrl|R_CtrlShape", "nurbsCurve"),
+                  ("|rig|jnt", "joint"),
+                  ("|rig|geo", "transform"),
+                  ("|rig|geo|geoShape", "mesh")]
+
+## Number of nodes matched against the reference nested loop, which is quadratic
+MATCH_SIZE = 1000
+
+
+def build_hierarchy(count=HIERARCHY_SIZE, breadth=4):
+    """
+    Build a synthetic rig like hierarchy. Every third transform is a control with a nurbs curve shape and a ctrlType
+    attribute, and the sides alternate between left and right
+    @param count: (int) Number of transforms under the root
+    @param breadth: (int) Number of children per transform
+    @return (str) The long name of the root
+    """
+    root = cmds.createNode("transform", name="synthetic_root")
+    nodes = []
+    for index in range(count):
+        parent = nodes[(index - 1) // breadth] if index else root
+        isCtrl = not index % 3
+        name = "%s_Part%i_%05i_%s" % ("LR"[index % 2], index % 7, index, "Ctrl" if isCtrl else "Grp")
+        node = cmds.createNode("transform", name=name, parent=parent)
+        if isCtrl:
+            cmds.createNode("nurbsCurve", name="%sShape" % name, parent=node)
+            cmds.addAttr(node, longName="ctrlType", attributeType="long")
+        nodes.append(node)
+    return cmds.ls(root, long=True)[0]
+
+
+def reference_filter(flt):
+    """
+    The list based intersection that processFilter used before the set based engine. The filters are run in their
+    original order so the results can be compared
+    @param flt: (FilterNode) The filter with it's settings applied
+    @return (list) The filtered nodes
+    """
+    settings = flt.settings
+    steps = []
+    if settings.hierarchy:
+        steps.append(lambda data: flt.lsHierarchy(incRoots=settings.incRoots, transformClamp=settings.transformClamp))
+    if settings.nodeTypes:
+        steps.append(lambda data: flt.lsSearchNodeTypes(settings.nodeTypes, nodes=data, incRoots=settings.incRoots,
+                                                        transformClamp=settings.transformClamp))
+    if settings.searchAttrs:
+        steps.append(lambda data: flt.lsSearchAttributes(settings.searchAttrs, nodes=data,
+                                                         incRoots=settings.incRoots))
+    if settings.searchPattern:
+        steps.append(lambda data: flt.lsSearchNamePattern(settings.searchPattern, nodes=data,
+                                                          incRoots=settings.incRoots))
+    data = []
+    for step in steps:
+        nodes = step(data)
+        if not nodes:
+            return []
+        data = [node for node in nodes if node in data] if data else nodes
+    return data
+
+
+def reference_match(nodeListA, nodeListB, matchMethod):
+    """
+    The nested loop matchNodeLists used before the name index, for the base and stripPrefix methods
+    @param nodeListA: (list) The nodes being matched
+    @param nodeListB: (list) The nodes they are matched to
+    @param matchMethod: (str) Either base or stripPrefix
+    @return (list) The matched pairs
+    """
+    remaining = list(nodeListB)
+    matched = []
+    for nodeA in nodeListA:
+        strippedA = Red9_CoreUtils.nodeNameStrip(nodeA).upper()
+        for nodeB in remaining:
+            strippedB = Red9_CoreUtils.nodeNameStrip(nodeB).upper()
+            if strippedA == strippedB or (matchMethod == "stripPrefix" and
+                                          (strippedA.endswith(strippedB) or strippedB.endswith(strippedA))):
+                matched.append((nodeA, nodeB))
+                remaining.remove(nodeB)
+                break
+    return matched
+
+
+def reference_search_attributes(nodes, searchAttrs):
+    """
+    The per node attributeQuery and getAttr search that lsSearchAttributes ran before the batched reads
+    @param nodes: (list) The nodes to search
+    @param searchAttrs: (list) The search attrs, with the NOT: and = operators
+    @return (list) The matched nodes
+    """
+    plan = Red9_CoreUtils.AttrSearchPlan(searchAttrs)
+    exists = lambda node, attr: cmds.attributeQuery(attr, exists=True, node=node)
+    getValue = lambda node, attr: cmds.getAttr("%s.%s" % (node, attr))
+    return [node for node in nodes if plan.test(node, exists, getValue)[0]]
+
+
+def reference_prioritize(nodes, priorityList, prioritysOnly=False):
+    """
+    The per priority, per node regex loop that prioritizeNodeList ran before the combined alternation
+    @param nodes: (list) The nodes to reorder
+    @param priorityList: (list) The priority regexes
+    @param prioritysOnly: (bool) Only return the prioritised nodes
+    @return (list) The reordered nodes
+    """
+    remaining = list(nodes)
+    reordered = []
+    for priority in priorityList:
+        for node in nodes:
+            if re.search(priority, Red9_CoreUtils.nodeNameStrip(node)):
+                reordered.append(node)
+                if node in remaining:
+                    remaining.remove(node)
+    if not prioritysOnly:
+        reordered.extend(remaining)
+    return reordered
+
+
+def reference_safe_curves(animCurves):
+    """
+    The per curve referenceQuery, listConnections and getAttr tests lsAnimCurves(safe=True) ran before the index
+    @param animCurves: (list) The curves to classify
+    @return (list) The curves that are safe to modify
+    """
+    safeCurves = []
+    for animCurve in animCurves:
+        if cmds.referenceQuery(animCurve, inr=True):
+            continue
+        if cmds.listConnections(animCurve, s=True, d=False):
+            continue
+        if cmds.nodeType(cmds.listConnections(animCurve)) == "clipLibrary":
+            continue
+        if cmds.getAttr("%s.ktv" % animCurve, l=True):
+            continue
+        safeCurves.append(animCurve)
+    return safeCurves
+
+
+def random_literal(depth=0):
+    """
+    Build a random value of the shapes Red9 writes into pose files and settings
+    @param depth: (int) Nesting depth of the value
+    @return The value
+    """
+    roll = random.random()
+    if depth > 3 or roll < 0.5:
+        return random.choice([random.uniform(-1e6, 1e6), random.randint(-1000, 1000), True, False, None,
+                              "attr%i" % random.randint(0, 9), "q'\"\\n"])
+    if roll < 0.7:
+        return [random_literal(depth + 1) for _ in range(random.randint(0, 4))]
+    if roll < 0.85:
+        return tuple(random_literal(depth + 1) for _ in range(random.randint(0, 4)))
+    return dict((random.choice([random.randint(0, 9), "key%i" % random.randint(0, 9)]), random_literal(depth + 1))
+                for _ in range(random.randint(0, 4)))
+
+
+class UnitTestCase(libUnitTests.UnitTestCase):
+    """Base Class For All Unit Test."""
+
+    def __init__(self, testName, **kwargs):
+        super(UnitTestCase, self).__init__(testName, **kwargs)
+
+    def make_filter(self):
+        flt = Red9_CoreUtils.FilterNode(self.root)
+        for setting, value in self.settings.items():
+            setattr(flt.settings, setting, value)
+        return flt
+
+    def filter_matches_reference(self):
+        """Test that processFilter gives the same nodes in the same order as the list based intersection"""
+        self.assertEqual(self.make_filter().processFilter(), reference_filter(self.make_filter()),
+                         "Testing the filter results for %s" % self.settings)
+
+    def filter_within_budget(self):
+        """Test that processFilter runs on the synthetic hierarchy within the time budget"""
+        flt = self.make_filter()
+        start = time.time()
+        flt.processFilter()
+        elapsed = time.time() - start
+        self.assertLess(elapsed, FILTER_BUDGET, "Testing the filter took %.3fs, the budget is %.3fs" % (elapsed,
+                                                                                                      FILTER_BUDGET))
+
+    def snapshot_matches_scene(self):
+        """Test that the snapshot backed hierarchy and type filters match the direct scene queries"""
+        flt = Red9_CoreUtils.FilterNode(self.root)
+        self.assertEqual(flt.lsHierarchy(), cmds.listRelatives(self.root, ad=True, f=True))
+        self.assertEqual(flt.lsHierarchy(transformClamp=True),
+                         cmds.listRelatives(self.root, ad=True, f=True, type="transform"))
+        self.assertEqual(flt.lsSearchNodeTypes(["nurbsCurve"], incRoots=False),
+                         cmds.listRelatives(self.root, ad=True, f=True, type="nurbsCurve"))
+        # Each parent transform is inserted at the front the first time one of its shapes is found
+        expected = []
+        for shape in cmds.listRelatives(self.root, ad=True, f=True, type="nurbsCurve"):
+            parent = cmds.listRelatives(shape, p=True, f=True)[0]
+            if parent not in expected:
+                expected.insert(0, parent)
+        self.assertEqual(flt.lsSearchNodeTypes(["nurbsCurve"], incRoots=False, transformClamp=True), expected)
+
+    def snapshot_fake_backend(self):
+        """Test the hierarchy and type filters over the fake backend, no scene calls are made"""
+        flt = Red9_CoreUtils.FilterNode("rig")
+        flt.snapshotBackend = Red9_CoreUtils.FakeHierarchyBackend(FAKE_HIERARCHY)
+        self.assertEqual(flt.lsHierarchy(incRoots=True), ["rig"] + [node for node, _ in FAKE_HIERARCHY[1:]])
+        self.assertEqual(flt.lsHierarchy(transformClamp=True),
+                         ["|rig|L_Ctrl", "|rig|L_Ctrl|L_Grp", "|rig|L_Ctrl|L_Grp|R_Ctrl", "|rig|jnt", "|rig|geo"])
+        self.assertEqual(flt.lsSearchNodeTypes(["nurbsCurve"], transformClamp=True),
+                         ["|rig|L_Ctrl|L_Grp|R_Ctrl", "|rig|L_Ctrl"])
+        self.assertEqual(flt.lsSearchNodeTypes(["mesh"], nodes=["|rig|L_Ctrl", "|rig|geo"]), ["|rig|geo|geoShape"])
+        # The transform is matched directly before its shape is clamped back to it
+        self.assertEqual(flt.lsSearchNodeTypes(["transform", "nurbsCurve"], incRoots=False, transformClamp=True,
+                                               nodes=["|rig|L_Ctrl", "|rig|L_Ctrl|L_CtrlShape"]), ["|rig|L_Ctrl"])
+        flt.settings.nodeTypes = ["nurbsCurve"]
+        flt.settings.transformClamp = True
+        flt.settings.searchPattern = ["R_"]
+        self.assertEqual(flt.processFilter(), ["|rig|L_Ctrl|L_Grp|R_Ctrl"])
+
+    def attr_search_matches_reference(self):
+        """Test that the batched attribute search matches the per node queries"""
+        nodes = cmds.listRelatives(self.root, ad=True, f=True, type="transform")
+        for index, node in enumerate(nodes[:30]):
+            if cmds.attributeQuery("ctrlType", exists=True, node=node):
+                cmds.setAttr("%s.ctrlType" % node, index % 3)
+        flt = Red9_CoreUtils.FilterNode(self.root)
+        for searchAttrs in [["ctrlType"], ["NOT:ctrlType"], ["ctrlType=2"], ["ctrlType", "NOT:ctrlType=1"],
+                            ["v=True"], ["tx=0.0", "NOT:ctrlType"]]:
+            self.assertEqual(flt.lsSearchAttributes(searchAttrs, nodes=nodes),
+                             reference_search_attributes(nodes, searchAttrs),
+                             "Testing the search for %s" % searchAttrs)
+        values = flt.lsSearchAttributes(["ctrlType"], nodes=nodes, returnValues=True)
+        self.assertEqual(values, dict((node, cmds.getAttr("%s.ctrlType" % node)) for node in values))
+
+    def attr_search_follows_attr_edits(self):
+        """Test that the attribute existence follows attrs swapped on a node, same attr count"""
+        node = cmds.listRelatives(self.root, ad=True, f=True, type="transform")[0]
+        for attr in ["searchA", "searchB"]:
+            if cmds.attributeQuery(attr, exists=True, node=node):
+                cmds.deleteAttr("%s.%s" % (node, attr))
+        cmds.addAttr(node, ln="searchA", dt="string")
+        cmds.setAttr("%s.searchA" % node, u"caf\xe9", type="string")
+        flt = Red9_CoreUtils.FilterNode(self.root)
+        self.assertEqual(flt.lsSearchAttributes(["searchA"], nodes=[node]), [node])
+        values = flt.lsSearchAttributes(["searchA"], nodes=[node], returnValues=True)
+        self.assertEqual(values, {node: cmds.getAttr("%s.searchA" % node)})
+        self.assertEqual(type(values[node]), type(cmds.getAttr("%s.searchA" % node)))
+        cmds.deleteAttr("%s.searchA" % node)
+        cmds.addAttr(node, ln="searchB", dt="string")
+        self.assertEqual(flt.lsSearchAttributes(["searchA"], nodes=[node]), [])
+        self.assertEqual(flt.lsSearchAttributes(["searchB"], nodes=[node]), [node])
+        cmds.deleteAttr("%s.searchB" % node)
+
+    def prioritize_matches_reference(self):
+        """Test that prioritizeNodeList orders nodes matching several priorities the same as the per priority loop"""
+        random.seed(self.seed)
+        names = ["upperLip", "l_upperLip", "lowerLip", "jaw", "brow_Ctrl", "L_brow", "R_brow", "ARM_ctrl", "Leg_ctrl",
+                 "aa_ctrl"]
+        priorities = ["upperLip", "l_upperLip", "^upper", "Lip$", "brow", "L_", "Ctrl", "^arm", "(?i)leg", r"(a)\1"]
+        for _ in range(500):
+            nodes = ["|rig|ns:%s" % random.choice(names) for _ in range(random.randint(0, 10))]
+            priorityList = random.sample(priorities, random.randint(1, 4))
+            for prioritysOnly in [True, False]:
+                self.assertEqual(Red9_CoreUtils.prioritizeNodeList(nodes, priorityList, prioritysOnly=prioritysOnly),
+                                 reference_prioritize(nodes, priorityList, prioritysOnly),
+                                 "Testing %s against %s" % (nodes, priorityList))
+
+    def channel_state_diff(self):
+        """Test that processState only reports and sets the flags that change, one setAttr per plug, and the dry run
+        changes nothing"""
+        nodes = cmds.listRelatives(self.root, ad=True, f=True, type="transform")[:50]
+        attrs = ["translate", "rx", "v"]
+        plugs = ["%s.%s" % (node, attr) for node in nodes for attr in ["tx", "ty", "tz", "rx", "v"]]
+        before = [cmds.getAttr(plug, lock=True) for plug in plugs]
+        diff = Red9_CoreUtils.LockChannels.processState(nodes, attrs, "lockall", dryRun=True)
+        self.assertEqual(len(diff), len(plugs))
+        self.assertEqual([cmds.getAttr(plug, lock=True) for plug in plugs], before)
+        counter = libUnitTests.CountingCmds(Red9_CoreUtils.cmds)
+        Red9_CoreUtils.cmds = counter
+        try:
+            Red9_CoreUtils.LockChannels.processState(nodes, attrs, "lockall")
+        finally:
+            Red9_CoreUtils.cmds = counter.cmds
+        self.assertEqual(counter.calls.get("setAttr"), len(diff), "Testing one setAttr per changed plug")
+        for plug in plugs:
+            self.assertTrue(cmds.getAttr(plug, lock=True), "Testing %s is locked" % plug)
+            self.assertFalse(cmds.getAttr(plug, keyable=True), "Testing %s is hidden" % plug)
+        self.assertEqual(Red9_CoreUtils.LockChannels.processState(nodes, attrs, "lockall", dryRun=True), [])
+        diff = Red9_CoreUtils.LockChannels.processState(nodes, attrs, "unlock")
+        self.assertEqual([changed.keys() for _, changed in diff], [["lock"]] * len(plugs))
+
+    def channel_map_round_trip(self):
+        """Test that loading a stored channel map restores the channel box states"""
+        nodes = cmds.listRelatives(self.root, ad=True, f=True, type="transform")[:50]
+        Red9_CoreUtils.LockChannels.processState(nodes[::2], ["tx", "sy"], "lock")
+        Red9_CoreUtils.LockChannels.processState(nodes[1::2], ["rz", "v"], "hide")
+        stored = [Red9_CoreUtils.r9Anim.getChannelBoxAttrs(node) for node in nodes]
+        channels = Red9_CoreUtils.LockChannels()
+        channels.saveChannelMap(filepath=self.filePath, nodes=nodes, hierarchy=False)
+        Red9_CoreUtils.LockChannels.processState(nodes, ["translate", "rotate", "scale", "v"], "lockall")
+        self.assertTrue(channels.loadChannelMap(filepath=self.filePath, nodes=nodes, hierarchy=False, dryRun=True))
+        channels.loadChannelMap(filepath=self.filePath, nodes=nodes, hierarchy=False)
+        self.assertEqual([Red9_CoreUtils.r9Anim.getChannelBoxAttrs(node) for node in nodes], stored)
+
+    def anim_curves_match_reference(self):
+        """Test that the indexed safe animCurve search matches the per curve tests and follows scene changes"""
+        nodes = cmds.listRelatives(self.root, ad=True, f=True, type="transform")[:40]
+        for index, node in enumerate(nodes):
+            cmds.setKeyframe(node, attribute="tx", time=1, value=index)
+            cmds.setKeyframe(node, attribute="tx", time=10, value=-index)
+        for node in nodes[::4]:
+            cmds.setDrivenKeyframe(node, attribute="ry", currentDriver="%s.tx" % nodes[0])
+        index = Red9_CoreUtils.ANIMCURVE_INDEX
+        curves = Red9_CoreUtils.FilterNode.lsAnimCurves(nodes)
+        safeCurves = Red9_CoreUtils.FilterNode.lsAnimCurves(nodes, safe=True)
+        self.assertEqual(sorted(safeCurves), sorted(reference_safe_curves(curves)))
+        self.assertEqual(len(safeCurves), len(nodes))
+        generation = index.generation
+        self.assertEqual(Red9_CoreUtils.FilterNode.lsAnimCurves(nodes, safe=True), safeCurves)
+        self.assertEqual(index.generation, generation, "Testing the repeat query didn't change the scene")
+        cmds.setKeyframe(nodes[1], attribute="sz", time=1, value=2)
+        self.assertNotEqual(index.generation, generation, "Testing the new curve bumped the generation")
+        self.assertEqual(len(Red9_CoreUtils.FilterNode.lsAnimCurves(nodes, safe=True)), len(nodes) + 1)
+        # Curve deletions come through the filtered nodeRemoved event, the bump leaves the curves to be classified
+        self.assertIn("animCurve", Red9_CoreUtils.r9Meta.RED9_META_EVENTBUS.removedNodeTypes)
+        generation = index.generation
+        cmds.delete(cmds.listConnections("%s.sz" % nodes[1], s=True, d=False, type="animCurve"))
+        self.assertNotEqual(index.generation, generation, "Testing the deleted curve bumped the generation")
+        self.assertEqual(index.classified, {}, "Testing the bump dropped the classifications")
+        self.assertEqual(sorted(Red9_CoreUtils.FilterNode.lsAnimCurves(nodes, safe=True)), sorted(safeCurves))
+
+    def match_lists_matches_reference(self):
+        """Test that matchNodeLists pairs a prefixed, namespaced copy of the hierarchy the same as the nested loop"""
+        nodesA = cmds.listRelatives(self.root, allDescendents=True, type="transform", fullPath=True)
+        nodesB = ["|copy|ns:%s%s" % ("" if index % 4 else "Rig_", node.split("|")[-1])
+                  for index, node in enumerate(nodesA[:MATCH_SIZE])]
+        for matchMethod in ["base", "stripPrefix"]:
+            self.assertEqual(Red9_CoreUtils.matchNodeLists(nodesA, nodesB, matchMethod),
+                             reference_match(nodesA, nodesB, matchMethod),
+                             "Testing the %s match" % matchMethod)
+
+    def match_lists_diagnostics(self):
+        """Test that the matcher reports the unmatched and ambiguous nodes"""
+        matcher = Red9_CoreUtils.NodeListMatcher(["|a|L_Arm", "|a|Spine", "|a|Head"],
+                                                 ["|b|Rig_Spine", "|b|X_Spine", "|b|L_Arm", "|b|Tail"])
+        self.assertEqual(matcher.match(), [("|a|L_Arm", "|b|L_Arm"), ("|a|Spine", "|b|Rig_Spine")])
+        diagnostics = matcher.diagnostics()
+        self.assertEqual(diagnostics["unmatchedA"], ["|a|Head"])
+        self.assertEqual(diagnostics["unmatchedB"], ["|b|X_Spine", "|b|Tail"])
+        self.assertEqual(diagnostics["ambiguous"], {"|a|Spine": ["|b|Rig_Spine", "|b|X_Spine"]})
+
+    def decode_matches_eval(self):
+        """Test that decodeLiteral gives the same value and type as eval for the literal corpus"""
+        for literal in LITERAL_CORPUS:
+            self.assertEqual(Red9_CoreUtils.decodeLiteral(literal), eval(literal), "Testing %s" % literal)
+            self.assertEqual(type(Red9_CoreUtils.decodeLiteral(literal)), type(eval(literal)), "Testing %s" % literal)
+
+    def decode_rejects_code(self):
+        """Test that decodeLiteral raises a ValueError for code and malformed literals"""
+        for literal in LITERAL_REJECTS:
+            self.assertRaises(ValueError, Red9_CoreUtils.decodeLiteral, literal)
+
+    def decode_fuzz(self):
+        """Test that random values round trip and truncated literals are rejected whenever eval rejects them"""
+        random.seed(self.seed)
+        for _ in range(LITERAL_FUZZ_SIZE):
+            value = random_literal()
+            literal = repr(value)
+            self.assertEqual(Red9_CoreUtils.decodeLiteral(literal), value, "Testing %s" % literal)
+            truncated = literal[:random.randint(0, len(literal))]
+            try:
+                expected = eval(truncated)
+            except StandardError:
+                self.assertRaises(ValueError, Red9_CoreUtils.decodeLiteral, truncated)
+            else:
+                self.assertEqual(Red9_CoreUtils.decodeLiteral(truncated), expected, "Testing %s" % truncated)
+
+    def decode_benchmark(self):
+        """Time decodeLiteral against the eval path it replaced on a pose sized payload of unique values. The timings
+        are logged rather than asserted as they depend on the machine"""
+        random.seed(self.seed)
+        payload = [repr(random.uniform(-10, 10)) for _ in range(HIERARCHY_SIZE * 4)]
+        payload += [repr([random.uniform(-10, 10) for _ in range(3)]) for _ in range(HIERARCHY_SIZE)]
+        Red9_CoreUtils.LITERAL_MEMO.clear()
+        start = time.time()
+        expected = [eval(literal) for literal in payload]
+        evalTime = time.time() - start
+        start = time.time()
+        result = [Red9_CoreUtils.decodeLiteral(literal) for literal in payload]
+        decodeTime = time.time() - start
+        log.info("Decoding %i literals, eval : %.3fs, decodeLiteral : %.3fs", len(payload), evalTime, decodeTime)
+        self.assertEqual(result, expected, "Testing the benchmark payload decodes the same as eval")
+
+
+class Droid(libUnitTests.Droid):
+    """Build the synthetic hierarchy in a fresh scene"""
+
+    def __init__(self):
+        super(Droid, self).__init__()
+        self.root = None
+
+    def create_synthetic_hierarchy(self):
+        pm.newFile(f=1)
+        self.root = build_hierarchy()
+
+
+class BatchTest(libUnitTests.BatchTest):
+    """Core utils batch test"""
+
+    def __init__(self):
+        super(BatchTest, self).__init__()
+        self.droid = Droid()
+
+    def addTest(self, testName, **kwargs):
+        # Generalised function to add a test to a suite
+        self.suite.addTest(UnitTestCase(testName, **kwargs))
+
+    def test_filter_node(self):
+        self.droid.create_synthetic_hierarchy()
+        self.suite = libUnitTests.unittest.TestSuite()
+        filters = [{"nodeTypes": ["nurbsCurve"], "searchPattern": ["Ctrl"]},
+                   {"nodeTypes": ["nurbsCurve"], "transformClamp": True, "searchAttrs": ["ctrlType"]},
+                   {"searchPattern": ["L_", "NOT:Part3"], "searchAttrs": ["ctrlType"]},
+                   {"nodeTypes": ["transform"], "searchPattern": ["R_"], "incRoots": False}]
+        for settings in filters:
+            self.addTest("filter_matches_reference", root=self.droid.root, settings=settings)
+        self.addTest("filter_within_budget", root=self.droid.root, settings=filters[1])
+        self.addTest("snapshot_matches_scene", root=self.droid.root)
+        self.addTest("snapshot_fake_backend")
+        self.addTest("attr_search_matches_reference", root=self.droid.root)
+        self.addTest("attr_search_follows_attr_edits", root=self.droid.root)
+        self.run_test("Testing FilterNode")
+
+    def test_match_node_lists(self):
+        self.droid.create_synthetic_hierarchy()
+        self.suite = libUnitTests.unittest.TestSuite()
+        self.addTest("match_lists_matches_reference", root=self.droid.root)
+        self.addTest("match_lists_diagnostics")
+        self.addTest("prioritize_matches_reference", seed=0)
+        self.run_test("Testing matchNodeLists")
+
+    def test_channel_state(self):
+        self.droid.create_synthetic_hierarchy()
+        self.suite = libUnitTests.unittest.TestSuite()
+        self.addTest("channel_state_diff", root=self.droid.root)
+        self.addTest("channel_map_round_trip", root=self.droid.root,
+                     filePath=os.path.join(tempfile.gettempdir(), "red9CoreUtilsUnitTest.attrMap"))
+        self.run_test("Testing LockChannels")
+
+    def test_anim_curves(self):
+        self.droid.create_synthetic_hierarchy()
+        self.suite = libUnitTests.unittest.TestSuite()
+        self.addTest("anim_curves_match_reference", root=self.droid.root)
+        self.run_test("Testing lsAnimCurves")
+
+    def test_decode_literal(self):
+        self.suite = libUnitTests.unittest.TestSuite()
+        for testName in ["decode_matches_eval", "decode_rejects_code", "decode_fuzz", "decode_benchmark"]:
+            self.addTest(testName, seed=0)
+        self.run_test("Testing decodeLiteral")
+
+
+unit = BatchTest()
+unit.test_filter_node()
+unit.test_match_node_lists()
+unit.test_decode_literal()
+unit.test_channel_state()
+unit.test_anim_curves()
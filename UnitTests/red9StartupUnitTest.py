@@ -0,0 +1,140 @@
+"""
+@package UnitTests.red9StartupUnitTest
+@brief Testing for the Red9 startup session data
+@details Here we are testing that once the session values have been probed the hot paths no longer query maya, and that
+the cached values are refreshed when the scene changes underneath them. We also check which Red9 modules a minimal import
+in a fresh mayapy brings in so that the batch startup cost does not creep back up.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pymel.core as pm
+
+from PKD_Tools import libUnitTests
+from PKD_Tools.Red9 import Red9_General
+
+# Use the setup module that Red9 itself imported so that we are testing the same session cache
+setup = Red9_General.r9Setup
+
+if __name__ == '__main__':
+    reload(libUnitTests)
+
+## The only Red9 core modules a minimal session should import
+MINIMAL_MODULES = ["Red9_General", "Red9_Meta"]
+
+## Run in a fresh mayapy. The None entries are the failed relative imports python 2 records in sys.modules
+MINIMAL_IMPORT_SCRIPT = """
+import json, sys
+import maya.standalone
+maya.standalone.initialize()
+from PKD_Tools import Red9
+Red9.start(minimal=True)
+print json.dumps({"modules": [name.split(".")[-1] for name, module in sys.modules.items()
+                              if ".Red9.Red9_" in name and module is not None]})
+"""
+
+
+def run_minimal_import():
+    """
+    Import Red9 in minimal mode in a fresh mayapy
+    @return (dict) The names of the Red9 core modules that were imported
+    """
+    env = dict(os.environ)
+    env["RED9_MINIMAL"] = "1"
+    env["PYTHONPATH"] = os.pathsep.join(path for path in sys.path if path)
+    output = subprocess.check_output([sys.executable, "-c", MINIMAL_IMPORT_SCRIPT], env=env)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class UnitTestCase(libUnitTests.UnitTestCase):
+    """Base Class For All Unit Test."""
+
+    def __init__(self, testName, **kwargs):
+        super(UnitTestCase, self).__init__(testName, **kwargs)
+
+    def session_probes_are_cached(self):
+        """Test that once warmed up the session probes make no about or currentUnit calls"""
+        probes = [setup.getCurrentFPS, Red9_General.getCurrentFPS, setup.mayaIsBatch, setup.osBuild,
+                  setup.has_pro_pack]
+        for probe in probes:
+            probe()
+        counter = libUnitTests.CountingCmds(setup.cmds)
+        setup.cmds = counter
+        try:
+            for _ in range(10):
+                for probe in probes:
+                    probe()
+        finally:
+            setup.cmds = counter.cmds
+        self.assertEqual(counter.calls, {}, "Testing that the session probes are cached: %s" % counter.calls)
+
+    def callbacks_bound_on_first_use(self):
+        """Test that the session callbacks are bound by the first cached probe rather than by Red9.start"""
+        setup.removeSessionCallbacks()
+        self.assertFalse(setup.SESSION_CALLBACKS, "Testing the callbacks were removed")
+        setup.getCurrentFPS()
+        self.assertTrue(setup.SESSION_CALLBACKS, "Testing the callbacks were bound by the probe")
+        self.assertIn("fps", setup.MAYA_INTERNAL_DATA, "Testing the fps was cached")
+
+    def refresh_keeps_other_data(self):
+        """Test that refreshing the session data only clears the values cached by the session probes"""
+        version = setup.mayaVersion()
+        setup.getCurrentFPS()
+        setup.refreshSessionData()
+        self.assertNotIn("fps", setup.MAYA_INTERNAL_DATA, "Testing the session value was cleared")
+        self.assertEqual(setup.MAYA_INTERNAL_DATA.get("version"), version, "Testing the version was kept")
+
+    def fps_follows_time_unit(self):
+        """Test that the cached fps is refreshed by the time unit change callback"""
+        pm.currentUnit(time="film")
+        self.assertEqual(setup.getCurrentFPS(), 24.0, "Testing the fps at film rate")
+        pm.currentUnit(time="ntsc")
+        self.assertEqual(setup.getCurrentFPS(), 30.0, "Testing the fps is refreshed at ntsc rate")
+
+
+    def minimal_import_is_light(self):
+        """Test that a minimal Red9 session only imports the modules MetaData needs"""
+        result = run_minimal_import()
+        self.assertEqual(sorted(result["modules"]), MINIMAL_MODULES,
+                         "Testing the core modules imported by a minimal session")
+
+
+class Droid(libUnitTests.Droid):
+    """Setup a fresh scene with the session callbacks bound"""
+
+    def setup_session(self):
+        pm.newFile(f=1)
+        setup.refreshSessionData()
+
+
+class BatchTest(libUnitTests.BatchTest):
+    """Startup batch test"""
+
+    def __init__(self):
+        super(BatchTest, self).__init__()
+        self.droid = Droid()
+
+    def addTest(self, testName, **kwargs):
+        # Generalised function to add a test to a suite
+        self.suite.addTest(UnitTestCase(testName, **kwargs))
+
+    def test_session_data(self):
+        self.droid.setup_session()
+        self.suite = libUnitTests.unittest.TestSuite()
+        self.addTest("session_probes_are_cached")
+        self.addTest("callbacks_bound_on_first_use")
+        self.addTest("refresh_keeps_other_data")
+        self.addTest("fps_follows_time_unit")
+        self.run_test("Testing session data")
+
+    def test_minimal_startup(self):
+        self.suite = libUnitTests.unittest.TestSuite()
+        self.addTest("minimal_import_is_light")
+        self.run_test("Testing minimal startup")
+
+
+unit = BatchTest()
+unit.test_session_data()
+unit.test_minimal_startup()
@@ -2,12 +2,62 @@
 @brief Simple API to encrypt and decrypt strings using Vigenere cipher
 
 http://stackoverflow.com/questions/2490334/simple-way-to-encode-a-string-according-to-a-password/16321853#16321853
+
+The cipher is applied with one byte translate pass per character of the key rather than character by character, so
+large payloads can be processed quickly. The @ref encode_stream and @ref decode_stream methods process file like
+objects chunk by chunk and give the same result as @ref encode and @ref decode.
 """
 
 import base64
 import struct
 import zlib
 
+## Number of bytes processed per chunk in the stream methods. This must be a multiple of 3 for the base64 encoding
+STREAM_CHUNK_SIZE = 3 * 1024 * 1024
+
+
+def _to_bytes(text):
+    # Unicode text is processed as utf-8 bytes
+    if not isinstance(text, bytes):
+        text = text.encode("utf-8")
+    return text
+
+
+def _shift_tables(key, direction):
+    """
+    Create a byte translation table for each character of the key
+    @param key: (string) The cipher key
+    @param direction: (int) 1 to encode, -1 to decode
+    @return list of translation tables
+    """
+    tables = []
+    for key_c in key:
+        shift = direction * ord(key_c)
+        tables.append(bytes(bytearray((i + shift) % 256 for i in range(256))))
+    return tables
+
+
+def _apply_tables(data, tables, offset=0):
+    """
+    Shift every byte by the key character at it's position. All the bytes which share the same key character are
+    translated in a single pass
+    @param data: (bytes) The data that is being processed
+    @param tables: (list) The translation tables from @ref _shift_tables
+    @param offset: (int) Position of the data within the whole payload
+    @return (bytearray) The processed data
+    """
+    result = bytearray(data)
+    keyLength = len(tables)
+    for index, table in enumerate(tables):
+        start = (index - offset) % keyLength
+        result[start::keyLength] = data[start::keyLength].translate(table)
+    return result
+
+
+def _checksum(text, crc=0):
+    # Unsigned crc so that the checksum is packed the same way on every platform
+    return zlib.crc32(text, crc) & 0xffffffff
+
 
 def encode(text, key):
     """
@@ -16,14 +66,9 @@ def encode(text, key):
     @param key: (string) Special code that is used to help encode the text. This should match whe we decode
     @return: The encoded text
     """
-    text = '{}{}'.format(text, struct.pack('i', zlib.crc32(text)))
-    enc = []
-    for i in range(len(text)):
-        key_c = key[i % len(key)]
-        enc_c = chr((ord(text[i]) + ord(key_c)) % 256)
-        enc.append(enc_c)
-
-    return base64.urlsafe_b64encode("".join(enc))
+    text = _to_bytes(text)
+    text += struct.pack('I', _checksum(text))
+    return base64.urlsafe_b64encode(bytes(_apply_tables(text, _shift_tables(key, 1))))
 
 
 def decode(encodedText, key):
@@ -33,17 +78,74 @@ def decode(encodedText, key):
     @param key: (string) The text that used to code the string
     @return (string): The decoded text
     """
-    dec = []
-    encodedText = base64.urlsafe_b64decode(encodedText)
-    for i in range(len(encodedText)):
-        key_c = key[i % len(key)]
-        dec_c = chr((256 + ord(encodedText[i]) - ord(key_c)) % 256)
-        dec.append(dec_c)
-
-    dec = "".join(dec)
+    encodedText = base64.urlsafe_b64decode(_to_bytes(encodedText))
+    dec = bytes(_apply_tables(encodedText, _shift_tables(key, -1)))
     checksum = dec[-4:]
     dec = dec[:-4]
 
-    assert zlib.crc32(dec) == struct.unpack('i', checksum)[0], 'Decode Checksum Error'
+    assert _checksum(dec) == struct.unpack('I', checksum)[0], 'Decode Checksum Error'
 
     return dec
+
+
+def encode_stream(source, target, key, chunkSize=STREAM_CHUNK_SIZE):
+    """
+    Encode a large payload from a file like object and write the encoded text to another file like object
+    @param source: (file) Readable file object which contains the text
+    @param target: (file) Writable file object for the encoded text
+    @param key: (string) Special code that is used to help encode the text. This should match whe we decode
+    @param chunkSize: (int) Number of bytes which are read at a time. Must be a multiple of 3
+    """
+    assert not chunkSize % 3, 'Chunk size must be a multiple of 3'
+    tables = _shift_tables(key, 1)
+    crc = 0
+    offset = 0
+    pending = b""
+    while True:
+        chunk = _to_bytes(source.read(chunkSize))
+        if not chunk:
+            break
+        crc = _checksum(chunk, crc)
+        pending += bytes(_apply_tables(chunk, tables, offset))
+        offset += len(chunk)
+        # Only encode complete base64 blocks
+        complete = len(pending) - len(pending) % 3
+        target.write(base64.urlsafe_b64encode(pending[:complete]))
+        pending = pending[complete:]
+    pending += bytes(_apply_tables(struct.pack('I', crc), tables, offset))
+    target.write(base64.urlsafe_b64encode(pending))
+
+
+def decode_stream(source, target, key, chunkSize=STREAM_CHUNK_SIZE):
+    """
+    Decode a large encoded payload from a file like object and write the text to another file like object
+    @param source: (file) Readable file object which contains the encoded text
+    @param target: (file) Writable file object for the decoded text
+    @param key: (string) The text that used to code the string
+    @param chunkSize: (int) Number of characters which are read at a time. Must be a multiple of 4
+    """
+    assert not chunkSize % 4, 'Chunk size must be a multiple of 4'
+    tables = _shift_tables(key, -1)
+    crc = 0
+    offset = 0
+    pending = b""
+    tail = b""
+    while True:
+        chunk = _to_bytes(source.read(chunkSize))
+        if not chunk:
+            break
+        pending += chunk
+        # Only decode complete base64 blocks
+        complete = len(pending) - len(pending) % 4
+        decoded = base64.urlsafe_b64decode(pending[:complete])
+        pending = pending[complete:]
+        dec = tail + bytes(_apply_tables(decoded, tables, offset))
+        offset += len(decoded)
+        # Hold back the last 4 bytes as they may be the checksum
+        tail = dec[-4:]
+        dec = dec[:-4]
+        crc = _checksum(dec, crc)
+        target.write(dec)
+
+    assert not pending and len(tail) == 4, 'Decode Checksum Error'
+    assert crc == struct.unpack('I', tail)[0], 'Decode Checksum Error'
@@ -3,15 +3,44 @@
 @brief Common OS methods encapsulated in a user friendly method.
 """
 
+import copy
 import inspect
 import os
 import shutil
 import fnmatch
 import json
+import gzip
+import re
+import tempfile
+import threading
+import Queue
+from collections import OrderedDict, deque
 
 import pymel.core as pm
 from maya import mel
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+## Compact json separators which strips out the whitespace between items
+COMPACT_SEPARATORS = (',', ':')
+
+## Number of characters read from a json stream per chunk
+JSON_CHUNK_SIZE = 65536
+
+## Maximum number of bytes on disk of data files that are kept parsed in memory by @ref cached_load
+CACHE_MEMORY_BUDGET = 64 * 1024 * 1024
+
 
 def linux_path(windowsPath):
     """Convert Windows Path to Linux Path
@@ -172,13 +201,155 @@ def has_extension(path, extension):
     return path.lower().endswith('.%s' % extension)
 
 
+def _scan_entries(path):
+    """Return the name of each item in a folder along with whether it is a folder, a file or a symlink. When scandir is
+    available the type information of the directory entry is reused so that no additional stat call is needed.
+    @param path (string) Path that is queried
+    @return list of (name, isFolder, isFile, isLink) tuples
+    """
+    if _scandir is None:
+        entries = []
+        for name in os.listdir(path):
+            fullPath = os.path.join(path, name)
+            entries.append((name, os.path.isdir(fullPath), os.path.isfile(fullPath), os.path.islink(fullPath)))
+        return entries
+    return [(entry.name, entry.is_dir(), entry.is_file(), entry.is_symlink()) for entry in _scandir(path)]
+
+
+def _compile_patterns(patterns):
+    """Compile glob patterns once so that they can be matched against many file names
+    @param patterns (string/list) Glob pattern or a list of glob patterns
+    @return list of compiled regex match functions. An empty list is returned when there are no patterns
+    """
+    if patterns is None:
+        return []
+    if isinstance(patterns, basestring):
+        patterns = [patterns]
+    return [re.compile(fnmatch.translate(os.path.normcase(pattern))).match for pattern in patterns]
+
+
+def _name_matches(name, matchers):
+    # Same case rules as fnmatch.fnmatch
+    if not matchers:
+        return True
+    name = os.path.normcase(name)
+    for matcher in matchers:
+        if matcher(name):
+            return True
+    return False
+
+
+def _scan_folder(folder, matchers, files, folders):
+    """Read a single folder during a walk
+    @param folder (string) The folder that is read
+    @param matchers (list) Compiled patterns which the names need to match
+    @param files (bool) Return the files
+    @param folders (bool) Return the folders
+    @return tuple of the matching paths and the subfolders that the walk should descend into
+    """
+    paths = []
+    subFolders = []
+    for name, isFolder, isFile, isLink in _scan_entries(folder):
+        path = join(folder, name)
+        if isFolder:
+            # Like os.walk symlinked folders are not descended into, so a link back up the tree can not loop forever
+            if not isLink:
+                subFolders.append(path)
+            if folders and _name_matches(name, matchers):
+                paths.append(path)
+        elif isFile and files and _name_matches(name, matchers):
+            paths.append(path)
+    return paths, subFolders
+
+
+def _walk_folder(folder, matchers, recursive, files, folders):
+    # Breadth first walk which yields the matching paths as soon as each folder is read
+    queue = deque([folder])
+    while queue:
+        paths, subFolders = _scan_folder(queue.popleft(), matchers, files, folders)
+        for path in paths:
+            yield path
+        if recursive:
+            queue.extend(subFolders)
+
+
+def iter_folder(folder, pattern=None, recursive=False, files=True, folders=False, threads=0):
+    """
+    Scan a folder for files and folders. The result is returned as generator so the caller can start processing before
+    the scan is complete.
+    @code
+    for weightFile in libFile.iter_folder(r"c:/test/SkinData", "*.json", recursive=True, threads=8):
+        print weightFile
+    @endcode
+    @param folder (string) The target folder
+    @param pattern (string/list) Glob pattern or list of glob patterns which the file/folder name needs to match
+    @param recursive (bool) Also scan all the subfolders
+    @param files (bool) Return the files
+    @param folders (bool) Return the folders
+    @param threads (int) Number of threads which scan the subfolders in parallel during a recursive scan. This is
+    useful on network storage where each folder listing has a high latency. The order of the paths is not fixed when
+    threads are used
+    @return generator of maya compliant paths
+    """
+    matchers = _compile_patterns(pattern)
+    if not (threads and recursive):
+        return _walk_folder(folder, matchers, recursive, files, folders)
+    return _iter_folder_threaded(folder, matchers, files, folders, threads)
+
+
+def _iter_folder_threaded(folder, matchers, files, folders, threads):
+    # Each worker reads one folder at a time and puts its subfolders back on the queue for the other workers, so every
+    # level of the tree is read in parallel. The paths of each folder are yielded as soon as it has been read
+    folderQueue = Queue.Queue()
+    results = Queue.Queue()
+    folderQueue.put(folder)
+
+    def _worker():
+        while True:
+            current = folderQueue.get()
+            if current is None:
+                return
+            try:
+                paths, subFolders = _scan_folder(current, matchers, files, folders)
+            except Exception as error:
+                results.put((None, 0, error))
+                continue
+            for subFolder in subFolders:
+                folderQueue.put(subFolder)
+            results.put((paths, len(subFolders), None))
+
+    workers = [threading.Thread(target=_worker) for _ in range(threads)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    try:
+        # Number of folders that have been queued but not read yet
+        pending = 1
+        while pending:
+            paths, subFolderCount, error = results.get()
+            if error is not None:
+                raise error
+            pending += subFolderCount - 1
+            for path in paths:
+                yield path
+    finally:
+        # Stop the workers, also when the caller stops iterating early
+        while True:
+            try:
+                folderQueue.get_nowait()
+            except Queue.Empty:
+                break
+        for _ in workers:
+            folderQueue.put(None)
+
+
 def listfolders(path):
     """
     List the folders for the path
     @param path (string) Path that is queried for folders
     @return list of folders for this path
     """
-    res = [d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d))]
+    res = [name for name, isFolder, _, _ in _scan_entries(path) if isFolder]
     return res
 
 
@@ -189,7 +360,7 @@ def listfiles(path, extension=''):
     @param extension (string) Filter result based on certain extension
     @return list of files in that folder
     """
-    res = [d for d in os.listdir(path) if os.path.isfile(os.path.join(path, d))]
+    res = [name for name, _, isFile, _ in _scan_entries(path) if isFile]
     if extension:
         extRes = [f for f in res if has_extension(f, extension)]
         return extRes
@@ -259,28 +430,332 @@ def search_pattern_in_folder(searchPattern, folder):
     @param folder (string) The target folder
     @return list of file names that matches the pattern
     """
-    result = []
-    for fileName in listfiles(folder):
-        if fnmatch.fnmatch(fileName, searchPattern):
-            result.append(fileName)
-    return result
+    matchers = _compile_patterns(searchPattern)
+    return [name for name, _, isFile, _ in _scan_entries(folder) if isFile and _name_matches(name, matchers)]
+
+
+def _open_data_file(path, mode):
+    """Open a data file for reading or writing. The compression is picked up from the extension
+    -# '.gz' is read/written with gzip
+    -# '.zst' is read/written with zstandard if the module is available
+    -# Any other extension is treated as a plain text file
+    @param path (string) The path to the data file
+    @param mode (string) Either 'r' or 'w'
+    @return A file like object
+    """
+    if has_extension(path, "gz"):
+        return gzip.open(path, mode + 'b')
+    elif has_extension(path, "zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard module is not available to process: %s" % path)
+        if mode == 'r':
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+    else:
+        return open(path, mode)
+
+
+def _file_mode(path):
+    """Return the permission bits that a write to the path should leave on the file
+    @param path (string) The target file path
+    @return The mode of the existing file or the umask default of a new file
+    """
+    if exists(path):
+        return os.stat(path).st_mode & 0o7777
+    # The umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _replace_file(source, target):
+    """Rename a file on to the target path, replacing the target if it exists.
+    -# On Python 3 this is os.replace
+    -# On Windows MoveFileEx is used as os.rename does not allow a rename on to an existing file. The replace is atomic
+    on NTFS but not on network shares where it may fall back to a copy
+    -# Everywhere else os.rename already replaces the target atomically
+    @param source (string) The file that is moved
+    @param target (string) The path it is moved to
+    """
+    if hasattr(os, "replace"):
+        os.replace(source, target)
+    elif os.name == "nt":
+        import ctypes
+        # MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH
+        if not ctypes.windll.kernel32.MoveFileExW(unicode(source), unicode(target), 0x1 | 0x8):
+            raise ctypes.WinError()
+    else:
+        os.rename(source, target)
+
+
+def _atomic_write(path, writer):
+    """Write a file to a temp file in the same folder and then rename it to the target path. This ensures that a crash
+    during the write does not leave a half written file behind. The permissions of the file being replaced are kept
+    @param path (string) The target file path
+    @param writer (function) Function which receives the open file object and writes the content
+    """
+    folder = get_parent_folder(os.path.abspath(path))
+    # Keep the extension on the temp file so that it is written with the same compression
+    fileName, extension = os.path.splitext(os.path.basename(path))
+    handle, tempPath = tempfile.mkstemp(prefix=".%s_" % fileName, suffix=extension, dir=folder)
+    os.close(handle)
+    try:
+        with _open_data_file(tempPath, 'w') as f:
+            writer(f)
+        # mkstemp creates the file readable by the owner only
+        os.chmod(tempPath, _file_mode(path))
+        _replace_file(tempPath, path)
+    except:
+        if exists(tempPath):
+            os.remove(tempPath)
+        raise
 
 
 def load_json(path):
-    """Read json information
+    """Read json information. Compressed files are decompressed based on their extension
     @param path (string) The path to the json file"""
 
-    with open(path, 'r') as f:
+    with _open_data_file(path, 'r') as f:
         return json.load(f)
 
 
-def write_json(path, data):
-    """Write json information
+def write_json(path, data, compact=False, atomic=False):
+    """Write json information. Compressed files are written based on their extension eg '.json.gz'
     @param path (string) The path to the json file
     @param data (string) The information that is written
+    @param compact (bool) Strip out the indentation and whitespace to reduce the file size
+    @param atomic (bool) Write to a temp file first and then rename it to the path
+    """
+    if compact:
+        kwargs = {"separators": COMPACT_SEPARATORS}
+    else:
+        kwargs = {"indent": 4}
+
+    def _writer(f):
+        json.dump(data, f, **kwargs)
+
+    if atomic:
+        _atomic_write(path, _writer)
+    else:
+        with _open_data_file(path, 'w') as f:
+            _writer(f)
+    invalidate_cache(path)
+
+
+def _copy_data(value):
+    """Deep copy of parsed data. The dicts and lists that make up json data are copied directly which is a lot faster
+    than copy.deepcopy. Anything else falls back to copy.deepcopy
+    @param value The parsed data
+    @return A copy that shares no mutable objects with the value
+    """
+    if isinstance(value, dict):
+        return dict((key, _copy_data(item)) for key, item in value.iteritems())
+    elif isinstance(value, list):
+        return [_copy_data(item) for item in value]
+    elif value is None or isinstance(value, (basestring, int, long, float, bool)):
+        return value
+    return copy.deepcopy(value)
+
+
+class _ParsedFileCache(object):
+    """Least recently used cache of parsed data files. An entry is only valid as long as the modification time and the
+    size of the file has not changed. The file size on disk is used as an estimate of the memory used by the entry.
+    The cached value is never handed out, each caller gets their own copy."""
+
+    def __init__(self, budget=CACHE_MEMORY_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.usage = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def get(self, path, loader):
+        key = self._key(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime, stat.st_size)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                if entry[0] == signature:
+                    self.hits += 1
+                    self.entries[key] = entry
+                    return _copy_data(entry[1])
+                self.usage -= entry[0][1]
+            self.misses += 1
+        value = loader(path)
+        if signature[1] <= self.budget:
+            with self.lock:
+                # Another thread may have loaded the same file while we were parsing it
+                entry = self.entries.pop(key, None)
+                if entry is not None:
+                    self.usage -= entry[0][1]
+                self.entries[key] = (signature, value)
+                self.usage += signature[1]
+                # Evict the least recently used entries
+                while self.usage > self.budget:
+                    _, (oldSignature, _) = self.entries.popitem(last=False)
+                    self.usage -= oldSignature[1]
+        return _copy_data(value)
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                self.usage = 0
+            else:
+                entry = self.entries.pop(self._key(path), None)
+                if entry is not None:
+                    self.usage -= entry[0][1]
+
+    def info(self):
+        with self.lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "entries": len(self.entries),
+                    "usage": self.usage,
+                    "budget": self.budget}
+
+
+_PARSED_FILE_CACHE = _ParsedFileCache()
+
+
+def cached_load(path, loader=load_json):
+    """Return the parsed content of a read mostly data file. The file is only parsed again if it's modification time or
+    size has changed since the last call. Each call returns a fresh copy of the data so the caller is free to modify it.
+    @code
+    curvesData = libFile.cached_load(r"c:/myDir/Ctrl.json")
+    @endcode
+    @param path (string) The path to the data file
+    @param loader (function) The function used to parse the file
+    @return The parsed data
+    """
+    return _PARSED_FILE_CACHE.get(path, loader)
+
+
+def invalidate_cache(path=None):
+    """Remove a file from the @ref cached_load cache
+    @param path (string) The path of the data file. If None is given then the whole cache is cleared
+    """
+    _PARSED_FILE_CACHE.invalidate(path)
+
+
+def cache_info():
+    """Return the hit/miss count and memory usage of the @ref cached_load cache
+    @return dict with information about the cache
+    """
+    return _PARSED_FILE_CACHE.info()
+
+
+class _JsonStreamReader(object):
+    """Incrementally decode json values from a file object without reading the whole file in memory"""
+
+    def __init__(self, stream, chunkSize=JSON_CHUNK_SIZE):
+        self.stream = stream
+        self.chunkSize = chunkSize
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # Discard the consumed part and read the next chunk. Grow the read size for very large values
+        if self.eof:
+            return False
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        chunk = self.stream.read(max(self.chunkSize, len(self.buffer)))
+        if isinstance(chunk, bytes) and not isinstance(chunk, str):
+            chunk = chunk.decode("utf-8")
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def peek(self):
+        """Return the next non whitespace character"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of json stream")
+
+    def expect(self, character):
+        """Consume the next character and ensure it is the expected one"""
+        if self.peek() != character:
+            raise ValueError("Expected '%s' at position %i of json stream" % (character, self.pos))
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete json value"""
+        self.peek()
+        while True:
+            try:
+                result, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # A number which ends at the chunk boundary may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return result
+
+    def items(self):
+        """Yield the key value pair of the json object at the current position"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self.value()
+            if self.peek() == "}":
+                self.pos += 1
+                return
+            self.expect(",")
+
+    def descend(self, key):
+        """Move the reader to the value of the key in the json object at the current position"""
+        self.expect("{")
+        while self.peek() != "}":
+            currentKey = self.value()
+            self.expect(":")
+            if currentKey == key:
+                return
+            # Skip the value
+            self.value()
+            if self.peek() == ",":
+                self.pos += 1
+        raise KeyError(key)
+
+
+def iter_json_items(path, prefix=""):
+    """Lazily read the key value pairs of a large json dictionary. Only one item is decoded at a time so large weight
+    or curve files can be processed without loading the whole file.
+    @code
+    for geo, info in libFile.iter_json_items(r"c:/test/SkinData/SkinInfo.json", "SkinInfo"):
+        print geo, info
+    @endcode
+    @param path (string) The path to the json file
+    @param prefix (string) Dot separated keys of the nested dictionary which is read. By default the top level dict
+    @return generator of key value tuples
     """
-    with open(path, 'w') as f:
-        json.dump(data, f, indent=4)
+    with _open_data_file(path, 'r') as f:
+        reader = _JsonStreamReader(f)
+        for key in [k for k in prefix.split(".") if k]:
+            reader.descend(key)
+        for item in reader.items():
+            yield item
 
 
 def remove(path):
@@ -288,3 +763,4 @@ def remove(path):
     @param path (string) Delete filepath
     """
     os.remove(path)
+    invalidate_cache(path)
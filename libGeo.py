@@ -327,7 +327,7 @@ class ObjManager(object):
     def geo_file_info(self, path_info):
         """Write the geo path info to json file"""
         # Write JSON data
-        libFile.write_json(self.geoListPath, path_info)
+        libFile.write_json(self.geoListPath, path_info, atomic=True)
 
     @property
     def hierarchy_file_info(self):
@@ -339,7 +339,7 @@ class ObjManager(object):
     @hierarchy_file_info.setter
     def hierarchy_file_info(self, hierarchy_info):
         """Write the hierarchy info into a json file"""
-        libFile.write_json(self.datapath, hierarchy_info)
+        libFile.write_json(self.datapath, hierarchy_info, atomic=True)
         # @endcond
 
 
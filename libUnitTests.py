@@ -31,6 +31,27 @@ class Droid(object):
         print "Load Test"
 
 
+class CountingCmds(object):
+    """Stands in for maya.cmds inside a module and counts every scene call that is made through it. Swap it in for the
+    module's cmds during a test and check the calls dict afterwards"""
+
+    def __init__(self, cmds):
+        """
+        @param cmds: The cmds module that is being wrapped. The calls are still passed through to it
+        """
+        self.cmds = cmds
+        self.calls = {}
+
+    def __getattr__(self, name):
+        command = getattr(self.cmds, name)
+
+        def counted(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return command(*args, **kwargs)
+
+        return counted
+
+
 class UnitTestCase(unittest.TestCase):
     """Base Class For All Unit Test. If you need to test a variable you need to make it attribute
     for this class and initialise it from the kwargs
@@ -188,11 +188,11 @@ class Weights(object):
 
     def save_data(self):
         """Save out the deformer information to a test json file"""
-        libFile.write_json(self.datapath, {"DeformerInfo": self.data})
+        libFile.write_json(self.datapath, {"DeformerInfo": self.data}, atomic=True)
 
     def load_data(self):
         """Load the data information from the test json file"""
-        self.data = libFile.load_json(self.datapath)["DeformerInfo"]
+        self.data = libFile.cached_load(self.datapath)["DeformerInfo"]
 
     @property
     def datapath(self):
@@ -586,7 +586,7 @@ class BlendShapeWeights(MultiWeights):
             # Export out the weights map information
             if len(weightMap):
                 # Save the json file
-                libFile.write_json(self.weight_file, {"WeightMap": weightMap})
+                libFile.write_json(self.weight_file, {"WeightMap": weightMap}, compact=True, atomic=True)
 
     def _create_deformers_(self):
         # Setup missing geo shapes dictionary
@@ -710,7 +710,7 @@ class WeightManager(object):
         if geoInfo:
             deformerType = self.deformer.capitalize()
             print ("========{0} Info Path========\n{0}".format(deformerType, self.info_file))
-            libFile.write_json(self.info_file, {"{}Info".format(deformerType): geoInfo})
+            libFile.write_json(self.info_file, {"{}Info".format(deformerType): geoInfo}, atomic=True)
 
         pm.select(targets)
 
@@ -720,7 +720,7 @@ class WeightManager(object):
     def import_all(self):
         """Import the exported weights and data using the @ref weight_class"""
         # Import all Weights for selected object based on the information in the skinInfo
-        geoInfo = libFile.load_json(self.info_file)["{}Info".format(self.deformer.capitalize())]
+        geoInfo = libFile.cached_load(self.info_file)["{}Info".format(self.deformer.capitalize())]
         for self.current_geo in geoInfo:
             if pm.objExists(self.current_geo):
                 # Initialise the weight class
@@ -793,7 +793,7 @@ class WeightManager(object):
         if self.current_mode == "Export":
             return libUtilities.get_selected(stringMode=True, scriptEditorWarning=self.command_mode)
         else:
-            return libFile.load_json(self.info_file)["{}Info".format(self.deformer.capitalize())].keys()
+            return libFile.cached_load(self.info_file)["{}Info".format(self.deformer.capitalize())].keys()
             # @endcond
 
 
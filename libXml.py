@@ -19,7 +19,25 @@ myDict= libXml.ConvertXmlToDict("c:/test/myXml.xml")["Root"]
 @endcode
 
 '''
+import array
+import re
 from xml.etree import ElementTree
+
+try:
+    from xml.etree import cElementTree as _iterElementTree
+except ImportError:
+    _iterElementTree = ElementTree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+## Leaf texts which hold any other character are never numbers
+_NUMBER_CHARS = re.compile(r'[-.e0-9]+\Z')
+## The common number forms, which all pass the replace chain in _is_number
+_NUMBER_FAST = re.compile(r'-?[0-9]+(?:\.[0-9]*)?(?:e-[0-9]+)?\Z')
+
 # @cond DOXYGEN_SHOULD_SKIP_THIS
 def main():
     configdict = ConvertXmlToDict('config.xml')
@@ -134,6 +152,21 @@ def ConvertDictToXml(xmldict):
     _ConvertDictToXmlRecurse(root, xmldict[roottag])
     return root
 
+def _is_number(text):
+    """
+    Check if the text of a leaf node should be converted to a float. The common forms are matched by a precompiled
+    regex and any text with other characters is rejected straight away. Only the odd ones left go through the
+    original replace chain, which still decides the result.
+    @param text (string) The text of the leaf node
+    @return bool
+    """
+    if _NUMBER_FAST.match(text):
+        return True
+    if not _NUMBER_CHARS.match(text):
+        return False
+    return text.replace('e-', '', 1).replace("-", "", 1).replace('.', '', 1).isdigit()
+
+
 def _ConvertXmlToDictRecurse(node, dictclass):
     nodedict = dictclass()
 
@@ -146,19 +179,21 @@ def _ConvertXmlToDictRecurse(node, dictclass):
         newitem = _ConvertXmlToDictRecurse(child, dictclass)
         if type(newitem) == type(""):
             # Convert to a float item if string is a number
-            if newitem.replace('e-', '', 1).replace("-", "", 1).replace('.', '', 1).isdigit():
+            if _is_number(newitem):
                 newitem = float(newitem)
-        if nodedict.has_key(child.tag):
+        tag = child.tag
+        if tag in nodedict:
+            existing = nodedict[tag]
             # found duplicate tag, force a list
-            if type(nodedict[child.tag]) is type([]):
+            if type(existing) is list:
                 # append to existing list
-                nodedict[child.tag].append(newitem)
+                existing.append(newitem)
             else:
                 # convert to list
-                nodedict[child.tag] = [nodedict[child.tag], newitem]
+                nodedict[tag] = [existing, newitem]
         else:
             # only one, directly set the dictionary
-            nodedict[child.tag] = newitem
+            nodedict[tag] = newitem
 
     if node.text is None:
         text = ''
@@ -188,6 +223,99 @@ def ConvertXmlToDict(root, dictclass=XmlDictObject):
     return dictclass({root.tag: _ConvertXmlToDictRecurse(root, dictclass)})
 
 
+def iter_xml_records(path, tag, dictclass=dict):
+    """
+    Stream through a large xml file and convert each element with a certain tag into a dictionary. Elements are
+    cleared as soon as they are processed so the whole tree is never held in memory.
+    @code
+    for point in libXml.iter_xml_records("c:/test/skinCluster1.xml", "point"):
+        print point["index"], point["value"]
+    @endcode
+    @param path (string) Path of the xml file
+    @param tag (string) The tag of the elements which are returned
+    @param dictclass (class) Dictionary class used for the records
+    @return generator of converted elements
+    """
+    # The open elements from the root down to the current one
+    parents = []
+    depth = 0
+    for event, elem in _iterElementTree.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(elem)
+            if elem.tag == tag:
+                depth += 1
+            continue
+        parents.pop()
+        if elem.tag == tag:
+            depth -= 1
+            if not depth:
+                record = _ConvertXmlToDictRecurse(elem, dictclass)
+                if not isinstance(record, dict):
+                    # Element which only had text
+                    record = dictclass({'_text': record})
+                yield record
+        if not depth:
+            # Detach the finished element from its parent, which may be nested a few levels below the root
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+
+def read_deformer_weights(path):
+    """
+    Read a xml file written by maya's deformerWeights command. The point data of each shape and weights block is
+    returned as numpy arrays.
+    @code
+    info = libXml.read_deformer_weights("c:/test/skinCluster1.xml")
+    for weights in info["weights"]:
+        print weights["source"], weights["index"], weights["value"]
+    @endcode
+    @param path (string) Path of the xml file
+    @return dict with the "headerInfo" attributes and a list of "shape" and "weights" blocks. Each block contains its
+    xml attributes along with an "index" int array and "value" float array. The shape values have one row per point.
+    """
+    if numpy is None:
+        raise RuntimeError("numpy is required to read the deformer weights: %s" % path)
+
+    result = {"headerInfo": {}, "shape": [], "weights": []}
+    block = None
+    # The numbers of the current block are parsed point by point into flat typed arrays
+    indices = array.array("i")
+    values = array.array("d")
+    # The open elements from the root down to the current one
+    parents = []
+    for event, elem in _iterElementTree.iterparse(path, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            parents.append(elem)
+            if tag in ("shape", "weights"):
+                block = dict(elem.items())
+                indices = array.array("i")
+                values = array.array("d")
+            continue
+        parents.pop()
+        if tag == "point":
+            if block is not None:
+                indices.append(int(elem.get("index")))
+                # Each shape point holds all of its components in a single space separated value
+                values.extend(float(value) for value in elem.get("value").split())
+        elif tag in ("shape", "weights"):
+            block["index"] = numpy.array(indices, dtype=numpy.int32)
+            valueArray = numpy.array(values, dtype=numpy.float64)
+            if tag == "shape":
+                valueArray = valueArray.reshape(-1, int(block.get("stride", 3)))
+            block["value"] = valueArray
+            result[tag].append(block)
+            block = None
+        elif tag == "headerInfo":
+            result["headerInfo"] = dict(elem.items())
+        # Detach the finished element so that the points do not stay attached to the tree
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+    return result
+
+
 def list_persist(target):
     '''Make sure a item is a list. if not then make one'''
     if type(target) != list: